@@ -0,0 +1,251 @@
+import html
+import re
+from collections import namedtuple
+from string import Formatter
+
+RenderedAlert = namedtuple('RenderedAlert', ['subject', 'html', 'text'])
+
+TAG_PATTERN = re.compile(r'<[^>]+>')
+BLANK_LINES_PATTERN = re.compile(r'\n\s*\n+')
+
+
+class Markup(str):
+    """Text that is already HTML: inserted as is into HTML templates and stripped of its tags for plain text."""
+
+
+def markup_to_text(value):
+    return html.unescape(BLANK_LINES_PATTERN.sub('\n', TAG_PATTERN.sub('', value))).strip()
+
+
+def format_reading(value):
+    """A metric value without a unit, as rules see it: thousands separated, at most two decimals."""
+    if isinstance(value, float):
+        return f"{value:,.2f}".rstrip('0').rstrip('.')
+    return f"{value:,}"
+
+
+def format_labels(labels):
+    """`nic=eth0, host=web1` for the labels of a series key, `none` without any."""
+    return ", ".join(f"{label}={value}" for label, value in labels) or "none"
+
+
+class Template:
+    """A `{field}` template split into literals and slots once, so rendering is a lookup per slot and a join."""
+
+    def __init__(self, source, html=False):
+        self.html = html
+        self.chunks = []
+        self.slots = []  # (chunk index, field name, format spec)
+        for literal, field, spec, _ in Formatter().parse(source):
+            self.chunks.append(literal)
+            if field is not None:
+                self.slots.append((len(self.chunks), field, spec or ''))
+                self.chunks.append('')
+
+    def format_value(self, value, spec):
+        if isinstance(value, Markup):
+            return value if self.html else markup_to_text(value)
+        if isinstance(value, (list, tuple)):
+            if self.html:
+                return "".join(f"<li>{html.escape(str(item))}</li>" for item in value)
+            return "".join(f"\n  - {item}" for item in value)
+        text = format(value, spec)
+        return html.escape(text) if self.html else text
+
+    def render(self, context):
+        chunks = list(self.chunks)
+        for index, field, spec in self.slots:
+            chunks[index] = self.format_value(context[field], spec)
+        return "".join(chunks)
+
+
+class AlertTemplate:
+    """Subject, HTML and plain-text variants of one kind of alert."""
+
+    def __init__(self, subject, html_source, text_source):
+        self.subject = Template(subject)
+        self.html = Template(html_source, html=True)
+        self.text = Template(text_source)
+
+    def render(self, context):
+        return RenderedAlert(self.subject.render(context), self.html.render(context), self.text.render(context))
+
+
+FOOTER_HTML = """<hr>
+<p>This is an automated message from CyberMoose Watch.</p>
+</body>
+</html>
+"""
+
+FOOTER_TEXT = """
+--
+This is an automated message from CyberMoose Watch.
+"""
+
+SYSTEM_STATUS_HTML = """<hr>
+<p><strong>System Status at the Time of Alert:</strong></p>
+<ul>
+    <li><strong>CPU Usage:</strong> {cpu}%</li>
+    <li><strong>RAM Usage:</strong> {ram}% (Total: {ram_total_mb} MB, Available: {ram_available_mb} MB)</li>
+    <li><strong>Disk Usage:</strong><ul>{disks}</ul></li>
+    <li><strong>Network Usage:</strong> {network}</li>
+    <li><strong>Active Processes:</strong> {process_count}</li>
+    <li><strong>System Uptime:</strong> {uptime}</li>
+    <li><strong>Load Average (1, 5, 15 min):</strong> {load_avg}</li>
+</ul>
+<hr>
+<p><strong>Top Processes by CPU Usage:</strong></p>
+<ul>{top_cpu}</ul>
+<p><strong>Top Processes by RAM Usage:</strong></p>
+<ul>{top_ram}</ul>
+"""
+
+SYSTEM_STATUS_TEXT = """
+System status at the time of alert:
+  CPU Usage: {cpu}%
+  RAM Usage: {ram}% (Total: {ram_total_mb} MB, Available: {ram_available_mb} MB)
+  Disk Usage:{disks}
+  Network Usage: {network}
+  Active Processes: {process_count}
+  System Uptime: {uptime}
+  Load Average (1, 5, 15 min): {load_avg}
+
+Top processes by CPU usage:{top_cpu}
+
+Top processes by RAM usage:{top_ram}
+"""
+
+TEMPLATES = {
+    'status_change': AlertTemplate(
+        "{subject}: {name}",
+        """<html>
+<body>
+<p><strong>Alert:</strong> The following {kind} has changed its status:</p>
+<p><strong>Name:</strong> <strong>{name}</strong></p>
+<p><strong>New Status:</strong> <strong>{status}</strong></p>
+<p><strong>Previous Status:</strong> {previous_status}</p>
+<p><strong>Description:</strong> {description}</p>
+{message}
+<p><strong>Timestamp:</strong> {timestamp}</p>
+""" + SYSTEM_STATUS_HTML + FOOTER_HTML,
+        """Alert: the following {kind} has changed its status.
+
+Name: {name}
+New Status: {status}
+Previous Status: {previous_status}
+Description: {description}
+{message}
+Timestamp: {timestamp}
+""" + SYSTEM_STATUS_TEXT + FOOTER_TEXT,
+    ),
+    'hardware_overload': AlertTemplate(
+        "Hardware Overload: {name}",
+        """<html>
+<body>
+<h2>Hardware Overload Detected: <strong>{name}</strong></h2>
+<p><strong>Alert Timestamp:</strong> {timestamp}</p>
+<p>The {name} has exceeded the threshold:</p>
+<ul>
+    <li><strong>Current Usage:</strong> {current_usage}%</li>
+    <li><strong>Threshold:</strong> {threshold}%</li>
+    <li><strong>Exceeded by:</strong> {exceeded_by:.1f}%</li>
+</ul>
+""" + SYSTEM_STATUS_HTML + FOOTER_HTML,
+        """Hardware Overload Detected: {name}
+
+Alert Timestamp: {timestamp}
+The {name} has exceeded the threshold:
+  Current Usage: {current_usage}%
+  Threshold: {threshold}%
+  Exceeded by: {exceeded_by:.1f}%
+""" + SYSTEM_STATUS_TEXT + FOOTER_TEXT,
+    ),
+    'rule_alert': AlertTemplate(
+        "Alert: {name}",
+        """<html>
+<body>
+<h2>Alert: <strong>{name}</strong></h2>
+<p><strong>Alert Timestamp:</strong> {timestamp}</p>
+<p>The rule <strong>{rule}</strong> matched:</p>
+<ul>
+    <li><strong>Metric:</strong> {metric}</li>
+    <li><strong>Labels:</strong> {labels}</li>
+    <li><strong>Condition:</strong> {condition}</li>
+    <li><strong>Current Value:</strong> {value}</li>
+    <li><strong>Severity:</strong> {severity}</li>
+</ul>
+""" + SYSTEM_STATUS_HTML + FOOTER_HTML,
+        """Alert: {name}
+
+Alert Timestamp: {timestamp}
+The rule {rule} matched:
+  Metric: {metric}
+  Labels: {labels}
+  Condition: {condition}
+  Current Value: {value}
+  Severity: {severity}
+""" + SYSTEM_STATUS_TEXT + FOOTER_TEXT,
+    ),
+    'log_match': AlertTemplate(
+        "Log Match: {name}",
+        """<html>
+<body>
+<h2>Log Match: <strong>{name}</strong></h2>
+<p><strong>Alert Timestamp:</strong> {timestamp}</p>
+<p>{count} new line(s) of the log <strong>{log}</strong> ({path}) matched the pattern <strong>{pattern}</strong>.</p>
+<p><strong>Last matching line:</strong></p>
+<pre>{line}</pre>
+""" + SYSTEM_STATUS_HTML + FOOTER_HTML,
+        """Log Match: {name}
+
+Alert Timestamp: {timestamp}
+{count} new line(s) of the log {log} ({path}) matched the pattern {pattern}.
+Last matching line:
+  {line}
+""" + SYSTEM_STATUS_TEXT + FOOTER_TEXT,
+    ),
+    'restart_report': AlertTemplate(
+        "Service Restart {status}: {name}",
+        """<html>
+<body>
+<p>The service <strong>{name}</strong> was {outcome} on attempt {attempt}.</p>
+<p><strong>Final Status:</strong> {status}</p>
+<p><strong>Timestamp:</strong> {timestamp}</p>
+""" + FOOTER_HTML,
+        """The service {name} was {outcome} on attempt {attempt}.
+
+Final Status: {status}
+Timestamp: {timestamp}
+""" + FOOTER_TEXT,
+    ),
+    'report': AlertTemplate(
+        "{report_type} System Report",
+        """<html>
+<body>
+<h2>{report_type} System Report</h2>
+<p><strong>Timestamp:</strong> {timestamp}</p>
+<p><strong>CPU Usage:</strong> {cpu}%</p>
+<p><strong>RAM Usage:</strong> {ram}%</p>
+<p><strong>System Uptime:</strong> {uptime}</p>
+<p><strong>Disk Usage:</strong></p>
+<ul>{disks}</ul>
+""" + FOOTER_HTML,
+        """{report_type} System Report
+
+Timestamp: {timestamp}
+CPU Usage: {cpu}%
+RAM Usage: {ram}%
+System Uptime: {uptime}
+Disk Usage:{disks}
+""" + FOOTER_TEXT,
+    ),
+    'message': AlertTemplate(
+        "{subject}",
+        """<html>
+<body>
+{message}
+""" + FOOTER_HTML,
+        """{message}
+""" + FOOTER_TEXT,
+    ),
+}
@@ -0,0 +1,227 @@
+import json
+import math
+import time
+
+from app.config import atomic_write
+from app.rules import RuleAlert, alert_name
+from app.thresholds import SustainedThreshold, COMPARATORS, OK
+
+BASELINES_FILE = 'baselines.json'
+BASELINE_HALF_LIFE = 6 * 3600  # seconds after which a sample's weight in a baseline has halved
+SEASONAL_HALF_LIFE = 7 * 86400  # the same for the hour-of-day profiles, each of which only sees one hour a day
+WARMUP_SAMPLES = 60  # samples a baseline needs before it flags anything, five minutes at the check interval
+SEASONAL_SLOTS = 24  # one profile per hour of the day
+MIN_DEVIATION_RATIO = 0.01  # deviations below 1% of the mean are treated as noise, so flat series are not flagged
+BASELINE_SAVE_INTERVAL = 300  # seconds between two saves of the learned baselines
+
+
+class Baseline:
+    """Exponentially weighted mean and variance of one series, updated in O(1) per sample.
+
+    The weight of a sample decays with the time since the previous one, so irregular intervals
+    and gaps are handled; until a baseline has seen enough samples it is a plain running average.
+    """
+
+    __slots__ = ('mean', 'variance', 'count', 'last')
+
+    def __init__(self, mean=0.0, variance=0.0, count=0, last=0.0):
+        self.mean = mean
+        self.variance = variance
+        self.count = count
+        self.last = last
+
+    def update(self, value, t, half_life):
+        if self.count:
+            alpha = max(1 - 0.5 ** (max(0.0, t - self.last) / half_life), 1 / (self.count + 1))
+        else:
+            alpha = 1.0
+        difference = value - self.mean
+        increment = alpha * difference
+        self.mean += increment
+        self.variance = (1 - alpha) * (self.variance + difference * increment)
+        self.count += 1
+        self.last = t
+
+    def to_list(self):
+        return [self.mean, self.variance, self.count, self.last]
+
+
+class SeriesBaseline:
+    """The overall baseline of a series, plus its hour-of-day profiles when a seasonal rule watches it."""
+
+    __slots__ = ('overall', 'hours')
+
+    def __init__(self, seasonal=False):
+        self.overall = Baseline()
+        self.hours = [Baseline() for _ in range(SEASONAL_SLOTS)] if seasonal else None
+
+    def expected(self, hour=None):
+        """`(mean, standard deviation)` for the hour (or overall), None while still warming up."""
+        baseline = self.overall
+        if hour is not None and self.hours is not None and self.hours[hour].count >= WARMUP_SAMPLES:
+            baseline = self.hours[hour]
+        if baseline.count < WARMUP_SAMPLES:
+            return None
+        return baseline.mean, math.sqrt(baseline.variance)
+
+    def update(self, value, t, hour):
+        self.overall.update(value, t, BASELINE_HALF_LIFE)
+        if self.hours is not None:
+            self.hours[hour].update(value, t, SEASONAL_HALF_LIFE)
+
+
+def deviation_score(value, mean, deviation):
+    """How many deviations the value is above (positive) or below (negative) the mean."""
+    if deviation > 0:
+        return (value - mean) / deviation
+    if value == mean:
+        return 0.0
+    return math.copysign(math.inf, value - mean)
+
+
+class AnomalyDetector:
+    """Evaluates anomaly rules: a rule's threshold is a number of standard deviations from the learned baseline.
+
+    `>` rules fire above the baseline, `<` rules below it. Only series matched by an anomaly rule get a
+    baseline, so any other series costs one dictionary lookup per sample.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self.baselines = {}  # series key -> SeriesBaseline
+        self.active = {}  # (rule index, series key) -> SustainedThreshold fed with deviation scores
+        self.matches = {}  # series key -> indexes of the rules watching it
+
+    def load(self, rules):
+        """Replace the rules, keeping the state of those that still exist under the same name."""
+        old_rules = self.rules
+        self.rules = list(rules)
+        new_indexes = {rule.name: index for index, rule in enumerate(self.rules)}
+        active = {}
+        for (index, key), tracker in self.active.items():
+            new_index = new_indexes.get(old_rules[index].name)
+            if new_index is not None:
+                tracker.configure(*self.tracker_thresholds(self.rules[new_index]))
+                active[(new_index, key)] = tracker
+        self.active = active
+        self.matches = {}
+
+    def has_metric(self, metric):
+        return any(rule.metric == metric for rule in self.rules)
+
+    @staticmethod
+    def tracker_thresholds(rule):
+        # below the baseline means negative scores
+        sign = 1 if rule.op in ('>', '>=') else -1
+        clear_threshold = sign * rule.clear_threshold if rule.clear_threshold is not None else None
+        return sign * rule.threshold, rule.duration, clear_threshold, rule.op
+
+    def rules_for(self, key):
+        indexes = self.matches.get(key)
+        if indexes is None:
+            metric, labels = key
+            labels = dict(labels)
+            indexes = self.matches[key] = [
+                index for index, rule in enumerate(self.rules)
+                if rule.metric == metric and all(labels.get(name) == value for name, value in rule.labels.items())
+            ]
+        return indexes
+
+    def evaluate(self, snapshot, now=None):
+        """Score a snapshot against the baselines, then learn from it; returns pending and firing RuleAlerts."""
+        if now is None:
+            now = time.time()
+        hour = time.localtime(now).tm_hour
+        alerts = []
+        for key, value in snapshot.items():
+            indexes = self.rules_for(key)
+            if not indexes or value != value:
+                continue
+            baseline = self.baselines.get(key)
+            if baseline is None:
+                baseline = self.baselines[key] = SeriesBaseline(any(self.rules[index].seasonal for index in indexes))
+            elif baseline.hours is None and any(self.rules[index].seasonal for index in indexes):
+                baseline.hours = [Baseline() for _ in range(SEASONAL_SLOTS)]
+            for index in indexes:
+                alert = self.check(index, key, value, baseline, hour, now)
+                if alert is not None:
+                    alerts.append(alert)
+            baseline.update(value, now, hour)
+        return alerts
+
+    def check(self, index, key, value, baseline, hour, now):
+        rule = self.rules[index]
+        state_key = (index, key)
+        tracker = self.active.get(state_key)
+        expected = baseline.expected(hour if rule.seasonal else None)
+        if expected is None:
+            return None
+        mean, deviation = expected
+        deviation = max(deviation, abs(mean) * MIN_DEVIATION_RATIO, rule.min_deviation)
+        score = deviation_score(value, mean, deviation)
+        threshold, duration, clear_threshold, op = self.tracker_thresholds(rule)
+        if tracker is None:
+            if not COMPARATORS[op](score, threshold):
+                return None
+            tracker = self.active[state_key] = SustainedThreshold(threshold, duration, clear_threshold, op)
+        state = tracker.update(score, now)
+        if state == OK:
+            del self.active[state_key]
+            return None
+        # the bound the value crossed, in the metric's own unit
+        bound = round(mean + threshold * deviation, 2)
+        return RuleAlert(alert_name(rule, key), rule, None, key, value, state, bound)
+
+    def forget(self, keys):
+        """Drop the baselines and state of series that are gone for good."""
+        keys = set(keys)
+        for key in keys:
+            self.baselines.pop(key, None)
+            self.matches.pop(key, None)
+        self.active = {state_key: tracker for state_key, tracker in self.active.items() if state_key[1] not in keys}
+
+    def export_trackers(self):
+        """The pending and firing anomaly thresholds, as RuleEngine.export_trackers() lays them out."""
+        return [[self.rules[index].name, None, key[0], dict(key[1]), tracker.export()]
+                for (index, key), tracker in self.active.items()]
+
+    def restore_trackers(self, exported):
+        indexes = {rule.name: index for index, rule in enumerate(self.rules)}
+        for name, _, metric, labels, state in exported:
+            index = indexes.get(name)
+            if index is None:
+                continue
+            tracker = SustainedThreshold(*self.tracker_thresholds(self.rules[index]))
+            tracker.restore(state)
+            self.active[(index, (metric, tuple(sorted(labels.items()))))] = tracker
+
+    def save(self, file_name):
+        series = [
+            {
+                'metric': key[0],
+                'labels': dict(key[1]),
+                'overall': baseline.overall.to_list(),
+                'hours': [hour.to_list() for hour in baseline.hours] if baseline.hours is not None else None,
+            }
+            for key, baseline in list(self.baselines.items())
+        ]
+        atomic_write(file_name, lambda baselines_file: json.dump({'series': series}, baselines_file))
+
+    def restore(self, file_name):
+        """Load baselines saved by an earlier run; a missing or damaged file starts the learning over."""
+        try:
+            with open(file_name) as baselines_file:
+                series = json.load(baselines_file)['series']
+            baselines = {}
+            for entry in series:
+                baseline = SeriesBaseline()
+                baseline.overall = Baseline(*entry['overall'])
+                if entry['hours'] is not None:
+                    baseline.hours = [Baseline(*hour) for hour in entry['hours']]
+                baselines[(entry['metric'], tuple(sorted(entry['labels'].items())))] = baseline
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Failed to load baselines from {file_name}: {e}")
+            return
+        self.baselines = baselines
@@ -0,0 +1,104 @@
+import json
+import struct
+import sys
+from array import array
+
+from app.config import atomic_write
+
+CHECKPOINT_FILE = 'checkpoint.bin'
+CHECKPOINT_INTERVAL = 60  # seconds between two checkpoints of the running monitor
+# pending and firing alert state older than this is stale, the monitor may have been down through a clear
+CHECKPOINT_MAX_AGE = 900
+# a CHECKPOINT_HEADER, the engine state as JSON, then per series a SERIES_HEADER, its key as JSON, the raw times
+# and values as float64 and per rollup a ROLLUP_HEADER and its finished buckets as float32, all little-endian
+CHECKPOINT_MAGIC = b'CMCP'
+CHECKPOINT_VERSION = 1
+CHECKPOINT_HEADER = struct.Struct('<4sHdII')  # magic, version, saved at, state JSON length, series count
+SERIES_HEADER = struct.Struct('<IIB')  # key JSON length, sample count, rollup count
+ROLLUP_HEADER = struct.Struct('<dqqdII')  # resolution, first bucket, newest bucket, total, count, bucket count
+
+
+def little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def encode_checkpoint(state, history, saved_at):
+    """Yield the checkpoint in chunks: the state dict, then the contents of every history series."""
+    keys = [key for key in history.keys() if history.series[key].size]
+    encoded = json.dumps(state, separators=(',', ':')).encode()
+    yield CHECKPOINT_HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, saved_at, len(encoded), len(keys)) + encoded
+    for key in keys:
+        times, values = history.series[key].arrays()
+        rollups = history.rollups[key]
+        encoded = json.dumps([key[0], dict(key[1])], separators=(',', ':')).encode()
+        yield SERIES_HEADER.pack(len(encoded), len(times), len(rollups)) + encoded
+        yield little_endian(times).tobytes()
+        yield little_endian(values).tobytes()
+        for rollup in rollups:
+            completed = rollup.completed()
+            yield ROLLUP_HEADER.pack(rollup.resolution, rollup.first, rollup.newest, rollup.total, rollup.count,
+                                     len(completed))
+            yield little_endian(completed).tobytes()
+
+
+def write_checkpoint(file_name, state, history, saved_at):
+    def write(checkpoint_file):
+        for chunk in encode_checkpoint(state, history, saved_at):
+            checkpoint_file.write(chunk)
+    atomic_write(file_name, write, 'wb')
+
+
+def read_array(typecode, data, offset, count):
+    values = array(typecode)
+    values.frombytes(data[offset:offset + values.itemsize * count])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, offset + values.itemsize * count
+
+
+def read_checkpoint(file_name, history):
+    """Refill `history` from a checkpoint and return `(saved at, state)`; None when there is none to use."""
+    try:
+        with open(file_name, 'rb') as checkpoint_file:
+            data = checkpoint_file.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"Failed to read checkpoint {file_name}: {e}")
+        return None
+    try:
+        magic, version, saved_at, state_length, count = CHECKPOINT_HEADER.unpack_from(data)
+        if magic != CHECKPOINT_MAGIC or version != CHECKPOINT_VERSION:
+            raise ValueError("not a checkpoint of this version")
+        offset = CHECKPOINT_HEADER.size
+        state = json.loads(data[offset:offset + state_length])
+        offset += state_length
+        series = []
+        # decode everything before touching the history, so a damaged file leaves it alone
+        for _ in range(count):
+            key_length, samples, rollup_count = SERIES_HEADER.unpack_from(data, offset)
+            offset += SERIES_HEADER.size
+            metric, labels = json.loads(data[offset:offset + key_length])
+            offset += key_length
+            times, offset = read_array('d', data, offset, samples)
+            values, offset = read_array('d', data, offset, samples)
+            rollups = []
+            for _ in range(rollup_count):
+                resolution, first, newest, total, rollup_samples, buckets = ROLLUP_HEADER.unpack_from(data, offset)
+                completed, offset = read_array('f', data, ROLLUP_HEADER.size + offset, buckets)
+                if len(completed) != buckets:
+                    raise ValueError("truncated")
+                rollups.append((resolution, first, newest, total, rollup_samples, completed))
+            if len(values) != samples:
+                raise ValueError("truncated")
+            series.append(((metric, tuple(sorted(labels.items()))), times, values, rollups))
+    except (struct.error, ValueError, TypeError) as e:
+        print(f"Ignoring damaged checkpoint {file_name}: {e}")
+        return None
+    for key, times, values, rollups in series:
+        if len(times):
+            history.restore(key, times, values, rollups)
+    return saved_at, state
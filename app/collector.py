@@ -0,0 +1,254 @@
+import math
+import os
+import time
+from array import array
+
+from app.hardware import CoreUsage, DiskIORates, disk_snapshot
+from app.network import NetworkRates
+from app.processes import PROCESS_METRICS, ProcessMetrics, find_instances
+from app.rules import series_key
+from app.supervisor import RESTART_DELAYS, STABLE_RUN
+
+COLLECTOR_CAPACITY = 720  # samples kept in the ring, one hour at the 5 second check interval
+
+# multiprocessing is only imported once a collector is started, it is not needed otherwise.
+# The shared memory is a flat array of float64: a header, then `capacity` records of
+# [sequence, time, value per column]. A record's sequence is -1 while it is being written.
+MAGIC = 0x4D4F4F5345  # "MOOSE"
+HEADER_SIZE = 8
+H_MAGIC, H_CAPACITY, H_COLUMNS, H_SEQUENCE, H_HEARTBEAT, H_PID = range(6)
+WRITING = -1.0
+
+
+def collector_columns(provider, process_names):
+    """The series a collector writes, fixed for the lifetime of one worker."""
+    columns = [series_key('cpu'), series_key('ram')]
+    columns.extend(series_key('cpu_core', core=str(core))
+                   for core in range(len(provider.cpu_percent(interval=None, percpu=True))))
+    columns.extend(disk_snapshot(provider))
+    disk_io_rates = DiskIORates()
+    disk_io_rates.update(provider.disk_io_counters(perdisk=True) or {}, 0)
+    columns.extend(disk_io_rates.keys)
+    network_rates = NetworkRates()
+    for nic in provider.net_io_counters(pernic=True):
+        columns.extend(key for _, _, key in network_rates.keys_for(nic))
+    columns.extend(series_key(metric, process=name) for name in process_names if name for metric in PROCESS_METRICS)
+    return columns
+
+
+def labelled_values(snapshot, label):
+    """Regroup `{(metric, ((label, value),)): v}` series into `{value: {metric: v}}`."""
+    grouped = {}
+    for (metric, labels), value in snapshot.items():
+        if len(labels) == 1 and labels[0][0] == label:
+            grouped.setdefault(labels[0][1], {})[metric] = value
+    return grouped
+
+
+class SharedRing:
+    """Fixed-layout sample ring in a shared memory block, written by one process and read by any."""
+
+    def __init__(self, shm, columns, capacity):
+        self.shm = shm
+        self.columns = columns
+        self.positions = {column: index for index, column in enumerate(columns)}
+        self.capacity = capacity
+        self.record_size = 2 + len(columns)
+        self.view = shm.buf.cast('d')
+
+    @staticmethod
+    def size_for(columns, capacity):
+        return 8 * (HEADER_SIZE + capacity * (2 + len(columns)))
+
+    @classmethod
+    def create(cls, columns, capacity=COLLECTOR_CAPACITY):
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(create=True, size=cls.size_for(columns, capacity))
+        ring = cls(shm, columns, capacity)
+        ring.view[H_MAGIC] = MAGIC
+        ring.view[H_CAPACITY] = capacity
+        ring.view[H_COLUMNS] = len(columns)
+        return ring
+
+    @classmethod
+    def attach(cls, name, columns):
+        from multiprocessing import shared_memory
+
+        shm = shared_memory.SharedMemory(name=name)
+        view = shm.buf.cast('d')
+        if view[H_MAGIC] != MAGIC or view[H_COLUMNS] != len(columns):
+            view.release()
+            shm.close()
+            raise ValueError(f"Shared memory {name} does not hold a collector ring")
+        capacity = int(view[H_CAPACITY])
+        view.release()
+        return cls(shm, columns, capacity)
+
+    @property
+    def sequence(self):
+        return int(self.view[H_SEQUENCE])
+
+    @property
+    def heartbeat(self):
+        return self.view[H_HEARTBEAT]
+
+    def beat(self, now):
+        self.view[H_HEARTBEAT] = now
+        self.view[H_PID] = os.getpid()
+
+    def write(self, t, snapshot):
+        """Append one sample; series missing from the snapshot are stored as NaN."""
+        view = self.view
+        sequence = self.sequence + 1
+        start = HEADER_SIZE + (sequence - 1) % self.capacity * self.record_size
+        view[start] = WRITING
+        view[start + 1] = t
+        view[start + 2:start + self.record_size] = array('d', [snapshot.get(column, math.nan)
+                                                              for column in self.columns])
+        view[start] = sequence
+        view[H_SEQUENCE] = sequence
+
+    def _record(self, sequence):
+        start = HEADER_SIZE + (sequence - 1) % self.capacity * self.record_size
+        return start, self.view[start:start + self.record_size]
+
+    def read(self, sequence=None, keys=None):
+        """Return `(time, {series key: value})` for one record (the newest by default), or None.
+
+        Values are read straight out of the shared block; the sequence is checked again afterwards
+        so a record overwritten mid-read is retried rather than returned torn.
+        """
+        for _ in range(3):
+            if sequence is None or sequence > self.sequence:
+                sequence = self.sequence
+            if sequence <= 0 or sequence <= self.sequence - self.capacity:
+                return None
+            start, record = self._record(sequence)
+            if record[0] != sequence:
+                continue
+            positions = self.positions
+            if keys is None:
+                values = {column: record[2 + index] for index, column in enumerate(self.columns)}
+            else:
+                values = {key: record[2 + positions[key]] for key in keys if key in positions}
+            t = record[1]
+            if self.view[start] == sequence:
+                return t, {key: value for key, value in values.items() if not math.isnan(value)}
+        return None
+
+    def samples(self, key, count=None):
+        """Return `[(time, value)]` of one series, oldest first, for the last `count` records."""
+        index = self.positions.get(key)
+        if index is None:
+            return []
+        last = self.sequence
+        first = max(1, last - self.capacity + 1, last - count + 1 if count else 1)
+        samples = []
+        for sequence in range(first, last + 1):
+            _, record = self._record(sequence)
+            if record[0] == sequence and not math.isnan(record[2 + index]):
+                samples.append((record[1], record[2 + index]))
+        return samples
+
+    def close(self):
+        self.view.release()
+        self.shm.close()
+
+
+def collector_main(name, columns, process_names, interval, provider_name='psutil'):
+    """Worker process: sample the host every interval and append the sample to the shared ring."""
+    import multiprocessing
+    from app.providers import create_provider
+
+    ring = SharedRing.attach(name, columns)
+    provider = create_provider(provider_name)
+    network_rates = NetworkRates()
+    core_usage = CoreUsage()
+    disk_io_rates = DiskIORates()
+    process_metrics = ProcessMetrics()
+    parent = multiprocessing.parent_process()
+    try:
+        while parent is None or parent.is_alive():
+            started = time.time()
+            snapshot = {
+                series_key('cpu'): provider.cpu_percent(interval=None),
+                series_key('ram'): provider.virtual_memory().percent,
+            }
+            snapshot.update(core_usage.update(provider.cpu_percent(interval=None, percpu=True)))
+            snapshot.update(disk_snapshot(provider))
+            snapshot.update(disk_io_rates.update(provider.disk_io_counters(perdisk=True) or {}, started))
+            snapshot.update(network_rates.update(provider.net_io_counters(pernic=True), started))
+            snapshot.update(process_metrics.update(find_instances(provider, process_names), started))
+            ring.write(started, snapshot)
+            ring.beat(time.time())
+            time.sleep(max(0.0, interval - (time.time() - started)))
+    finally:
+        ring.close()
+
+
+class Collector:
+    """Runs collector_main in a supervised worker process and reads its samples from shared memory."""
+
+    def __init__(self, columns, process_names, interval, instrumentation=None, provider_name='psutil'):
+        self.columns = list(columns)
+        self.process_names = list(process_names)
+        self.interval = interval
+        self.provider_name = provider_name
+        self.instrumentation = instrumentation
+        self.ring = SharedRing.create(self.columns)
+        self.process = None
+        self.restarts = 0
+        self.failures = 0  # crashes since the worker last ran for STABLE_RUN, picks the restart delay
+        self.started = None
+        self.next_start = 0.0
+
+    def start(self):
+        import multiprocessing
+
+        self.process = multiprocessing.Process(
+            target=collector_main,
+            args=(self.ring.shm.name, self.columns, self.process_names, self.interval, self.provider_name),
+            name="collector", daemon=True)
+        self.process.start()
+        self.started = time.time()
+        self.ring.beat(self.started)  # give the new worker a full grace period
+
+    def supervise(self):
+        """Restart the worker, with the same delays as supervised threads, when it exited or stopped updating
+        its heartbeat."""
+        now = time.time()
+        if self.process is not None and self.process.is_alive():
+            if now - self.ring.heartbeat < 3 * self.interval + 5:
+                return True
+            print("Collector process stopped responding, restarting it")
+            self.process.terminate()
+            self.process.join(5)
+        elif self.process is not None:
+            print(f"Collector process exited with code {self.process.exitcode}, restarting it")
+
+        if self.process is not None:
+            self.process = None
+            if self.started is not None and now - self.started > STABLE_RUN:
+                self.failures = 0
+            self.next_start = now + RESTART_DELAYS[min(self.failures, len(RESTART_DELAYS) - 1)]
+            self.failures += 1
+            self.restarts += 1
+            if self.instrumentation is not None:
+                self.instrumentation.increment('collector_restarts')
+        if now >= self.next_start:
+            self.start()
+        return False
+
+    def latest(self, keys=None):
+        """Newest `{series key: value}` written by the worker, or None before the first sample."""
+        record = self.ring.read(keys=keys)
+        return record[1] if record is not None else None
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join(5)
+            self.process = None
+        self.ring.close()
+        self.ring.shm.unlink()
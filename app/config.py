@@ -1,10 +1,67 @@
 import configparser
+import json
+import os
+import tempfile
 
-def load_config(file_name='config.ini'):
+CONFIG_FILE = 'config.ini'
+STATE_FILE = 'state.json'
+EVENTS_DIR = 'events'
+PROBE_SECTION_PREFIX = 'PROBE '  # here rather than in app.probes, so finding probe sections does not import asyncio
+
+def load_config(file_name=CONFIG_FILE):
     config = configparser.ConfigParser()
     config.read(file_name)
     return config
 
-def save_config(config, file_name='config.ini'):
-    with open(file_name, 'w') as configfile:
-        config.write(configfile)
+def save_config(config, file_name=CONFIG_FILE):
+    atomic_write(file_name, config.write)
+
+def atomic_write(file_name, write, mode='w'):
+    """Write through a temp file in the same directory and rename it over the target."""
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_name)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as temp_file:
+            write(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+def load_state(file_name=STATE_FILE):
+    """Load runtime state (report timestamps and the like) kept apart from the user config."""
+    try:
+        with open(file_name) as state_file:
+            return json.load(state_file)
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state, file_name=STATE_FILE):
+    atomic_write(file_name, lambda state_file: json.dump(state, state_file, indent=2))
+
+class ConfigWatcher:
+    """Detects changes to the config file by polling its mtime and size."""
+
+    def __init__(self, file_name=CONFIG_FILE):
+        self.file_name = file_name
+        self.signature = self._stat()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.file_name)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def changed(self):
+        signature = self._stat()
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+    def mark_written(self):
+        """Remember our own write so it does not trigger a reload."""
+        self.signature = self._stat()
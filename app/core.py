@@ -0,0 +1,1063 @@
+import configparser
+import heapq
+import hmac
+import os
+import socket
+import time
+from app.thresholds import FIRING
+from app.rules import RuleEngine, AlertRule, alert_names, load_rules, series_key
+from app.config import (load_config, load_state, save_state, ConfigWatcher, CONFIG_FILE, STATE_FILE, EVENTS_DIR,
+                        PROBE_SECTION_PREFIX)
+from app.providers import create_provider, SystemClock
+from app.instrumentation import Instrumentation
+from app.alerts import TEMPLATES, Markup, format_labels, format_reading
+from app.history import HistoryStore, stream_binary, stream_json
+from app.network import NetworkRates
+from app.hardware import CoreUsage, DiskIORates, DISK_IO_METRICS, disk_snapshot
+from app.linux import CgroupMonitor, CGROUP_ROOT
+from app.logs import LogMonitor, load_log_tails
+from app.processes import ProcessMetrics, find_instances
+from app.journal import Journal
+from app.notifier import Notifier, EmailChannel, load_channels, parse_severities
+from app.supervisor import CancelToken, Supervisor, SHUTDOWN_TIMEOUT
+from app.baselines import AnomalyDetector, BASELINES_FILE, BASELINE_SAVE_INTERVAL
+from app.checkpoint import read_checkpoint, write_checkpoint, CHECKPOINT_FILE, CHECKPOINT_INTERVAL, CHECKPOINT_MAX_AGE
+from app.memory import MemoryWatchdog, object_counts, TOP_ALLOCATIONS
+from app.profiler import SamplingProfiler, PROFILES_DIR, PROFILE_SECONDS, PROFILE_RATE
+
+CONFIG_POLL_INTERVAL = 2000  # ms
+CHECK_INTERVAL = 5  # seconds between monitoring passes
+EVENTS_PAGE_LIMIT = 1000  # most events /events returns per request
+ANOMALY_MIN_DEVIATION = 1.0  # percentage points of CPU or RAM the built-in anomaly rules treat as noise
+SERVER_POLL_INTERVAL = 0.5  # seconds the web server waits for a request before checking whether to stop
+HISTORY_RANGE = 3600  # seconds /history covers when no start is given
+HISTORY_ARGS = ('metric', 'from', 'to', 'step', 'format')  # any other /history argument filters on a label
+ALERT_CONTEXT_MAX_AGE = CHECK_INTERVAL  # seconds the system details shown in alerts are reused
+HISTORY_EVICT_INTERVAL = 3600  # seconds between two sweeps for series that stopped reporting
+OVERLOAD_METRICS = ('cpu', 'ram', 'disk')  # percentages the hardware overload email words as "exceeded"
+CHECKS = ('check_services', 'check_processes', 'check_cpu_ram_usage', 'check_cpu_cores', 'check_disk_space',
+          'check_disk_io', 'check_network', 'check_cgroups', 'check_logs', 'check_probes', 'check_memory',
+          'generate_reports_if_needed')
+# with the collector process running, host metrics arrive through shared memory instead
+COLLECTED_CHECKS = ('check_services', 'check_collected', 'check_cgroups', 'check_logs', 'check_probes',
+                    'check_memory', 'generate_reports_if_needed')
+
+
+def parse_time(text):
+    """Parse epoch seconds or an ISO 8601 date/time from a query string; None stays None."""
+    if not text:
+        return None
+    try:
+        return float(text)
+    except ValueError:
+        from datetime import datetime
+        try:
+            return datetime.fromisoformat(text).timestamp()
+        except ValueError:
+            raise ValueError(f"Invalid time: {text}") from None
+
+
+def alert_threshold(alert):
+    """The threshold an alert crossed: the rule's, or the learned bound for anomaly rules."""
+    return alert.threshold if alert.threshold is not None else alert.rule.threshold
+
+
+class Value:
+    """Plain stand-in for a Tk variable, so the monitor can run without a GUI."""
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+
+class MonitorCore:
+    """Configuration, checks and alerting shared by the GUI and the headless monitor."""
+
+    def __init__(self, config_file=CONFIG_FILE, state_file=STATE_FILE, provider=None, clock=None, events_dir=None):
+        self.clock = clock or SystemClock()
+        self.instrumentation = Instrumentation()
+        # the journal lives next to the runtime state unless told otherwise
+        self.journal = Journal(events_dir or os.path.join(os.path.dirname(state_file), EVENTS_DIR))
+        self.notifier = Notifier(self.instrumentation)
+        self.supervisor = Supervisor(self.instrumentation)
+
+        # Load configuration and the runtime state kept outside of it
+        self.config_file = config_file
+        self.state_file = state_file
+        self.config = load_config(config_file)
+        self.config_watcher = ConfigWatcher(config_file)
+        # the provider is picked once at start up, changing it needs a restart
+        self.provider_name = self.config.get('MONITORING', 'Provider', fallback='psutil')
+        self.provider = provider or create_provider(self.provider_name)
+        self.state = load_state(state_file)
+        if 'LastReportTime' not in self.state:
+            # migrate the timestamp older versions stored in config.ini
+            self.state['LastReportTime'] = self.config.getfloat('REPORTS', 'LastReportTime', fallback=0)
+
+        # Initialize
+        self.services = []
+        self.processes = []
+        self.disk_thresholds = {}
+        self.anomaly_sigmas = 0.0
+        self.cpu_threshold = self.create_variable(int)
+        self.ram_threshold = self.create_variable(int)
+        self.cpu_clear_threshold = self.create_variable(int)
+        self.ram_clear_threshold = self.create_variable(int)
+        self.cpu_duration = self.create_variable(int)
+        self.ram_duration = self.create_variable(int)
+        self.max_restart_attempts = self.create_variable(int)
+        self.auto_restart_service = self.create_variable(bool)
+
+        self.email_frequency = self.create_variable(int)
+        self.send_repeat_email = self.create_variable(bool)
+
+        self.daily_report = self.create_variable(bool)
+        self.weekly_report = self.create_variable(bool)
+        self.monthly_report = self.create_variable(bool)
+
+        self.report_active = self.create_variable(bool)
+
+        self.last_service_status = {}
+        self.last_process_status = {}
+        self.last_probe_status = {}
+        self.last_email_sent = {}
+        self.latest_metrics = {}
+        self.firing_alerts = {}  # alert name -> series key
+        self.history = HistoryStore()
+        self.history_evicted = self.clock.time()
+        self.network_rates = NetworkRates()
+        self.core_usage = CoreUsage()
+        self.disk_io_rates = DiskIORates()
+        self.cgroups = CgroupMonitor()
+        self.log_monitor = LogMonitor()
+        self.probe_runner = None
+        self.probes_signature = ()  # probes the running probe worker was started with
+        self.process_metrics = ProcessMetrics()
+        self.memory_watchdog = MemoryWatchdog()
+        self.profiler = SamplingProfiler()
+        self.profile_cancel = CancelToken()  # cancelled on shutdown, so a capture over HTTP ends with the monitor
+        self.profiles_dir = os.path.join(os.path.dirname(state_file), PROFILES_DIR)
+        self.collector = None
+        self.collected_sequence = 0
+        self.alert_context_cache = None
+        self.rendered_alerts = {}
+        self.rule_engine = RuleEngine()
+        self.rules_signature = None
+        # learned baselines survive restarts, next to the runtime state
+        self.anomaly_detector = AnomalyDetector()
+        self.baselines_file = os.path.join(os.path.dirname(state_file), BASELINES_FILE)
+        self.anomaly_detector.restore(self.baselines_file)
+        self.baselines_saved = self.clock.time()
+
+        # Email configuration
+        self.smtp_server = self.create_variable(str)
+        self.smtp_port = self.create_variable(str)
+        self.email_from = self.create_variable(str)
+        self.email_password = self.create_variable(str)
+        self.email_to = self.create_variable(str)
+        self.email_subject = self.create_variable(str)
+
+        # Server configuration
+        self.server_ip = self.create_variable(str)
+        self.server_port = self.create_variable(int)
+        self.enable_remote_monitoring = self.create_variable(bool)
+        self.collector_process = self.create_variable(bool)
+
+        self.apply_config()
+
+        # statuses, alert state and recent history carry over a restart, so nothing is alerted twice
+        self.checkpoint_file = os.path.join(os.path.dirname(state_file), CHECKPOINT_FILE)
+        self.restore_checkpoint()
+        self.checkpoint_saved = time.monotonic()
+
+    def create_variable(self, kind):
+        """Create a settings variable; the GUI overrides this to return Tk variables."""
+        return Value(kind())
+
+    def default_server_ip(self):
+        hostname = socket.gethostname()
+        return socket.gethostbyname(hostname)
+
+    def reload_config_if_changed(self):
+        """Reload config.ini when it changed on disk and apply it to the running monitor."""
+        if not self.config_watcher.changed():
+            return False
+        try:
+            self.config = load_config(self.config_file)
+            self.apply_config()
+            print("Configuration reloaded from config.ini")
+        except (configparser.Error, ValueError) as e:
+            print(f"Failed to reload configuration: {e}")
+        return True
+
+    def on_tick(self):
+        """Called at the start of every monitoring pass; the GUI refreshes its status widgets here."""
+
+    def run(self):
+        """Run the monitor without a GUI until interrupted."""
+        self.start_monitoring()
+        if self.enable_remote_monitoring.get():
+            self.start_flask_server()
+
+        try:
+            while True:
+                time.sleep(CONFIG_POLL_INTERVAL / 1000)
+                self.reload_config_if_changed()
+        except KeyboardInterrupt:
+            print("Monitoring stopped.")
+        finally:
+            self.shutdown()
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Stop the supervised threads, the collector and the notification queues in about `timeout` seconds."""
+        deadline = time.monotonic() + timeout
+        self.profile_cancel.cancel()
+        stuck = self.supervisor.shutdown(timeout)
+        if stuck:
+            print(f"Threads still running at exit: {', '.join(stuck)}")
+        self.stop_collector()
+        self.log_monitor.close()
+        self.memory_watchdog.close()
+        self.notifier.stop(max(0.0, deadline - time.monotonic()))
+        if self.anomaly_detector.rules:
+            self.save_baselines()
+        self.save_checkpoint()
+        return stuck
+
+    def apply_config(self):
+        """Apply the loaded config to the settings and monitoring lists."""
+        config = self.config
+        self.selected_services = config.get('MONITORING', 'Services', fallback='').split(',')
+        self.selected_processes = config.get('MONITORING', 'Processes', fallback='').split(',')
+        self.collector_process.set(config.getboolean('MONITORING', 'Collector_Process', fallback=False))
+        self.cgroups.configure(config.get('MONITORING', 'Cgroups', fallback='').split(','),
+                               config.get('MONITORING', 'Cgroup_Root', fallback=CGROUP_ROOT),
+                               config.getboolean('MONITORING', 'Pressure_Stall', fallback=False))
+        self.log_monitor.configure(load_log_tails(config))
+        probes_configured = any(section.startswith(PROBE_SECTION_PREFIX) for section in config.sections())
+        if probes_configured or self.probe_runner is not None:
+            from app.probes import ProbeRunner, load_probes
+            if self.probe_runner is None:
+                self.probe_runner = ProbeRunner()
+            self.probe_runner.configure(load_probes(config))
+
+        self.cpu_threshold.set(config.getint('HARDWARE', 'CPU_Threshold', fallback=80))
+        self.ram_threshold.set(config.getint('HARDWARE', 'RAM_Threshold', fallback=80))
+        self.cpu_clear_threshold.set(config.getint('HARDWARE', 'CPU_Clear_Threshold', fallback=self.cpu_threshold.get()))
+        self.ram_clear_threshold.set(config.getint('HARDWARE', 'RAM_Clear_Threshold', fallback=self.ram_threshold.get()))
+        self.cpu_duration.set(config.getint('HARDWARE', 'CPU_Duration', fallback=0))
+        self.ram_duration.set(config.getint('HARDWARE', 'RAM_Duration', fallback=0))
+        self.max_restart_attempts.set(config.getint('HARDWARE', 'Max_Restart_Attempts', fallback=3))
+        self.auto_restart_service.set(config.getboolean('HARDWARE', 'Auto_Restart_Service', fallback=False))
+        self.anomaly_sigmas = config.getfloat('HARDWARE', 'Anomaly_Sigmas', fallback=0.0)
+        self.memory_watchdog.configure(config.getboolean('MONITORING', 'Memory_Tracing', fallback=False),
+                                       config.getint('MONITORING', 'Memory_Budget_MB', fallback=0))
+
+        self.email_frequency.set(config.getint('EMAIL', 'Frequency', fallback=30))
+        self.send_repeat_email.set(config.getboolean('EMAIL', 'SendRepeatEmail', fallback=False))
+
+        self.daily_report.set(config.getboolean('REPORTS', 'DailyReport', fallback=False))
+        self.weekly_report.set(config.getboolean('REPORTS', 'WeeklyReport', fallback=False))
+        self.monthly_report.set(config.getboolean('REPORTS', 'MonthlyReport', fallback=False))
+        self.report_active.set(config.getboolean('REPORTS', 'ReportActive', fallback=False))
+
+        self.smtp_server.set(config.get('EMAIL', 'SMTP_Server', fallback='smtp.gmail.com'))
+        self.smtp_port.set(config.get('EMAIL', 'SMTP_Port', fallback='587'))
+        self.email_from.set(config.get('EMAIL', 'From', fallback=''))
+        self.email_password.set(config.get('EMAIL', 'Password', fallback=''))
+        self.email_to.set(config.get('EMAIL', 'To', fallback=''))
+        self.email_subject.set(config.get('EMAIL', 'Subject', fallback='Service Alert'))
+        email = EmailChannel(self.email_alert, parse_severities(config.get('EMAIL', 'Severities', fallback='')))
+        email.signature = ('email', email.severities)
+        self.notifier.configure([email] + load_channels(config))
+
+        # resolving the host name can be slow, so only do it when no IP is configured
+        self.server_ip.set(config.get('SERVER', 'IP', fallback=None) or self.default_server_ip())
+        self.server_port.set(config.getint('SERVER', 'Port', fallback=5000))
+        self.enable_remote_monitoring.set(config.getboolean('SERVER', 'EnableRemoteMonitoring', fallback=False))
+        self.profile_token = config.get('SERVER', 'Profile_Token', fallback='')
+
+        # a new list object forces the rule plan to recompile on the next check
+        self.config_rules = load_rules(config) + self.log_monitor.rules()
+
+    def start_monitoring(self):
+        self.monitoring_thread = self.supervisor.start('monitoring', self.monitor_services_and_processes).thread
+
+    def monitor_services_and_processes(self, token):
+        while not token.cancelled:
+            self.on_tick()
+            elapsed = self.run_checks()
+            # Check every 5 seconds for live update
+            if self.clock.wait(token, max(0.0, CHECK_INTERVAL - elapsed)):
+                break
+
+    def run_checks(self):
+        """Run one pass of every check, timing each of them; returns the seconds the pass took."""
+        timed = self.instrumentation.timed
+        start = time.perf_counter()
+        self.sync_collector()
+        for name in COLLECTED_CHECKS if self.collector is not None else CHECKS:
+            with timed(name):
+                getattr(self, name)()
+        if self.clock.time() - self.history_evicted >= HISTORY_EVICT_INTERVAL:
+            with timed('evict_history'):
+                self.evict_stale_series()
+        # real time rather than the monitor's clock, so a simulated month does not write one every minute
+        if time.monotonic() - self.checkpoint_saved >= CHECKPOINT_INTERVAL:
+            with timed('checkpoint'):
+                self.save_checkpoint()
+        elapsed = time.perf_counter() - start
+
+        self.instrumentation.record('tick', elapsed)
+        self.instrumentation.sample_cpu()
+        if elapsed > CHECK_INTERVAL:
+            self.instrumentation.increment('tick_overruns')
+        return elapsed
+
+    def sync_collector(self):
+        """Start, replace or stop the collector process to match the settings, restarting it if it died."""
+        names = [name for name in self.selected_processes if name]
+        if self.collector is not None and (not self.collector_process.get() or self.collector.process_names != names):
+            self.stop_collector()
+        if self.collector_process.get() and self.collector is None:
+            # multiprocessing and shared memory are only needed once the collector is turned on
+            from app.collector import Collector, collector_columns
+            self.collector = Collector(collector_columns(self.provider, names), names, CHECK_INTERVAL,
+                                       self.instrumentation, self.provider_name)
+            self.collected_sequence = 0
+        if self.collector is not None:
+            self.collector.supervise()
+
+    def stop_collector(self):
+        if self.collector is not None:
+            self.collector.stop()
+            self.collector = None
+
+    def get_service_status(self, service_name):
+        if not service_name:
+            return "Monitored"
+        try:
+            service = self.provider.win_service_get(service_name)
+            return "Running" if service.status() == 'running' else "Stopped"
+        except Exception as e:
+            return "Not Found"
+
+    def check_services(self):
+        for service_name in self.selected_services:
+            if service_name:
+                current_status = "Running" if self.is_service_running(service_name) else "Stopped"
+                if service_name not in self.last_service_status or current_status != self.last_service_status[
+                    service_name]:
+                    self.handle_service_status_change(service_name, current_status)
+                    self.last_service_status[service_name] = current_status
+
+                    if current_status == "Stopped" and self.auto_restart_service.get():
+                        self.attempt_service_restart(service_name)
+
+    def check_processes(self):
+        instances = find_instances(self.provider, self.selected_processes)
+        for proc_name, running in instances.items():
+            self.update_process_status(proc_name, bool(running))
+
+        snapshot = self.process_metrics.update(instances, self.clock.time())
+        if snapshot:
+            self.evaluate_rules(snapshot)
+
+    def update_process_status(self, proc_name, running):
+        current_status = "Running" if running else "Not Running"
+        if proc_name not in self.last_process_status or current_status != self.last_process_status[proc_name]:
+            self.handle_process_status_change(proc_name, current_status)
+            self.last_process_status[proc_name] = current_status
+
+    def check_collected(self):
+        """Evaluate the newest sample written by the collector process."""
+        from app.collector import labelled_values
+
+        sequence = self.collector.ring.sequence
+        if sequence == self.collected_sequence:
+            return  # no new sample since the last tick
+        snapshot = self.collector.latest()
+        if snapshot is None:
+            return
+        self.collected_sequence = sequence
+
+        for proc_name in self.selected_processes:
+            if proc_name:
+                self.update_process_status(proc_name, snapshot.get(series_key('proc_instances', process=proc_name)))
+        self.network_rates.rates = labelled_values(snapshot, 'nic')
+        cores = labelled_values(snapshot, 'core')
+        self.core_usage.percents = [cores[core]['cpu_core'] for core in sorted(cores, key=int)]
+        self.disk_io_rates.rates = {device: metrics for device, metrics in labelled_values(snapshot, 'device').items()
+                                    if 'disk_busy' in metrics}
+        self.process_metrics.totals = labelled_values(snapshot, 'process')
+        self.evaluate_rules(snapshot)
+
+    def read_status(self):
+        """CPU, RAM and disk usage for display, read from the collector's shared memory when it runs."""
+        collected = self.collector.latest() if self.collector is not None else None
+        if collected is None:
+            return {
+                'cpu': self.provider.cpu_percent(interval=1),
+                'ram': self.provider.virtual_memory().percent,
+                'disks': {labels[0][1]: usage for (_, labels), usage in disk_snapshot(self.provider).items()},
+            }
+        return {
+            'cpu': collected.get(series_key('cpu')),
+            'ram': collected.get(series_key('ram')),
+            'disks': {labels[0][1]: usage for (metric, labels), usage in collected.items() if metric == 'disk'},
+        }
+
+    def handle_service_status_change(self, service_name, status):
+        previous_status = self.last_service_status.get(service_name, "Unknown")
+        self.record_event('service', service_name, status=status, previous=previous_status)
+        subject = f"Service {status}"
+        detailed_body = f"The service <strong>{service_name}</strong> is now in a <strong>{status}</strong> state."
+        self.send_email(subject, detailed_body, service_or_process_name=service_name, status=status,
+                        previous_status=previous_status)
+
+    def handle_process_status_change(self, proc_name, status):
+        previous_status = self.last_process_status.get(proc_name, "Unknown")
+        self.record_event('process', proc_name, status=status, previous=previous_status)
+        subject = f"Process {status}"
+        detailed_body = f"The process <strong>{proc_name}</strong> is now in a <strong>{status}</strong> state."
+        self.send_email(subject, detailed_body, service_or_process_name=proc_name, status=status,
+                        previous_status=previous_status)
+
+    def handle_probe_status_change(self, probe_name, status, error=None):
+        previous_status = self.last_probe_status.get(probe_name, "Unknown")
+        self.record_event('probe', probe_name, status=status, previous=previous_status, error=error)
+        subject = f"Probe {status}"
+        detailed_body = f"The probe <strong>{probe_name}</strong> is now <strong>{status}</strong>."
+        self.send_email(subject, detailed_body, service_or_process_name=probe_name, status=status,
+                        previous_status=previous_status, custom_description=error)
+
+    def attempt_service_restart(self, service_name):
+        """Attempt to restart the service up to the maximum number of times specified."""
+        success = False
+        for attempt in range(1, self.max_restart_attempts.get() + 1):
+            try:
+                self.provider.restart_service(service_name)
+                success = True
+                break
+            except Exception as e:
+                if attempt == self.max_restart_attempts.get():
+                    success = False
+                self.clock.sleep(5)  #!!!!!!! Wait a bit before trying again !!!!!!#
+
+        self.record_event('restart', service_name, success=success, attempts=attempt)
+        self.send_restart_report(service_name, success, attempt)
+
+    def send_restart_report(self, service_name, success, attempt):
+        """Send a report after attempting to restart a service."""
+        self.notify(self.render_alert(
+            'restart_report', name=service_name, attempt=attempt, status="Success" if success else "Failure",
+            outcome="successfully restarted" if success else "not restarted"),
+            severity='info' if success else 'critical')
+
+    def check_cpu_ram_usage(self):
+        cpu_usage = self.provider.cpu_percent(interval=1)
+        ram_usage = self.provider.virtual_memory().percent
+
+        self.evaluate_rules({
+            series_key('cpu'): cpu_usage,
+            series_key('ram'): ram_usage,
+        })
+
+    def check_cpu_cores(self):
+        # utilisation since the previous tick; a single pegged core is invisible in the average
+        self.evaluate_rules(self.core_usage.update(self.provider.cpu_percent(interval=None, percpu=True)))
+
+    def check_disk_space(self):
+        if (not self.rule_engine.plan.has_metric('disk') and not self.anomaly_detector.has_metric('disk')
+                and not self.disk_thresholds):
+            return
+        self.evaluate_rules(disk_snapshot(self.provider))
+
+    def check_disk_io(self):
+        snapshot = self.disk_io_rates.update(self.provider.disk_io_counters(perdisk=True) or {}, self.clock.time())
+        if snapshot:
+            self.evaluate_rules(snapshot)
+
+    def check_network(self):
+        # one reading for every interface, turned into rates in a single pass
+        snapshot = self.network_rates.update(self.provider.net_io_counters(pernic=True), self.clock.time())
+        self.forget_series(self.network_rates.drain_removed())
+        if snapshot:
+            self.evaluate_rules(snapshot)
+
+    def check_cgroups(self):
+        if not self.cgroups.enabled:
+            return
+        snapshot = self.cgroups.update(self.clock.time())
+        self.forget_series(self.cgroups.drain_removed())
+        if snapshot:
+            self.evaluate_rules(snapshot)
+
+    def check_logs(self):
+        if not self.log_monitor.tails:
+            return
+        snapshot, matched = self.log_monitor.poll()
+        for (log, pattern), line in matched.items():
+            count = snapshot[series_key('log_matches', log=log, pattern=pattern)]
+            self.record_event('log', log, pattern=pattern, count=count, line=line)
+        self.evaluate_rules(snapshot)
+
+    def sync_probes(self):
+        """Start, replace or stop the probe worker to match the configured probes."""
+        if self.probe_runner.signature == self.probes_signature:
+            return
+        self.probes_signature = self.probe_runner.signature
+        if self.probe_runner.probes:
+            self.supervisor.start('probes', self.probe_runner.run)
+        else:
+            self.supervisor.stop('probes')
+
+    def check_probes(self):
+        if self.probe_runner is None:
+            return
+        self.sync_probes()
+        self.forget_series(self.probe_runner.drain_removed())
+        results = self.probe_runner.drain()
+        if not results:
+            return
+        snapshot = {}
+        for result in results:
+            probe = self.probe_runner.probes.get(result.name)
+            if probe is None:
+                continue
+            snapshot[probe.keys['probe_up']] = 1 if result.up else 0
+            if result.up:
+                snapshot[probe.keys['probe_connect_ms']] = result.connect * 1000
+                if result.response is not None:
+                    snapshot[probe.keys['probe_response_ms']] = result.response * 1000
+            previous_status = self.last_probe_status.get(result.name)
+            if result.status != previous_status:
+                self.handle_probe_status_change(result.name, result.status, result.error)
+                self.last_probe_status[result.name] = result.status
+                # the service can be running and still not answer, which only a restart may fix
+                if result.status == "Down" and probe.service and self.auto_restart_service.get():
+                    self.attempt_service_restart(probe.service)
+        self.evaluate_rules(snapshot)
+
+    def check_memory(self):
+        snapshot = self.memory_watchdog.check(self.clock.time())
+        if snapshot:
+            self.evaluate_rules(snapshot)
+
+    def memory_counts(self):
+        """Counts of the objects a leak would pile up, for the memory report."""
+        return {**object_counts(), 'workers': len(self.supervisor.inventory()),
+                'history_series': len(self.history.keys())}
+
+    def memory_report(self, against='first', top=TOP_ALLOCATIONS):
+        """The watchdog's report with the last hour of agent RSS readings."""
+        now = self.clock.time()
+        rss = self.history.samples(series_key('agent_rss_mb'), since=now - HISTORY_RANGE)
+        return {**self.memory_watchdog.report(now, against, top),
+                'rss_history': [[t, round(value, 1)] for t, value in rss]}
+
+    def capture_profile(self, seconds=PROFILE_SECONDS, rate=PROFILE_RATE, token=None):
+        """Sample every thread's stack for `seconds` and keep the collapsed stacks in the profiles directory.
+
+        Returns the Profile and the file it was written to (None if writing failed).
+        """
+        profile = self.profiler.capture(seconds, rate, token)
+        file_name = os.path.join(self.profiles_dir, time.strftime("profile-%Y%m%d-%H%M%S.folded",
+                                                                   time.localtime(profile.started)))
+        try:
+            os.makedirs(self.profiles_dir, exist_ok=True)
+            profile.write(file_name)
+        except OSError as e:
+            print(f"Failed to save profile {file_name}: {e}")
+            file_name = None
+        self.record_event('profile', os.path.basename(file_name) if file_name else "unsaved",
+                          seconds=round(profile.duration, 1), samples=profile.samples)
+        return profile, file_name
+
+    def forget_series(self, keys):
+        """Drop the history and alert state of series whose source is gone (a deleted container, a removed probe)."""
+        if not keys:
+            return
+        keys = set(keys)
+        rules = self.rule_engine.plan.rules + self.anomaly_detector.rules
+        names = set()
+        for key in keys:
+            self.history.remove(key)
+            self.latest_metrics.pop(key, None)
+            names.update(alert_names(rules, key))
+        self.rule_engine.forget(keys)
+        self.anomaly_detector.forget(keys)
+        for name, key in list(self.firing_alerts.items()):
+            if key in keys:
+                del self.firing_alerts[name]
+                names.add(name)
+                self.record_event('alert', name, state="Resolved")
+        # the email rate limits are kept per alert name, and checkpointed
+        for name in names:
+            self.last_email_sent.pop(name, None)
+
+    def evict_stale_series(self):
+        """Forget the series that reported nothing for as long as the history reaches back, whatever their source."""
+        now = self.clock.time()
+        self.history_evicted = now
+        self.forget_series(self.history.stale(now - self.history.retention))
+
+    def build_alert_rules(self):
+        """Build the built-in rules from the [HARDWARE] thresholds and append the rules defined in config."""
+        rules = [
+            AlertRule("CPU Usage", 'cpu', self.cpu_threshold.get(), clear_threshold=self.cpu_clear_threshold.get(),
+                      duration=self.cpu_duration.get()),
+            AlertRule("RAM Usage", 'ram', self.ram_threshold.get(), clear_threshold=self.ram_clear_threshold.get(),
+                      duration=self.ram_duration.get()),
+        ]
+        if self.anomaly_sigmas:
+            # against what is normal for this machine at this hour, on top of the fixed thresholds
+            for name, metric, duration in (("CPU Usage Anomaly", 'cpu', self.cpu_duration.get()),
+                                           ("RAM Usage Anomaly", 'ram', self.ram_duration.get())):
+                rules.append(AlertRule(name, metric, self.anomaly_sigmas, duration=duration, anomaly=True,
+                                       seasonal=True, min_deviation=ANOMALY_MIN_DEVIATION))
+        for device, threshold in self.disk_thresholds.items():
+            rules.append(AlertRule(f"Disk Space {device}", 'disk', threshold, labels={'device': device}))
+        if self.memory_watchdog.budget_mb:
+            # the monitor itself outgrowing its budget, most likely a leak
+            rules.append(AlertRule("Agent Memory", 'agent_rss_mb', self.memory_watchdog.budget_mb))
+        return rules + self.config_rules
+
+    def load_alert_rules(self):
+        """Compile the rules again if a threshold or the config changed since they were last loaded."""
+        signature = (self.cpu_threshold.get(), self.cpu_clear_threshold.get(), self.cpu_duration.get(),
+                     self.ram_threshold.get(), self.ram_clear_threshold.get(), self.ram_duration.get(),
+                     tuple(sorted(self.disk_thresholds.items())), self.anomaly_sigmas, self.memory_watchdog.budget_mb,
+                     id(self.config_rules))
+        # only recompile when a threshold changed since the last tick
+        if signature != self.rules_signature:
+            rules = self.build_alert_rules()
+            self.rule_engine.load([rule for rule in rules if not rule.anomaly])
+            self.anomaly_detector.load([rule for rule in rules if rule.anomaly])
+            self.rules_signature = signature
+
+    def evaluate_rules(self, snapshot):
+        """Run the compiled rule plan against a snapshot and dispatch every firing alert."""
+        self.load_alert_rules()
+        now = self.clock.time()
+        self.latest_metrics.update(snapshot)
+        self.history.record(snapshot, now)
+        firing = {}
+        alerts = self.rule_engine.evaluate(snapshot, now=now)
+        if self.anomaly_detector.rules:
+            alerts += self.anomaly_detector.evaluate(snapshot, now=now)
+            if now - self.baselines_saved >= BASELINE_SAVE_INTERVAL:
+                self.save_baselines()
+        for alert in alerts:
+            if alert.state == FIRING:
+                firing[alert.name] = alert
+                self.dispatch_alert(alert)
+
+        # journal only the transitions, not every tick an alert stays firing
+        for name, key in list(self.firing_alerts.items()):
+            if key in snapshot and name not in firing:
+                del self.firing_alerts[name]
+                self.record_event('alert', name, state="Resolved", value=snapshot[key])
+        for name, alert in firing.items():
+            if name not in self.firing_alerts:
+                self.firing_alerts[name] = alert.series
+                self.record_event('alert', name, state=FIRING, value=alert.value, threshold=alert_threshold(alert),
+                                  severity=alert.rule.severity)
+
+    def record_event(self, event_type, name, **fields):
+        try:
+            self.journal.append(event_type, name, self.clock.time(), **fields)
+        except OSError as e:
+            print(f"Failed to record {event_type} event for {name}: {e}")
+
+    def save_baselines(self):
+        self.baselines_saved = self.clock.time()
+        try:
+            self.anomaly_detector.save(self.baselines_file)
+        except OSError as e:
+            print(f"Failed to save baselines: {e}")
+
+    def checkpoint_state(self):
+        return {
+            'services': self.last_service_status,
+            'processes': self.last_process_status,
+            'probes': self.last_probe_status,
+            'emails': self.last_email_sent,
+            'firing': [[name, key[0], dict(key[1])] for name, key in self.firing_alerts.items()],
+            'rules': self.rule_engine.export_trackers(),
+            'anomalies': self.anomaly_detector.export_trackers(),
+        }
+
+    def save_checkpoint(self):
+        self.checkpoint_saved = time.monotonic()
+        try:
+            write_checkpoint(self.checkpoint_file, self.checkpoint_state(), self.history, self.clock.time())
+        except OSError as e:
+            print(f"Failed to save checkpoint: {e}")
+
+    def restore_checkpoint(self):
+        """Resume from the last checkpoint: statuses, email rate limits, history and, unless the checkpoint
+        is older than CHECKPOINT_MAX_AGE, the pending and firing alerts.
+        """
+        restored = read_checkpoint(self.checkpoint_file, self.history)
+        if restored is None:
+            return
+        saved_at, state = restored
+        try:
+            self.last_service_status.update(state.get('services', {}))
+            self.last_process_status.update(state.get('processes', {}))
+            self.last_probe_status.update(state.get('probes', {}))
+            self.last_email_sent.update(state.get('emails', {}))
+            if self.clock.time() - saved_at > CHECKPOINT_MAX_AGE:
+                return
+            self.load_alert_rules()
+            self.rule_engine.restore_trackers(state.get('rules', []))
+            self.anomaly_detector.restore_trackers(state.get('anomalies', []))
+            for name, metric, labels in state.get('firing', []):
+                self.firing_alerts[name] = (metric, tuple(sorted(labels.items())))
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            # state laid out differently, e.g. by another version: start fresh instead of failing to start
+            print(f"Ignoring checkpoint state in {self.checkpoint_file}: {e}")
+            for restored_state in (self.last_service_status, self.last_process_status, self.last_probe_status,
+                                   self.last_email_sent, self.firing_alerts, self.rule_engine.active,
+                                   self.anomaly_detector.active):
+                restored_state.clear()
+
+    def dispatch_alert(self, alert):
+        rule = alert.rule
+        threshold = alert_threshold(alert)
+        if rule.metric in OVERLOAD_METRICS and rule.op in ('>', '>='):
+            self.handle_hardware_overload(alert.name, alert.value, threshold, rule)
+        elif rule.metric == 'log_matches':
+            self.handle_log_alert(alert)
+        else:
+            self.handle_rule_alert(alert)
+
+    def alert_due(self, name):
+        """Whether an alert is emailed: the first time, and again after the email frequency if repeats are on."""
+        last_sent = self.last_email_sent.get(name)
+        if last_sent is None:
+            return True
+        return self.send_repeat_email.get() and self.clock.time() - last_sent > self.email_frequency.get() * 60
+
+    def handle_hardware_overload(self, name, current_usage, threshold, rule=None):
+        if self.alert_due(name):
+            self.notify(self.render_alert(
+                'hardware_overload', name=name, current_usage=current_usage, threshold=threshold,
+                exceeded_by=current_usage - threshold),
+                severity=rule.severity if rule else 'warning', channel=rule.channel if rule else None)
+            self.last_email_sent[name] = self.clock.time()
+
+    def handle_log_alert(self, alert):
+        """Notify a log check with the line that matched, not just how many did."""
+        if not self.alert_due(alert.name):
+            return
+        rule = alert.rule
+        labels = dict(alert.series[1])
+        log, pattern = labels.get('log'), labels.get('pattern')
+        tail = self.log_monitor.tails.get(log)
+        self.notify(self.render_alert(
+            'log_match', name=alert.name, log=log, path=tail.path if tail is not None else "unknown",
+            pattern=pattern, count=format_reading(alert.value),
+            line=self.log_monitor.matched.get((log, pattern), "")),
+            severity=rule.severity, channel=rule.channel)
+        self.last_email_sent[alert.name] = self.clock.time()
+
+    def handle_rule_alert(self, alert):
+        """Notify any other rule: a probe down, a rate, a `<` rule, with the value as the rule compares it."""
+        if not self.alert_due(alert.name):
+            return
+        rule = alert.rule
+        metric, labels = alert.series
+        if rule.anomaly:
+            condition = (f"{metric} {rule.op} {format_reading(alert_threshold(alert))}, "
+                         f"{format_reading(rule.threshold)} deviations from its usual level")
+        else:
+            condition = f"{metric} {rule.op} {format_reading(rule.threshold)}"
+        self.notify(self.render_alert(
+            'rule_alert', name=alert.name, rule=rule.name, metric=metric, labels=format_labels(labels),
+            condition=condition, value=format_reading(alert.value), severity=rule.severity),
+            severity=rule.severity, channel=rule.channel)
+        self.last_email_sent[alert.name] = self.clock.time()
+
+    def alert_context(self):
+        """System details shown in alerts, collected at most once per check interval."""
+        context = self.alert_context_cache
+        if context is None or self.clock.time() - context['collected_at'] >= ALERT_CONTEXT_MAX_AGE:
+            context = self.alert_context_cache = self.collect_alert_context()
+            self.rendered_alerts.clear()
+        return context
+
+    def collect_alert_context(self):
+        """Gather alert details, reusing the CPU and RAM values the checks already collected."""
+        now = self.clock.time()
+        memory = self.provider.virtual_memory()
+        cpu_usage = self.latest_metrics.get(series_key('cpu'))
+        if cpu_usage is None:
+            cpu_usage = self.provider.cpu_percent(interval=None)
+
+        disks = []
+        for partition in self.provider.disk_partitions():
+            if partition.fstype:
+                usage = self.provider.disk_usage(partition.mountpoint)
+                disks.append(f"{partition.device}: {usage.percent}% used, Free: {usage.free // (1024 ** 2)} MB")
+
+        # a single pass over the process table for the count and both top lists
+        processes = [proc.info for proc in self.provider.process_iter(['name', 'cpu_percent', 'memory_percent'])]
+        top_cpu = heapq.nlargest(5, processes, key=lambda info: info.get('cpu_percent') or 0)
+        top_ram = heapq.nlargest(5, processes, key=lambda info: info.get('memory_percent') or 0)
+
+        network = self.provider.net_io_counters()
+        load_avg = self.provider.getloadavg()
+        return {
+            'collected_at': now,
+            'timestamp': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now)),
+            'uptime': time.strftime("%H:%M:%S", time.gmtime(now - self.provider.boot_time())),
+            'cpu': cpu_usage,
+            'ram': self.latest_metrics.get(series_key('ram'), memory.percent),
+            'ram_total_mb': memory.total // (1024 ** 2),
+            'ram_available_mb': memory.available // (1024 ** 2),
+            'disks': disks,
+            'network': f"Sent: {network.bytes_sent} bytes, Received: {network.bytes_recv} bytes",
+            'process_count': len(processes),
+            'load_avg': f"{load_avg[0]}, {load_avg[1]}, {load_avg[2]}",
+            'top_cpu': [f"{info['name']}: {info.get('cpu_percent') or 0:.1f}% CPU" for info in top_cpu],
+            'top_ram': [f"{info['name']}: {info.get('memory_percent') or 0:.2f}% RAM" for info in top_ram],
+        }
+
+    def render_alert(self, template_name, **fields):
+        """Render an alert template; the same event renders once for every recipient and channel."""
+        context = self.alert_context()
+        key = (template_name, tuple(sorted(fields.items())))
+        rendered = self.rendered_alerts.get(key)
+        if rendered is None:
+            with self.instrumentation.timed('alert_render'):
+                rendered = self.rendered_alerts[key] = TEMPLATES[template_name].render({**context, **fields})
+        return rendered
+
+    def is_service_running(self, service_name):
+        if not service_name:
+            return False
+        try:
+            service = self.provider.win_service_get(service_name)
+            if service.status() == 'running':
+                return True
+        except Exception as e:
+            print(f"Service {service_name} not found: {e}")
+        return False
+
+    def send_email(self, subject, body, service_or_process_name=None, status=None, previous_status=None,
+                   custom_description=None):
+        if service_or_process_name:
+            rendered = self.render_alert(
+                'status_change', subject=subject, message=Markup(body), name=service_or_process_name,
+                status=status, previous_status=previous_status, description=custom_description or 'N/A',
+                kind='service' if 'Service' in subject else 'probe' if 'Probe' in subject else 'process')
+        else:
+            rendered = self.render_alert('message', subject=subject, message=Markup(body))
+        # a service, process or probe coming back is good news, anything else needs attention
+        if status is None:
+            severity = 'warning'
+        else:
+            severity = 'info' if status in ("Running", "Up") else 'critical'
+        self.notify(rendered, severity)
+
+    def notify(self, rendered, severity='warning', channel=None):
+        """Queue a rendered alert on `channel`, or on every channel routed for its severity."""
+        channels = self.notifier.notify(rendered, severity, channel)
+        if channels:
+            self.record_event('notification', rendered.subject, severity=severity, channels=channels)
+
+    def email_alert(self, rendered):
+        """Email a rendered alert as one multipart message to every recipient; runs on the email channel's worker."""
+        from app.email_service import build_message
+
+        email_from = self.email_from.get()
+        email_to_list = self.email_to.get().split(',')
+        # the subject from the settings wins over the template's
+        msg = build_message(rendered, email_from, email_to_list, self.email_subject.get())
+        self.send_message(msg, email_from, email_to_list)
+
+    def send_message(self, msg, email_from, email_to_list):
+        """Deliver a finished email over SMTP; the simulation replaces this to record alerts instead."""
+        from app.email_service import send_smtp
+
+        try:
+            with self.instrumentation.timed('email_send'):
+                send_smtp(msg, self.smtp_server.get(), self.smtp_port.get(), email_from, self.email_password.get(),
+                          email_to_list)
+            self.instrumentation.increment('emails_sent')
+            print(f"Email sent with subject: {msg['Subject']}")
+        except Exception as e:
+            self.instrumentation.increment('emails_failed')
+            print(f"Failed to send email: {e}")
+
+    def control_service(self, service_name, action):
+        try:
+            service = self.provider.win_service_get(service_name)
+            if action == 'start' and service.status() != 'running':
+                self.provider.start_service(service_name)
+            elif action == 'stop' and service.status() == 'running':
+                self.provider.stop_service(service_name)
+            elif action == 'restart':
+                self.provider.restart_service(service_name)
+            print(f"Service '{service_name}' {action}ed successfully.")
+        except Exception as e:
+            print(f"Failed to {action} service '{service_name}': {e}")
+
+    def generate_reports_if_needed(self):
+        if not self.report_active.get():
+            return
+
+        current_time = self.clock.time()
+        last_report_time = self.state.get('LastReportTime', 0)
+
+        if self.daily_report.get() and (current_time - last_report_time) >= 86400:
+            self.generate_report('Daily')
+        elif self.weekly_report.get() and (current_time - last_report_time) >= 604800:
+            self.generate_report('Weekly')
+        elif self.monthly_report.get() and (current_time - last_report_time) >= 2592000:
+            self.generate_report('Monthly')
+
+    def generate_report(self, report_type):
+        self.notify(self.render_alert('report', report_type=report_type), 'info')
+        self.state['LastReportTime'] = self.clock.time()
+        save_state(self.state, self.state_file)
+
+    def send_instant_report(self):
+        self.notify(self.render_alert('report', report_type="Instant"), 'info')
+
+    def get_report_body(self, report_type):
+        """Generate the report content with system information."""
+        return self.render_alert('report', report_type=report_type).html
+
+    def setup_flask_routes(self):
+        from flask import Flask, Response, g, jsonify, render_template, request
+
+        self.app = Flask(__name__)
+
+        @self.app.before_request
+        def start_request_timer():
+            g.request_start = time.perf_counter()
+
+        @self.app.after_request
+        def record_request_time(response):
+            self.instrumentation.record(f"http {request.endpoint}", time.perf_counter() - g.request_start)
+            return response
+
+        @self.app.route('/')
+        def index():
+            return render_template('index.html')
+
+        @self.app.route('/status')
+        def status():
+            status_data = self.read_status()
+            status_data.update({
+                'network': {
+                    nic: {metric: round(rate, 1) for metric, rate in rates.items()}
+                    for nic, rates in self.network_rates.rates.items()
+                },
+                'cpu_cores': self.core_usage.percents,
+                'disk_io': {
+                    device: {metric: round(rates[metric], 1) for metric in DISK_IO_METRICS}
+                    for device, rates in self.disk_io_rates.rates.items()
+                },
+                'cgroups': self.cgroups.values,
+                'pressure': self.cgroups.pressure,
+                'process_metrics': self.process_metrics.totals,
+                'probes': self.probe_runner.describe() if self.probe_runner is not None else {},
+                'services': {service: self.get_service_status(service) for service in self.selected_services},
+                'processes': {
+                    proc: "Running" if proc in self.processes else "Not Running"
+                    for proc in self.selected_processes
+                }
+            })
+            return jsonify(status_data)
+
+        @self.app.route('/events')
+        def events():
+            try:
+                since = parse_time(request.args.get('since'))
+                until = parse_time(request.args.get('until'))
+                limit = int(request.args.get('limit', EVENTS_PAGE_LIMIT))
+                offset = int(request.args.get('offset', 0))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify(self.journal.query(since, until, request.args.get('type'), request.args.get('name'),
+                                              limit=min(limit, EVENTS_PAGE_LIMIT), offset=offset))
+
+        @self.app.route('/history')
+        def history():
+            metric = request.args.get('metric')
+            if not metric:
+                return jsonify({'error': "metric is required"}), 400
+            try:
+                end = parse_time(request.args.get('to')) or self.clock.time()
+                start = parse_time(request.args.get('from')) or end - HISTORY_RANGE
+                step = float(request.args['step']) if request.args.get('step') else None
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            labels = {name: value for name, value in request.args.items() if name not in HISTORY_ARGS}
+            keys = [key for key in self.history.keys(metric)
+                    if all(dict(key[1]).get(name) == value for name, value in labels.items())]
+            if request.args.get('format') == 'binary' or request.accept_mimetypes.best == 'application/octet-stream':
+                return Response(stream_binary(self.history, keys, start, end, step),
+                                mimetype='application/octet-stream')
+            return Response(stream_json(self.history, keys, start, end, step), mimetype='application/json')
+
+        @self.app.route('/status/self')
+        def status_self():
+            return jsonify({**self.instrumentation.report(), 'workers': self.supervisor.inventory()})
+
+        @self.app.route('/status/memory')
+        def status_memory():
+            against = request.args.get('diff', 'first')
+            if against not in ('first', 'previous'):
+                return jsonify({'error': "diff must be first or previous"}), 400
+            try:
+                top = int(request.args.get('top', TOP_ALLOCATIONS))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            return jsonify({**self.memory_report(against, top), 'counts': self.memory_counts()})
+
+        @self.app.route('/profile', methods=['POST'])
+        def profile():
+            # stacks show what the agent is doing, so this one needs the token even on a trusted network
+            if not self.profile_token:
+                return jsonify({'error': "profiling is off, set Profile_Token in [SERVER]"}), 403
+            if not hmac.compare_digest(request.headers.get('Authorization', '').encode(),
+                                       f"Bearer {self.profile_token}".encode()):
+                return jsonify({'error': "a valid bearer token is required"}), 401
+            try:
+                seconds = float(request.args.get('seconds', PROFILE_SECONDS))
+                rate = float(request.args.get('rate', PROFILE_RATE))
+                captured, _ = self.capture_profile(seconds, rate, self.profile_cancel)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            except RuntimeError as e:
+                return jsonify({'error': str(e)}), 409
+            if request.args.get('format') == 'json':
+                return jsonify({**captured.describe(), 'hottest': captured.hottest()})
+            return Response(captured.collapsed(request.args.get('thread')), mimetype='text/plain')
+
+    def start_flask_server(self):
+        """Serve the routes in a supervised thread, replacing a server started earlier."""
+        self.setup_flask_routes()
+        self.supervisor.start('flask', self.run_flask_server)
+
+    def run_flask_server(self, token):
+        from werkzeug.serving import make_server
+
+        server = make_server(self.server_ip.get(), self.server_port.get(), self.app, threaded=True)
+        server.timeout = SERVER_POLL_INTERVAL
+        try:
+            while not token.cancelled:
+                server.handle_request()
+        finally:
+            server.server_close()
+
@@ -1,26 +1,42 @@
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
-def send_email(subject, body, config):
-    smtp_server = config['EMAIL']['SMTP_Server']
-    smtp_port = config['EMAIL']['SMTP_Port']
-    email_from = config['EMAIL']['From']
-    email_password = config['EMAIL']['Password']
-    email_to_list = config['EMAIL']['To'].split(',')
+from app.alerts import RenderedAlert, markup_to_text
 
+
+def build_message(rendered, email_from, email_to_list, subject=None):
+    """One multipart message with the plain-text and HTML variants of a rendered alert."""
     msg = MIMEMultipart("alternative")
     msg['From'] = email_from
     msg['To'] = ', '.join(email_to_list)
-    msg['Subject'] = subject
+    msg['Subject'] = subject or rendered.subject
+
+    # plain text first, so clients that can show HTML prefer the last part
+    msg.attach(MIMEText(rendered.text, 'plain'))
+    msg.attach(MIMEText(rendered.html, 'html'))
+    return msg
+
 
-    msg.attach(MIMEText(body, 'html'))
+def send_smtp(msg, smtp_server, smtp_port, email_from, email_password, email_to_list):
+    """Deliver a finished message over SMTP with STARTTLS; raises on failure."""
+    import smtplib
 
+    server = smtplib.SMTP(smtp_server, int(smtp_port))
     try:
-        server = smtplib.SMTP(smtp_server, int(smtp_port))
         server.starttls()
         server.login(email_from, email_password)
         server.sendmail(email_from, email_to_list, msg.as_string())
+    finally:
         server.quit()
+
+
+def send_email(subject, body, config):
+    """Send an HTML body to the recipients of the config's [EMAIL] section."""
+    email_from = config['EMAIL']['From']
+    email_to_list = config['EMAIL']['To'].split(',')
+    msg = build_message(RenderedAlert(subject, body, markup_to_text(body)), email_from, email_to_list)
+    try:
+        send_smtp(msg, config['EMAIL']['SMTP_Server'], config['EMAIL']['SMTP_Port'], email_from,
+                  config['EMAIL']['Password'], email_to_list)
     except Exception as e:
         print(f"Failed to send email: {e}")
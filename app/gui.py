@@ -1,76 +1,58 @@
 import tkinter as tk
 from tkinter import messagebox, simpledialog, ttk
-import psutil
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import threading
 import time
-import configparser
-from PIL import Image, ImageTk
-import pystray
-from pystray import MenuItem as item
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import win32serviceutil
-import socket
-from flask import Flask, jsonify, render_template
-
-
-class ServiceMonitorApp:
-    def __init__(self, root):
+from app.config import save_config
+from app.core import MonitorCore, CONFIG_POLL_INTERVAL
+from app.profiler import PROFILE_SECONDS
+from app.rules import series_key
+from app.search import SearchIndex, sync_listbox
+from app.views import CoreHeatmap, Sparklines, SPARKLINE_POINTS
+
+# Graphs, the tray icon and the web server pull in matplotlib, pystray, PIL and Flask.
+# They are imported where the feature is first used so the window comes up quickly.
+
+TK_VARIABLES = {int: tk.IntVar, bool: tk.BooleanVar, str: tk.StringVar}
+DIAGNOSTICS_REFRESH_INTERVAL = 2000  # ms
+SEARCH_DEBOUNCE = 150  # ms of typing pause before the scanned list is filtered
+EVENTS_PAGE_SIZE = 100
+GRAPH_BACKFILL = 600  # seconds of recorded CPU and RAM history a new graph window starts with
+GRAPH_POINTS = 3600  # points a graph window keeps, so one left open for days does not grow without bound
+EVENT_TYPES = ("All", "service", "process", "probe", "alert", "restart", "notification", "log", "profile")
+
+
+def format_rate(bytes_per_second):
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if bytes_per_second < 1024:
+            return f"{bytes_per_second:.1f} {unit}"
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.1f} GB/s"
+
+
+def format_worker(worker):
+    restarts = f", {worker['restarts']} restarts" if worker['restarts'] else ""
+    return f"{worker['name']} ({worker['state']}{restarts})"
+
+
+class ServiceMonitorApp(MonitorCore):
+    def __init__(self, root, provider=None):
         self.root = root
         self.root.title("CyberMoose Watch")
         self.root.geometry("1050x900")  # Set a default window size
 
         # Set window and icon
-        self.icon_image = ImageTk.PhotoImage(file="assets/icon.png")
+        try:
+            from PIL import ImageTk
+            self.icon_image = ImageTk.PhotoImage(file="assets/icon.png")
+        except ImportError:
+            self.icon_image = tk.PhotoImage(file="assets/icon.png")
         self.root.iconphoto(True, self.icon_image)  # Taskbar icon
 
-        # Load configuration
-        self.config = configparser.ConfigParser()
-        self.config.read('config.ini')
-
-        # Initialize
-        self.services = []
-        self.processes = []
-        self.selected_services = self.config.get('MONITORING', 'Services', fallback='').split(',')
-        self.selected_processes = self.config.get('MONITORING', 'Processes', fallback='').split(',')
-        self.disk_thresholds = {}
-        self.cpu_threshold = tk.IntVar(value=self.config.getint('HARDWARE', 'CPU_Threshold', fallback=80))
-        self.ram_threshold = tk.IntVar(value=self.config.getint('HARDWARE', 'RAM_Threshold', fallback=80))
-        self.max_restart_attempts = tk.IntVar(value=self.config.getint('HARDWARE', 'Max_Restart_Attempts', fallback=3))
-        self.auto_restart_service = tk.BooleanVar(
-            value=self.config.getboolean('HARDWARE', 'Auto_Restart_Service', fallback=False))
-
-        self.email_frequency = tk.IntVar(value=self.config.getint('EMAIL', 'Frequency', fallback=30))
-        self.send_repeat_email = tk.BooleanVar(value=self.config.getboolean('EMAIL', 'SendRepeatEmail', fallback=False))
-
-        self.daily_report = tk.BooleanVar(value=self.config.getboolean('REPORTS', 'DailyReport', fallback=False))
-        self.weekly_report = tk.BooleanVar(value=self.config.getboolean('REPORTS', 'WeeklyReport', fallback=False))
-        self.monthly_report = tk.BooleanVar(value=self.config.getboolean('REPORTS', 'MonthlyReport', fallback=False))
-
-        self.report_active = tk.BooleanVar(value=self.config.getboolean('REPORTS', 'ReportActive', fallback=False))
-
-        self.last_service_status = {}
-        self.last_process_status = {}
-        self.last_email_sent = {}
-
-        # Email configuration
-        self.smtp_server = tk.StringVar(value=self.config.get('EMAIL', 'SMTP_Server', fallback='smtp.gmail.com'))
-        self.smtp_port = tk.StringVar(value=self.config.get('EMAIL', 'SMTP_Port', fallback='587'))
-        self.email_from = tk.StringVar(value=self.config.get('EMAIL', 'From', fallback=''))
-        self.email_password = tk.StringVar(value=self.config.get('EMAIL', 'Password', fallback=''))
-        self.email_to = tk.StringVar(value=self.config.get('EMAIL', 'To', fallback=''))
-        self.email_subject = tk.StringVar(value=self.config.get('EMAIL', 'Subject', fallback='Service Alert'))
-
-        # Server configuration
-        hostname = socket.gethostname()
-        default_ip = socket.gethostbyname(hostname)
-        self.server_ip = tk.StringVar(value=self.config.get('SERVER', 'IP', fallback=default_ip))
-        self.server_port = tk.IntVar(value=self.config.getint('SERVER', 'Port', fallback=5000))
-        self.enable_remote_monitoring = tk.BooleanVar(
-            value=self.config.getboolean('SERVER', 'EnableRemoteMonitoring', fallback=False))
+        self.tray_icon = None
+        self.search_indexes = {}
+        self.shown_items = {"services": [], "processes": []}
+        self.pending_searches = {}
+        self.tk_widget_count = 0  # counted on the Tk thread, read by /status/memory
+        super().__init__(provider=provider)
 
         # Tabbed interface
         self.notebook = ttk.Notebook(self.root)
@@ -81,12 +63,16 @@ class ServiceMonitorApp:
         self.manage_services_frame = ttk.Frame(self.notebook)
         self.manage_processes_frame = ttk.Frame(self.notebook)
         self.settings_frame = ttk.Frame(self.notebook)
+        self.events_frame = ttk.Frame(self.notebook)
+        self.diagnostics_frame = ttk.Frame(self.notebook)
         self.about_frame = ttk.Frame(self.notebook)  # New frame for the About tab
 
         self.notebook.add(self.system_status_frame, text="System Status")
         self.notebook.add(self.manage_services_frame, text="Manage Services")
         self.notebook.add(self.manage_processes_frame, text="Manage Processes")
         self.notebook.add(self.settings_frame, text="Settings")
+        self.notebook.add(self.events_frame, text="Events")
+        self.notebook.add(self.diagnostics_frame, text="Diagnostics")
         self.notebook.add(self.about_frame, text="About")  # Add the About tab
 
         # GUI components for each frame
@@ -94,6 +80,8 @@ class ServiceMonitorApp:
         self.create_manage_services_widgets()
         self.create_manage_processes_widgets()
         self.create_settings_widgets()
+        self.create_events_widgets()
+        self.create_diagnostics_widgets()
         self.create_about_widgets()  # Create widgets for the About tab
 
         # System tray icon
@@ -105,10 +93,24 @@ class ServiceMonitorApp:
         # Start the monitoring process
         self.start_monitoring()
 
+        # Pick up edits to config.ini without a restart
+        self.root.after(CONFIG_POLL_INTERVAL, self.poll_config_file)
+        self.root.after(DIAGNOSTICS_REFRESH_INTERVAL, self.refresh_diagnostics)
+
         # Setup Flask server if enabled
         if self.enable_remote_monitoring.get():
-            self.setup_flask_routes()
-            threading.Thread(target=self.run_flask_server, daemon=True).start()
+            self.start_flask_server()
+
+    def create_variable(self, kind):
+        return TK_VARIABLES[kind](master=self.root)
+
+    def on_tick(self):
+        self.root.after(0, self.refresh_status)
+
+    def poll_config_file(self):
+        """Reload config.ini when it changed on disk and apply it to the running monitor."""
+        self.reload_config_if_changed()
+        self.root.after(CONFIG_POLL_INTERVAL, self.poll_config_file)
 
     def create_about_widgets(self):
         """Create widgets for the About tab."""
@@ -165,15 +167,19 @@ class ServiceMonitorApp:
                                                                                            padx=10, pady=5)
         self.cpu_label = tk.Label(self.system_status_frame, text="0%", font=('Helvetica', 12))
         self.cpu_label.grid(row=1, column=1, sticky='w', padx=10, pady=5)
+        self.cpu_state_label = tk.Label(self.system_status_frame, text="", font=('Helvetica', 12, 'bold'))
+        self.cpu_state_label.grid(row=1, column=2, sticky='w', padx=10, pady=5)
 
         tk.Label(self.system_status_frame, text="RAM Usage:", font=('Helvetica', 12)).grid(row=2, column=0, sticky='w',
                                                                                            padx=10, pady=5)
         self.ram_label = tk.Label(self.system_status_frame, text="0%", font=('Helvetica', 12))
         self.ram_label.grid(row=2, column=1, sticky='w', padx=10, pady=5)
+        self.ram_state_label = tk.Label(self.system_status_frame, text="", font=('Helvetica', 12, 'bold'))
+        self.ram_state_label.grid(row=2, column=2, sticky='w', padx=10, pady=5)
 
         self.disk_labels = []
         row = 3
-        for partition in psutil.disk_partitions():
+        for partition in self.provider.disk_partitions():
             if partition.fstype:
                 label = tk.Label(self.system_status_frame, text=f"Disk {partition.device}:", font=('Helvetica', 12))
                 label.grid(row=row, column=0, sticky='w', padx=10, pady=5)
@@ -182,6 +188,32 @@ class ServiceMonitorApp:
                 self.disk_labels.append((label, usage_label))
                 row += 1
 
+        tk.Label(self.system_status_frame, text="Network:", font=('Helvetica', 12)).grid(row=row, column=0, sticky='nw',
+                                                                                         padx=10, pady=5)
+        self.network_label = tk.Label(self.system_status_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.network_label.grid(row=row, column=1, columnspan=2, sticky='w', padx=10, pady=5)
+        row += 1
+
+        # canvases whose items are created once and only recoloured or moved on refresh
+        tk.Label(self.system_status_frame, text="CPU Cores:", font=('Helvetica', 12)).grid(row=row, column=0,
+                                                                                           sticky='nw', padx=10, pady=5)
+        self.core_heatmap = CoreHeatmap(tk.Canvas(self.system_status_frame, width=1, height=1, highlightthickness=0))
+        self.core_heatmap.canvas.grid(row=row, column=1, columnspan=2, sticky='w', padx=10, pady=5)
+        row += 1
+
+        tk.Label(self.system_status_frame, text="Cgroups:", font=('Helvetica', 12)).grid(row=row, column=0, sticky='nw',
+                                                                                         padx=10, pady=5)
+        self.cgroups_label = tk.Label(self.system_status_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.cgroups_label.grid(row=row, column=1, columnspan=2, sticky='w', padx=10, pady=5)
+        row += 1
+
+        tk.Label(self.system_status_frame, text="Disk I/O:", font=('Helvetica', 12)).grid(row=row, column=0,
+                                                                                          sticky='nw', padx=10, pady=5)
+        self.disk_io_sparklines = Sparklines(tk.Canvas(self.system_status_frame, width=520, height=1,
+                                                       highlightthickness=0))
+        self.disk_io_sparklines.canvas.grid(row=row, column=1, columnspan=2, sticky='w', padx=10, pady=5)
+        row += 1
+
         # frames for services and processes
         self.services_scroll_frame = tk.Frame(self.system_status_frame)
         self.services_scroll_frame.grid(row=row, column=0, columnspan=2, pady=(10, 0), sticky='nsew')
@@ -253,8 +285,7 @@ class ServiceMonitorApp:
                                                                                                                 sticky='ew',
                                                                                                                 padx=10,
                                                                                                                 pady=5)
-        self.service_search_var.trace("w", lambda *args: self.update_filtered_items(self.service_search_var.get(),
-                                                                                    "services"))
+        self.service_search_var.trace("w", lambda *args: self.schedule_search("services"))
 
         self.lst_scanned_services = tk.Listbox(self.manage_services_frame, selectmode=tk.MULTIPLE, bg='#f0f0f0',
                                                fg='#000', font=('Helvetica', 12))
@@ -310,8 +341,7 @@ class ServiceMonitorApp:
                                                                                                                  sticky='ew',
                                                                                                                  padx=10,
                                                                                                                  pady=5)
-        self.process_search_var.trace("w", lambda *args: self.update_filtered_items(self.process_search_var.get(),
-                                                                                    "processes"))
+        self.process_search_var.trace("w", lambda *args: self.schedule_search("processes"))
 
         self.lst_scanned_processes = tk.Listbox(self.manage_processes_frame, selectmode=tk.MULTIPLE, bg='#f0f0f0',
                                                 fg='#000', font=('Helvetica', 12))
@@ -427,40 +457,307 @@ class ServiceMonitorApp:
         tk.Checkbutton(self.settings_frame, text="Activate Reports", variable=self.report_active,
                        font=('Helvetica', 12)).grid(row=8, column=2, columnspan=2, padx=10, pady=5)
 
-        tk.Label(self.settings_frame, text="Server IP:", font=('Helvetica', 12)).grid(row=9, column=0, sticky='w', padx=10,
+        tk.Label(self.settings_frame, text="CPU Clear Threshold (%):", font=('Helvetica', 12)).grid(row=9, column=0,
+                                                                                                    sticky='w', padx=10,
+                                                                                                    pady=5)
+        tk.Entry(self.settings_frame, textvariable=self.cpu_clear_threshold, font=('Helvetica', 12)).grid(row=9, column=1,
+                                                                                                          sticky='ew',
+                                                                                                          padx=10, pady=5)
+
+        tk.Label(self.settings_frame, text="CPU Sustained For (s):", font=('Helvetica', 12)).grid(row=9, column=2,
+                                                                                                  sticky='w', padx=10,
+                                                                                                  pady=5)
+        tk.Entry(self.settings_frame, textvariable=self.cpu_duration, font=('Helvetica', 12)).grid(row=9, column=3,
+                                                                                                   sticky='ew', padx=10,
+                                                                                                   pady=5)
+
+        tk.Label(self.settings_frame, text="RAM Clear Threshold (%):", font=('Helvetica', 12)).grid(row=10, column=0,
+                                                                                                    sticky='w', padx=10,
+                                                                                                    pady=5)
+        tk.Entry(self.settings_frame, textvariable=self.ram_clear_threshold, font=('Helvetica', 12)).grid(row=10, column=1,
+                                                                                                          sticky='ew',
+                                                                                                          padx=10, pady=5)
+
+        tk.Label(self.settings_frame, text="RAM Sustained For (s):", font=('Helvetica', 12)).grid(row=10, column=2,
+                                                                                                  sticky='w', padx=10,
+                                                                                                  pady=5)
+        tk.Entry(self.settings_frame, textvariable=self.ram_duration, font=('Helvetica', 12)).grid(row=10, column=3,
+                                                                                                   sticky='ew', padx=10,
+                                                                                                   pady=5)
+
+        tk.Label(self.settings_frame, text="Server IP:", font=('Helvetica', 12)).grid(row=11, column=0, sticky='w', padx=10,
                                                                                       pady=5)
-        tk.Entry(self.settings_frame, textvariable=self.server_ip, font=('Helvetica', 12)).grid(row=9, column=1,
+        tk.Entry(self.settings_frame, textvariable=self.server_ip, font=('Helvetica', 12)).grid(row=11, column=1,
                                                                                                 sticky='ew', padx=10,
                                                                                                 pady=5)
 
-        tk.Label(self.settings_frame, text="Server Port:", font=('Helvetica', 12)).grid(row=9, column=2, sticky='w',
+        tk.Label(self.settings_frame, text="Server Port:", font=('Helvetica', 12)).grid(row=11, column=2, sticky='w',
                                                                                         padx=10, pady=5)
-        tk.Entry(self.settings_frame, textvariable=self.server_port, font=('Helvetica', 12)).grid(row=9, column=3,
+        tk.Entry(self.settings_frame, textvariable=self.server_port, font=('Helvetica', 12)).grid(row=11, column=3,
                                                                                                   sticky='ew', padx=10,
                                                                                                   pady=5)
 
         tk.Checkbutton(self.settings_frame, text="Enable Remote Monitoring", variable=self.enable_remote_monitoring,
-                       font=('Helvetica', 12)).grid(row=10, column=0, columnspan=4, padx=10, pady=5)
+                       font=('Helvetica', 12)).grid(row=12, column=0, columnspan=4, padx=10, pady=5)
 
         tk.Button(self.settings_frame, text="Set Disk Thresholds", command=self.set_disk_thresholds, font=('Helvetica', 12),
-                  bg="#E0E0E0", fg="black").grid(row=11, column=0, columnspan=2, sticky='ew', padx=10, pady=5)
+                  bg="#E0E0E0", fg="black").grid(row=13, column=0, columnspan=2, sticky='ew', padx=10, pady=5)
         tk.Button(self.settings_frame, text="Test Connection", command=self.test_email_connection, font=('Helvetica', 12),
-                  bg="#E0E0E0", fg="black").grid(row=11, column=2, columnspan=2, sticky='ew', padx=10, pady=5)
+                  bg="#E0E0E0", fg="black").grid(row=13, column=2, columnspan=2, sticky='ew', padx=10, pady=5)
 
         tk.Button(self.settings_frame, text="Save", command=self.save_settings, font=('Helvetica', 12), bg="#E0E0E0",
-                  fg="black").grid(row=12, column=0, columnspan=4, sticky='ew', padx=10, pady=5)
+                  fg="black").grid(row=14, column=0, columnspan=4, sticky='ew', padx=10, pady=5)
 
         tk.Button(self.settings_frame, text="Send Instant Report", command=self.send_instant_report, font=('Helvetica', 12),
-                  bg="#E0E0E0", fg="black").grid(row=13, column=0, columnspan=4, pady=10, sticky='ew', padx=10)
+                  bg="#E0E0E0", fg="black").grid(row=15, column=0, columnspan=4, pady=10, sticky='ew', padx=10)
 
         tk.Button(self.settings_frame, text="Back", command=lambda: self.show_frame(self.system_status_frame),
-                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").grid(row=14, column=0, columnspan=4, pady=10,
+                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").grid(row=16, column=0, columnspan=4, pady=10,
                                                                          sticky='ew', padx=10)
 
+    def create_events_widgets(self):
+        tk.Label(self.events_frame, text="Events", font=('Helvetica', 16, 'bold')).grid(row=0, column=0, columnspan=7,
+                                                                                        pady=10)
+
+        tk.Label(self.events_frame, text="Type:", font=('Helvetica', 12)).grid(row=1, column=0, sticky='w', padx=10)
+        self.event_type_var = tk.StringVar(value=EVENT_TYPES[0])
+        ttk.Combobox(self.events_frame, textvariable=self.event_type_var, values=EVENT_TYPES, state='readonly',
+                     width=12).grid(row=1, column=1, sticky='w')
+        tk.Label(self.events_frame, text="Name:", font=('Helvetica', 12)).grid(row=1, column=2, sticky='w', padx=10)
+        self.event_name_var = tk.StringVar()
+        tk.Entry(self.events_frame, textvariable=self.event_name_var, font=('Helvetica', 12)).grid(row=1, column=3,
+                                                                                                   sticky='ew')
+        tk.Label(self.events_frame, text="Last days:", font=('Helvetica', 12)).grid(row=1, column=4, sticky='w',
+                                                                                    padx=10)
+        self.event_days_var = tk.IntVar(master=self.root, value=30)
+        tk.Entry(self.events_frame, textvariable=self.event_days_var, width=5, font=('Helvetica', 12)).grid(row=1,
+                                                                                                            column=5,
+                                                                                                            sticky='w')
+        tk.Button(self.events_frame, text="Search", command=lambda: self.show_events_page(0), font=('Helvetica', 12),
+                  bg="#E0E0E0", fg="black").grid(row=1, column=6, sticky='ew', padx=10, pady=5)
+
+        self.events_tree = ttk.Treeview(self.events_frame, columns=('type', 'name', 'details'))
+        self.events_tree.heading('#0', text="Time")
+        self.events_tree.heading('type', text="Type")
+        self.events_tree.heading('name', text="Name")
+        self.events_tree.heading('details', text="Details")
+        self.events_tree.column('#0', width=150)
+        self.events_tree.column('type', width=90)
+        self.events_tree.grid(row=2, column=0, columnspan=7, sticky='nsew', padx=10, pady=5)
+
+        self.events_page_label = tk.Label(self.events_frame, text="", font=('Helvetica', 12))
+        self.events_page_label.grid(row=3, column=2, columnspan=3)
+        tk.Button(self.events_frame, text="Newer", command=lambda: self.show_events_page(self.events_page - 1),
+                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").grid(row=3, column=0, columnspan=2, sticky='ew',
+                                                                         padx=10, pady=5)
+        tk.Button(self.events_frame, text="Older", command=lambda: self.show_events_page(self.events_page + 1),
+                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").grid(row=3, column=5, columnspan=2, sticky='ew',
+                                                                         padx=10, pady=5)
+        self.events_page = 0
+        self.events_pages = 1
+        self.events_filters = {}
+        self.events_cursors = [None]  # `before` cursor of each page visited, page 0 starts at the newest event
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed, add='+')
+
+        self.events_frame.grid_rowconfigure(2, weight=1)
+        self.events_frame.grid_columnconfigure(3, weight=1)
+
+    def on_tab_changed(self, event):
+        if self.notebook.select() == str(self.events_frame):
+            self.show_events_page(0)
+
+    def show_events_page(self, page):
+        """Show one page of the journal, newest events first; page 0 applies the filters as they are now.
+
+        The journal is read in a background thread, from the page before's cursor rather than an offset.
+        """
+        if page == 0:
+            event_type = self.event_type_var.get()
+            self.events_filters = dict(since=self.clock.time() - self.event_days_var.get() * 86400,
+                                       event_type=None if event_type == EVENT_TYPES[0] else event_type,
+                                       name=self.event_name_var.get().strip() or None)
+            self.events_cursors = [None]
+            self.events_pages = 1
+        elif not 0 < page < min(len(self.events_cursors), self.events_pages):
+            return
+        filters = self.events_filters
+        before = self.events_cursors[page]
+
+        def run(token):
+            try:
+                total = self.journal.count(**filters)
+                events, cursor = self.journal.newest(EVENTS_PAGE_SIZE, before=before, **filters)
+            except (OSError, ValueError) as e:
+                print(f"Failed to read the event journal: {e}")
+                return
+            if not token.cancelled:
+                self.root.after(0, self.set_events_page, page, total, events, cursor)
+
+        # a newer request replaces one still reading, without waiting for it
+        self.supervisor.start('events', run, restart=False, timeout=0)
+
+    def set_events_page(self, page, total, events, cursor):
+        pages = max(1, -(-total // EVENTS_PAGE_SIZE))
+        self.events_page = page
+        self.events_pages = pages
+        del self.events_cursors[page + 1:]
+        self.events_cursors.append(cursor)
+
+        self.events_tree.delete(*self.events_tree.get_children())
+        for event in events:
+            details = ", ".join(f"{key}={value}" for key, value in event.items() if key not in ('t', 'type', 'name'))
+            self.events_tree.insert('', tk.END, text=time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(event['t'])),
+                                    values=(event['type'], event['name'], details))
+        self.events_page_label.config(text=f"Page {page + 1} of {pages} ({total} events)")
+
+    def create_diagnostics_widgets(self):
+        tk.Label(self.diagnostics_frame, text="Diagnostics", font=('Helvetica', 16, 'bold')).grid(row=0, column=0,
+                                                                                                  columnspan=2, pady=10)
+
+        self.agent_usage_label = tk.Label(self.diagnostics_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.agent_usage_label.grid(row=1, column=0, columnspan=2, sticky='w', padx=10, pady=5)
+
+        columns = ('count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+        self.timings_tree = ttk.Treeview(self.diagnostics_frame, columns=columns)
+        self.timings_tree.heading('#0', text="Timing")
+        for column in columns:
+            self.timings_tree.heading(column, text=column.replace('_ms', ' (ms)').capitalize())
+            self.timings_tree.column(column, width=90, anchor='e')
+        self.timings_tree.grid(row=2, column=0, columnspan=2, sticky='nsew', padx=10, pady=5)
+
+        self.counters_label = tk.Label(self.diagnostics_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.counters_label.grid(row=3, column=0, columnspan=2, sticky='w', padx=10, pady=5)
+
+        self.workers_label = tk.Label(self.diagnostics_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.workers_label.grid(row=4, column=0, columnspan=2, sticky='w', padx=10, pady=5)
+
+        self.memory_label = tk.Label(self.diagnostics_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.memory_label.grid(row=5, column=0, sticky='w', padx=10, pady=5)
+        self.memory_details = ""  # traced memory and object counts as of the last diff
+        memory_buttons = ttk.Frame(self.diagnostics_frame)
+        memory_buttons.grid(row=5, column=1, sticky='e', padx=10, pady=5)
+        tk.Button(memory_buttons, text="Diff Since Start", command=lambda: self.show_memory_diff('first'),
+                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").pack(side=tk.LEFT, padx=5)
+        tk.Button(memory_buttons, text="Diff Since Previous", command=lambda: self.show_memory_diff('previous'),
+                  font=('Helvetica', 12), bg="#E0E0E0", fg="black").pack(side=tk.LEFT, padx=5)
+
+        columns = ('size_kb', 'size_diff_kb', 'blocks_diff')
+        self.memory_tree = ttk.Treeview(self.diagnostics_frame, columns=columns)
+        self.memory_tree.heading('#0', text="Allocated at")
+        for column, heading in zip(columns, ("Size (KB)", "Change (KB)", "Blocks change")):
+            self.memory_tree.heading(column, text=heading)
+            self.memory_tree.column(column, width=110, anchor='e')
+        self.memory_tree.grid(row=6, column=0, columnspan=2, sticky='nsew', padx=10, pady=5)
+
+        self.profile_label = tk.Label(self.diagnostics_frame, text="", font=('Helvetica', 12), justify=tk.LEFT)
+        self.profile_label.grid(row=7, column=0, sticky='w', padx=10, pady=5)
+        self.profile_button = tk.Button(self.diagnostics_frame, text=f"Profile {PROFILE_SECONDS} s",
+                                        command=self.start_profile, font=('Helvetica', 12), bg="#E0E0E0", fg="black")
+        self.profile_button.grid(row=7, column=1, sticky='e', padx=15, pady=5)
+
+        self.diagnostics_frame.grid_rowconfigure(2, weight=1)
+        self.diagnostics_frame.grid_rowconfigure(6, weight=1)
+        self.diagnostics_frame.grid_columnconfigure(0, weight=1)
+
+    def refresh_diagnostics(self):
+        """Update the Diagnostics tab while it is visible."""
+        if self.notebook.select() == str(self.diagnostics_frame):
+            with self.instrumentation.timed('refresh_diagnostics'):
+                report = self.instrumentation.report()
+                agent = report['agent']
+                self.agent_usage_label.config(
+                    text=f"Agent CPU: {agent['cpu_percent']}% (lifetime {agent['cpu_percent_lifetime']}%)   "
+                         f"RSS: {agent['rss_mb']} MB   Threads: {agent['threads']}   Uptime: {agent['uptime_s']} s")
+
+                for name, summary in report['timings'].items():
+                    values = tuple(summary[column] for column in self.timings_tree['columns'])
+                    if self.timings_tree.exists(name):
+                        self.timings_tree.item(name, values=values)
+                    else:
+                        self.timings_tree.insert('', tk.END, iid=name, text=name, values=values)
+
+                counters = {**report['counters'], **report['gauges']}
+                self.counters_label.config(text="   ".join(f"{name}: {value}" for name, value in sorted(counters.items())))
+                self.workers_label.config(
+                    text="Workers: " + ", ".join(format_worker(worker) for worker in self.supervisor.inventory()))
+                self.tk_widget_count = self.count_widgets()
+                self.memory_label.config(text=self.memory_summary(agent['rss_mb']))
+        self.root.after(DIAGNOSTICS_REFRESH_INTERVAL, self.refresh_diagnostics)
+
+    def memory_summary(self, rss_mb):
+        watchdog = self.memory_watchdog
+        budget = f" of {watchdog.budget_mb} MB budget" if watchdog.budget_mb else ""
+        tracing = "on" if watchdog.tracing else "off (Memory_Tracing in [MONITORING])"
+        return (f"Memory: RSS {rss_mb} MB{budget}   Tk widgets: {self.tk_widget_count}   "
+                f"Allocation tracing: {tracing}{self.memory_details}")
+
+    def count_widgets(self):
+        widgets = [self.root]
+        count = 0
+        while widgets:
+            count += 1
+            widgets.extend(widgets.pop().winfo_children())
+        return count
+
+    def memory_counts(self):
+        return {**super().memory_counts(), 'tk_widgets': self.tk_widget_count}
+
+    def show_memory_diff(self, against):
+        """Take a snapshot now and list the allocations that changed most since the start or the previous one."""
+        if not self.memory_watchdog.tracing:
+            messagebox.showinfo("Memory", "Set Memory_Tracing = True in [MONITORING] to trace allocations.")
+            return
+        self.tk_widget_count = self.count_widgets()
+        with self.instrumentation.timed('memory_diff'):
+            report = self.memory_report(against)
+        counts = self.memory_counts()
+        self.memory_details = (f"\nTraced: {report['traced_mb']} MB (peak {report['peak_traced_mb']} MB)   " +
+                               "   ".join(f"{name}: {value}" for name, value in sorted(counts.items())))
+        self.memory_label.config(text=self.memory_summary(report['rss_mb']))
+        self.memory_tree.delete(*self.memory_tree.get_children())
+        # nothing to diff against before the first check took its snapshot, so list the largest lines instead
+        for line in report['diff'] or report['top']:
+            self.memory_tree.insert('', tk.END, text=line['location'],
+                                    values=(line['size_kb'], line.get('size_diff_kb', ''), line.get('blocks_diff', '')))
+
+    def start_profile(self):
+        """Sample every thread in the background, the Tk thread included, and show where each one spent its time."""
+        def run(token):
+            try:
+                profile, file_name = self.capture_profile(token=token)
+            except RuntimeError as e:
+                profile, file_name = None, str(e)
+            if not token.cancelled:
+                self.root.after(0, self.show_profile, profile, file_name)
+
+        self.profile_button.config(state=tk.DISABLED)
+        self.profile_label.config(text=f"Profiling for {PROFILE_SECONDS} s...")
+        self.supervisor.start('profiler', run, restart=False)
+
+    def show_profile(self, profile, file_name):
+        self.profile_button.config(state=tk.NORMAL)
+        if profile is None:
+            self.profile_label.config(text=file_name)
+            return
+        total = profile.samples or 1
+        hottest = "\n".join(f"{thread}: {frame} ({100 * count / total:.0f}%)"
+                            for thread, (frame, count) in sorted(profile.hottest().items()))
+        saved = f"Saved to {file_name}" if file_name else "Could not be saved"
+        self.profile_label.config(text=f"{saved}, {profile.samples} samples, "
+                                       f"{profile.describe()['overhead_percent']}% overhead\n{hottest}")
+
     def show_frame(self, frame):
         self.notebook.select(frame)
 
     def create_tray_icon(self):
+        try:
+            from PIL import Image
+            import pystray
+            from pystray import MenuItem as item
+        except ImportError as e:
+            print(f"Tray icon disabled: {e}")
+            return
+
         # icon image for the tray
         image = Image.open("assets/icon.png")
 
@@ -474,20 +771,29 @@ class ServiceMonitorApp:
         self.tray_icon = pystray.Icon("CyberMoose Watch", image, "CyberMoose Watch", menu)
 
         # tray icon in a separate thread
-        threading.Thread(target=self.tray_icon.run, daemon=True).start()
+        self.supervisor.start('tray', self.run_tray_icon, restart=False)
+
+    def run_tray_icon(self, token):
+        token.on_cancel(self.tray_icon.stop)
+        self.tray_icon.run()
 
     def hide_window(self):
+        if self.tray_icon is None:
+            # without a tray icon there would be no way to bring the window back
+            self.exit_app()
+            return
         self.root.withdraw()
 
     def show_window(self, icon=None, item=None):
         self.root.deiconify()
 
     def exit_app(self, icon=None, item=None):
-        self.tray_icon.stop()
+        # stops the tray icon too
+        self.shutdown()
         self.root.quit()
 
     def set_disk_thresholds(self):
-        for partition in psutil.disk_partitions():
+        for partition in self.provider.disk_partitions():
             if partition.fstype:  # Only consider partitions with a filesystem
                 threshold = simpledialog.askinteger("Disk Threshold", f"Set threshold for {partition.device} (% used):",
                                                     minvalue=1, maxvalue=100)
@@ -500,6 +806,8 @@ class ServiceMonitorApp:
         email_from = self.email_from.get()
         email_password = self.email_password.get()
 
+        import smtplib
+
         try:
             server = smtplib.SMTP(smtp_server, int(smtp_port))
             server.starttls()
@@ -524,6 +832,10 @@ class ServiceMonitorApp:
         self.config['HARDWARE'] = {
             'CPU_Threshold': str(self.cpu_threshold.get()),
             'RAM_Threshold': str(self.ram_threshold.get()),
+            'CPU_Clear_Threshold': str(self.cpu_clear_threshold.get()),
+            'RAM_Clear_Threshold': str(self.ram_clear_threshold.get()),
+            'CPU_Duration': str(self.cpu_duration.get()),
+            'RAM_Duration': str(self.ram_duration.get()),
             'Max_Restart_Attempts': str(self.max_restart_attempts.get()),
             'Auto_Restart_Service': str(self.auto_restart_service.get())
         }
@@ -541,15 +853,16 @@ class ServiceMonitorApp:
             'EnableRemoteMonitoring': str(self.enable_remote_monitoring.get())
         }
 
-        with open('config.ini', 'w') as configfile:
-            self.config.write(configfile)
+        save_config(self.config, self.config_file)
+        self.config_watcher.mark_written()
 
         messagebox.showinfo("Settings", "Settings saved successfully!")
 
         # Restart Flask server if the remote monitoring setting is changed
         if self.enable_remote_monitoring.get():
-            self.setup_flask_routes()
-            threading.Thread(target=self.run_flask_server, daemon=True).start()
+            self.start_flask_server()
+        else:
+            self.supervisor.stop('flask')
 
     def save_monitoring_settings(self):
         self.config['MONITORING'] = {
@@ -557,30 +870,66 @@ class ServiceMonitorApp:
             'Processes': ','.join(self.selected_processes)
         }
 
-        with open('config.ini', 'w') as configfile:
-            self.config.write(configfile)
+        save_config(self.config, self.config_file)
+        self.config_watcher.mark_written()
 
         messagebox.showinfo("Settings", "Monitoring settings saved successfully!")
 
     def scan_services(self):
-        self.services = [service.name() for service in psutil.win_service_iter()]
-        self.update_filtered_items("", "services")
+        self.start_scan("services", lambda: [service.name() for service in self.provider.win_service_iter()])
 
     def scan_processes(self):
-        self.processes = [proc.info['name'] for proc in psutil.process_iter(['name'])]
-        self.update_filtered_items("", "processes")
+        self.start_scan("processes", lambda: [proc.info['name'] for proc in self.provider.process_iter(['name'])])
 
-    def update_filtered_items(self, search_text, item_type):
+    def start_scan(self, item_type, scan):
+        """Scan and index in a background thread; the listbox is filled on the Tk thread when it is done."""
+        def run(token):
+            try:
+                index = SearchIndex(scan())
+            except Exception as e:
+                print(f"Failed to scan {item_type}: {e}")
+                return
+            if not token.cancelled:
+                self.root.after(0, self.set_scanned_items, item_type, index)
+
+        self.scan_thread = self.supervisor.start(f"scan {item_type}", run, restart=False).thread
+
+    def set_scanned_items(self, item_type, index):
+        self.search_indexes[item_type] = index
         if item_type == "services":
-            filtered_services = [service for service in self.services if search_text.lower() in service.lower()]
-            self.lst_scanned_services.delete(0, tk.END)
-            for service in filtered_services:
-                self.lst_scanned_services.insert(tk.END, service)
-        elif item_type == "processes":
-            filtered_processes = [proc for proc in self.processes if search_text.lower() in proc.lower()]
-            self.lst_scanned_processes.delete(0, tk.END)
-            for proc in filtered_processes:
-                self.lst_scanned_processes.insert(tk.END, proc)
+            self.services = index.items
+        else:
+            self.processes = index.items
+        # a new index means new positions, so start the listbox over
+        self.scanned_listboxes()[item_type].delete(0, tk.END)
+        self.shown_items[item_type] = []
+        self.update_filtered_items(self.search_variables()[item_type].get(), item_type)
+
+    def scanned_listboxes(self):
+        return {"services": self.lst_scanned_services, "processes": self.lst_scanned_processes}
+
+    def search_variables(self):
+        return {"services": self.service_search_var, "processes": self.process_search_var}
+
+    def schedule_search(self, item_type):
+        """Filter once typing pauses instead of on every keystroke."""
+        pending = self.pending_searches.get(item_type)
+        if pending is not None:
+            self.root.after_cancel(pending)
+        self.pending_searches[item_type] = self.root.after(
+            SEARCH_DEBOUNCE, lambda: self.run_search(item_type))
+
+    def run_search(self, item_type):
+        self.pending_searches[item_type] = None
+        self.update_filtered_items(self.search_variables()[item_type].get(), item_type)
+
+    def update_filtered_items(self, search_text, item_type):
+        index = self.search_indexes.get(item_type)
+        if index is None:
+            return
+        with self.instrumentation.timed('search'):
+            self.shown_items[item_type] = sync_listbox(self.scanned_listboxes()[item_type], index.items,
+                                                       self.shown_items[item_type], index.search(search_text))
 
     def add_to_monitor_list(self):
         selected_services = self.lst_scanned_services.curselection()
@@ -622,30 +971,35 @@ class ServiceMonitorApp:
 
         self.refresh_status()
 
-    def start_monitoring(self):
-        self.monitoring_thread = threading.Thread(target=self.monitor_services_and_processes, daemon=True)
-        self.monitoring_thread.start()
-
-    def monitor_services_and_processes(self):
-        while True:
-            self.root.after(0, self.refresh_status)
-            self.check_services()
-            self.check_processes()
-            self.check_cpu_ram_usage()
-            self.check_disk_space()
-            self.generate_reports_if_needed()
-            time.sleep(5)  # Check every 5 seconds for live update
-
     def refresh_status(self):
-        self.cpu_label.config(text=f"{psutil.cpu_percent(interval=1)}%")
-        self.ram_label.config(text=f"{psutil.virtual_memory().percent}%")
-
+        with self.instrumentation.timed('refresh_status'):
+            self.update_status_widgets()
+
+    def update_status_widgets(self):
+        status = self.read_status()
+        self.cpu_label.config(text=f"{status['cpu']}%")
+        self.ram_label.config(text=f"{status['ram']}%")
+        rule_states = self.rule_engine.states()
+        self.cpu_state_label.config(text=rule_states.get("CPU Usage", ""))
+        self.ram_state_label.config(text=rule_states.get("RAM Usage", ""))
+
+        partitions = self.provider.disk_partitions()
         for i, (label, usage_label) in enumerate(self.disk_labels):
-            partition = psutil.disk_partitions()[i]
-            if partition.fstype:  # Check if the partition has a file system type
-                usage = psutil.disk_usage(partition.mountpoint).percent
+            usage = status['disks'].get(partitions[i].device)
+            if usage is not None:
                 usage_label.config(text=f"{usage}% used")
 
+        self.network_label.config(text="\n".join(
+            f"{nic}: rx {format_rate(rates['net_rx_bytes'])}, tx {format_rate(rates['net_tx_bytes'])}, "
+            f"{rates['net_rx_packets'] + rates['net_tx_packets']:.0f} pkt/s, "
+            f"errors {rates['net_rx_errors'] + rates['net_tx_errors']:.1f}/s, "
+            f"drops {rates['net_rx_drops'] + rates['net_tx_drops']:.1f}/s"
+            for nic, rates in sorted(self.network_rates.rates.items())))
+
+        self.cgroups_label.config(text="\n".join(self.cgroup_lines()))
+        self.core_heatmap.update(self.core_usage.percents)
+        self.disk_io_sparklines.update(self.disk_io_series())
+
         # Refresh the status of services and processes here (not shown)
 
         for widget in self.services_frame.winfo_children():
@@ -659,284 +1013,42 @@ class ServiceMonitorApp:
             widget.destroy()
 
         for proc in self.selected_processes:
-            proc_status = "Running" if proc in self.processes else "Running"
+            proc_status = self.last_process_status.get(proc, "Unknown")
+            usage = self.process_metrics.totals.get(proc)
+            if usage and usage['proc_instances']:
+                proc_status += (f" ({usage['proc_instances']:.0f}x, CPU {usage['proc_cpu']:.1f}%, "
+                                f"RSS {usage['proc_rss_mb']} MB, {usage['proc_threads']:.0f} threads, "
+                                f"{usage['proc_fds']:.0f} handles, I/O {format_rate(usage['proc_io_read_bytes'])} read, "
+                                f"{format_rate(usage['proc_io_write_bytes'])} write)")
             tk.Label(self.processes_frame, text=f"{proc}: {proc_status}", font=('Helvetica', 12)).grid(sticky="w")
 
-    def get_service_status(self, service_name):
-        if not service_name:
-            return "Monitored"
-        try:
-            service = psutil.win_service_get(service_name)
-            return "Running" if service.status() == 'running' else "Stopped"
-        except Exception as e:
-            return "Not Found"
-
-    def check_services(self):
-        for service_name in self.selected_services:
-            if service_name:
-                current_status = "Running" if self.is_service_running(service_name) else "Stopped"
-                if service_name not in self.last_service_status or current_status != self.last_service_status[
-                    service_name]:
-                    self.handle_service_status_change(service_name, current_status)
-                    self.last_service_status[service_name] = current_status
-
-                    if current_status == "Stopped" and self.auto_restart_service.get():
-                        self.attempt_service_restart(service_name)
-
-    def check_processes(self):
-        running_processes = [proc.info['name'] for proc in psutil.process_iter(['name'])]
-        for proc_name in self.selected_processes:
-            if proc_name:
-                current_status = "Running" if proc_name in running_processes else "Not Running"
-                if proc_name not in self.last_process_status or current_status != self.last_process_status[proc_name]:
-                    self.handle_process_status_change(proc_name, current_status)
-                    self.last_process_status[proc_name] = current_status
-
-    def handle_service_status_change(self, service_name, status):
-        previous_status = self.last_service_status.get(service_name, "Unknown")
-        subject = f"Service {status}"
-        detailed_body = f"The service <strong>{service_name}</strong> is now in a <strong>{status}</strong> state."
-        self.send_email(subject, detailed_body, service_or_process_name=service_name, status=status,
-                        previous_status=previous_status)
-
-    def handle_process_status_change(self, proc_name, status):
-        previous_status = self.last_process_status.get(proc_name, "Unknown")
-        subject = f"Process {status}"
-        detailed_body = f"The process <strong>{proc_name}</strong> is now in a <strong>{status}</strong> state."
-        self.send_email(subject, detailed_body, service_or_process_name=proc_name, status=status,
-                        previous_status=previous_status)
-
-    def attempt_service_restart(self, service_name):
-        """Attempt to restart the service up to the maximum number of times specified."""
-        success = False
-        for attempt in range(1, self.max_restart_attempts.get() + 1):
-            try:
-                win32serviceutil.RestartService(service_name)
-                success = True
-                break
-            except Exception as e:
-                if attempt == self.max_restart_attempts.get():
-                    success = False
-                time.sleep(5)  #!!!!!!! Wait a bit before trying again !!!!!!#
-
-        self.send_restart_report(service_name, success, attempt)
-
-    def send_restart_report(self, service_name, success, attempt):
-        """Send an email report after attempting to restart a service."""
-        status = "Success" if success else "Failure"
-        subject = f"Service Restart {status}: {service_name}"
-        body = f"""
-        <html>
-        <body>
-        <p>The service <strong>{service_name}</strong> was {status.lower()}fully restarted on attempt {attempt}.</p>
-        <p><strong>Final Status:</strong> {status}</p>
-        </body>
-        </html>
-        """
-        self.send_email(subject, body)
-
-    def check_cpu_ram_usage(self):
-        cpu_usage = psutil.cpu_percent(interval=1)
-        ram_usage = psutil.virtual_memory().percent
-
-        if cpu_usage > self.cpu_threshold.get():
-            self.handle_hardware_overload("CPU Usage", cpu_usage, self.cpu_threshold.get())
-        if ram_usage > self.ram_threshold.get():
-            self.handle_hardware_overload("RAM Usage", ram_usage, self.ram_threshold.get())
-
-    def check_disk_space(self):
-        for partition in psutil.disk_partitions():
-            if partition.device in self.disk_thresholds:
-                usage = psutil.disk_usage(partition.mountpoint).percent
-                if usage > self.disk_thresholds[partition.device]:
-                    self.handle_hardware_overload(f"Disk Space {partition.device}", usage,
-                                                  self.disk_thresholds[partition.device])
-
-    def handle_hardware_overload(self, name, current_usage, threshold):
-        # current system uptime
-        uptime_seconds = time.time() - psutil.boot_time()
-        uptime = time.strftime("%H:%M:%S", time.gmtime(uptime_seconds))
-
-        # current CPU and RAM usage details
-        cpu_usage = psutil.cpu_percent(interval=1)
-        ram_usage = psutil.virtual_memory().percent
-
-        # disk usage details
-        partitions = psutil.disk_partitions()
-        disk_usage_details = []
-        for partition in partitions:
-            if partition.fstype:
-                usage = psutil.disk_usage(partition.mountpoint).percent
-                disk_usage_details.append(f"{partition.device}: {usage}% used")
-
-        # top processes by CPU and memory
-        top_processes_by_cpu = sorted(psutil.process_iter(['name', 'cpu_percent']),
-                                      key=lambda p: p.info.get('cpu_percent', 0), reverse=True)[:5]
-        top_processes_by_memory = sorted(psutil.process_iter(['name', 'memory_percent']),
-                                         key=lambda p: p.info.get('memory_percent', 0), reverse=True)[:5]
-
-        top_cpu_processes = "\n".join(
-            [f"{proc.info['name']}: {proc.info.get('cpu_percent', 0)}% CPU" for proc in top_processes_by_cpu])
-
-        top_memory_processes = "\n".join(
-            [f"{proc.info['name']}: {proc.info['memory_percent']:.2f}% Memory" for proc in top_processes_by_memory])
-
-        # detailed message
-        detailed_body = f"""
-        <html>
-        <body>
-        <h2><b>Hardware Overload Detected: {name}</b></h2>
-        <p><b>Alert Timestamp:</b> {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}</p>
-        <p><b>Current System Uptime:</b> {uptime}</p>
-
-        <h3><b>Current Resource Usage:</b></h3>
-        <ul>
-            <li><b>CPU Usage:</b> {cpu_usage}%</li>
-            <li><b>RAM Usage:</b> {ram_usage}%</li>
-        </ul>
-
-        <h3><b>Disk Usage:</b></h3>
-        <ul>
-            {"".join([f"<li>{detail}</li>" for detail in disk_usage_details])}
-        </ul>
-
-        <h3><b>Exceeded Threshold:</b></h3>
-        <p>The {name} has exceeded the threshold:</p>
-        <ul>
-            <li><b>Current Usage:</b> {current_usage}%</li>
-            <li><b>Threshold:</b> {threshold}%</li>
-            <li><b>Exceeded by:</b> {current_usage - threshold}%</li>
-        </ul>
-
-        <h3><b>Top Processes by CPU Usage:</b></h3>
-        <ul>
-            {top_cpu_processes}
-        </ul>
-
-        <h3><b>Top Processes by Memory Usage:</b></h3>
-        <ul>
-            {top_memory_processes}
-        </ul>
-
-        </body>
-        </html>
-        """
-
-        if name not in self.last_email_sent or (
-                time.time() - self.last_email_sent[name]) > self.email_frequency.get() * 60:
-            if self.send_repeat_email.get() or name not in self.last_email_sent:
-                self.send_email(f"Hardware Overload: {name}", detailed_body, service_or_process_name=name,
-                                status="Overloaded")
-                self.last_email_sent[name] = time.time()
-
-    def is_service_running(self, service_name):
-        if not service_name:
-            return False
-        try:
-            service = psutil.win_service_get(service_name)
-            if service.status() == 'running':
-                return True
-        except Exception as e:
-            print(f"Service {service_name} not found: {e}")
-        return False
-
-    def send_email(self, subject, body, service_or_process_name=None, status=None, previous_status=None,
-                   custom_description=None):
-        smtp_server = self.smtp_server.get()
-        smtp_port = self.smtp_port.get()
-        email_from = self.email_from.get()
-        email_password = self.email_password.get()
-        email_to_list = self.email_to.get().split(',')
-
-        # Update the subject to ensure it's the latest from the settings
-        subject = self.email_subject.get()
-
-        # additional system details
-        cpu_usage = psutil.cpu_percent(interval=1)
-        ram_usage = psutil.virtual_memory().percent
-        memory_info = psutil.virtual_memory()
-        load_avg = psutil.getloadavg() if hasattr(psutil, 'getloadavg') else ('N/A', 'N/A', 'N/A')
-        disk_usage_details = "\n".join([
-                                           f"{partition.device}: {psutil.disk_usage(partition.mountpoint).percent}% used, Free: {psutil.disk_usage(partition.mountpoint).free // (1024 ** 2)} MB"
-                                           for partition in psutil.disk_partitions() if partition.fstype])
-        uptime_seconds = time.time() - psutil.boot_time()
-        uptime_string = time.strftime("%H:%M:%S", time.gmtime(uptime_seconds))
-        network_info = psutil.net_io_counters()
-        network_usage = f"Sent: {network_info.bytes_sent} bytes, Received: {network_info.bytes_recv} bytes"
-        active_processes = len(psutil.pids())
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-
-        # Additional top processes by CPU and RAM usage
-        top_processes_by_cpu = sorted(psutil.process_iter(['name', 'cpu_percent']),
-                                      key=lambda p: p.info.get('cpu_percent', 0), reverse=True)[:5]
-        top_processes_by_ram = sorted(psutil.process_iter(['name', 'memory_percent']),
-                                      key=lambda p: p.info.get('memory_percent', 0), reverse=True)[:5]
-
-        top_cpu_processes_details = "\n".join(
-            [f"{proc.info['name']}: {proc.info.get('cpu_percent', 'N/A')}% CPU" for proc in top_processes_by_cpu])
-        top_ram_processes_details = "\n".join(
-            [f"{proc.info['name']}: {proc.info['memory_percent']:.2f}% RAM" for proc in top_processes_by_ram])
-
-        # service or process name, make it bold in the body
-        if service_or_process_name:
-            body = f"""
-            <html>
-            <body>
-            <p><strong>Alert:</strong> The following {('service' if 'Service' in subject else 'process')} has changed its status:</p>
-            <p><strong>Name:</strong> <strong>{service_or_process_name}</strong></p>
-            <p><strong>New Status:</strong> <strong>{status}</strong></p>
-            <p><strong>Previous Status:</strong> {previous_status}</p>
-            <p><strong>Description:</strong> {custom_description or 'N/A'}</p>
-            <p><strong>Timestamp:</strong> {timestamp}</p>
-            <hr>
-            <p><strong>System Status at the Time of Alert:</strong></p>
-            <ul>
-                <li><strong>CPU Usage:</strong> {cpu_usage}%</li>
-                <li><strong>RAM Usage:</strong> {ram_usage}% (Total: {memory_info.total // (1024 ** 2)} MB, Available: {memory_info.available // (1024 ** 2)} MB)</li>
-                <li><strong>Disk Usage:</strong><br>{disk_usage_details}</li>
-                <li><strong>Network Usage:</strong> {network_usage}</li>
-                <li><strong>Active Processes:</strong> {active_processes}</li>
-                <li><strong>System Uptime:</strong> {uptime_string}</li>
-                <li><strong>Load Average (1, 5, 15 min):</strong> {load_avg[0]}, {load_avg[1]}, {load_avg[2]}</li>
-            </ul>
-            <hr>
-            <p><strong>Top Processes by CPU Usage:</strong></p>
-            <pre>{top_cpu_processes_details}</pre>
-            <p><strong>Top Processes by RAM Usage:</strong></p>
-            <pre>{top_ram_processes_details}</pre>
-            <hr>
-            <p>This is an automated message from CyberMoose Watch.</p>
-            </body>
-            </html>
-            """
-        else:
-            body = f"""
-            <html>
-            <body>
-            <p>{body}</p>
-            <hr>
-            <p>This is an automated message from CyberMoose Watch.</p>
-            </body>
-            </html>
-            """
-
-        msg = MIMEMultipart("alternative")
-        msg['From'] = email_from
-        msg['To'] = ', '.join(email_to_list)
-        msg['Subject'] = subject  # Ensure the latest subject is used here
-
-        # HTML version of the body
-        msg.attach(MIMEText(body, 'html'))
-
-        try:
-            server = smtplib.SMTP(smtp_server, int(smtp_port))
-            server.starttls()
-            server.login(email_from, email_password)
-            server.sendmail(email_from, email_to_list, msg.as_string())
-            server.quit()
-            print(f"Email sent with subject: {subject}")
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+    def cgroup_lines(self):
+        lines = []
+        for name, usage in sorted(self.cgroups.values.items()):
+            line = f"{name}: CPU {usage.get('cgroup_cpu', 0):.1f}%, memory {usage.get('cgroup_memory_mb', 0):.0f} MB"
+            if 'cgroup_memory_percent' in usage:
+                line += f" ({usage['cgroup_memory_percent']:.0f}% of limit)"
+            if usage.get('cgroup_throttled'):
+                line += f", throttled {usage['cgroup_throttled']:.0f}%"
+            lines.append(line)
+        if self.cgroups.pressure:
+            lines.append("Pressure (some/full, 10 s): " + ", ".join(
+                f"{resource} {stalls.get('some', 0):.1f}/{stalls.get('full', 0):.1f}%"
+                for resource, stalls in self.cgroups.pressure.items()))
+        return lines
+
+    def disk_io_series(self):
+        """Recent throughput (read plus write) and a summary line per disk, for the sparklines."""
+        series = {}
+        for device, rates in sorted(self.disk_io_rates.rates.items()):
+            reads = self.history.recent(series_key('disk_read_bytes', device=device), SPARKLINE_POINTS)
+            writes = self.history.recent(series_key('disk_write_bytes', device=device), SPARKLINE_POINTS)
+            series[device] = ([read + write for read, write in zip(reads, writes)],
+                              f"{device}: read {format_rate(rates['disk_read_bytes'])}, "
+                              f"write {format_rate(rates['disk_write_bytes'])}, "
+                              f"{rates['disk_read_iops'] + rates['disk_write_iops']:.0f} IOPS, "
+                              f"{rates['disk_busy']:.0f}% busy")
+        return series
 
     def load_monitored_items(self):
         """Load the monitored services and processes from config and populate the listboxes."""
@@ -969,20 +1081,10 @@ class ServiceMonitorApp:
             if service_name:
                 self.control_service(service_name, 'restart')
 
-    def control_service(self, service_name, action):
-        try:
-            service = psutil.win_service_get(service_name)
-            if action == 'start' and service.status() != 'running':
-                win32serviceutil.StartService(service_name)
-            elif action == 'stop' and service.status() == 'running':
-                win32serviceutil.StopService(service_name)
-            elif action == 'restart':
-                win32serviceutil.RestartService(service_name)
-            print(f"Service '{service_name}' {action}ed successfully.")
-        except Exception as e:
-            print(f"Failed to {action} service '{service_name}': {e}")
-
     def show_graphical_monitoring(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         #  new window for the graphs
         graph_window = tk.Toplevel(self.root)
         graph_window.title("Graphical Monitoring")
@@ -1006,28 +1108,45 @@ class ServiceMonitorApp:
         ram_canvas = FigureCanvasTkAgg(ram_fig, master=graph_window)
         ram_canvas.get_tk_widget().pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
-        # updating the graphs in a separate thread
-        threading.Thread(target=self.update_graphs, args=(cpu_ax, ram_ax), daemon=True).start()
+        # updating the graphs in a separate thread, until the window is closed
+        name = f"graphs {graph_window}"
+        self.supervisor.start(name, self.update_graphs, cpu_ax, ram_ax)
 
-    def update_graphs(self, cpu_ax, ram_ax):
+        def close_graphs():
+            self.supervisor.cancel(name)
+            plt.close(cpu_fig)
+            plt.close(ram_fig)
+            graph_window.destroy()
+
+        graph_window.protocol("WM_DELETE_WINDOW", close_graphs)
+
+    def update_graphs(self, token, cpu_ax, ram_ax):
         cpu_usage_data = []
         ram_usage_data = []
         x_data = []
         start_time = time.time()
-
-        while True:
+        # start from the recorded history, which the checkpoint also carries over restarts
+        ram_history = dict(self.history.samples(series_key('ram'), since=start_time - GRAPH_BACKFILL))
+        for t, cpu_usage in self.history.samples(series_key('cpu'), since=start_time - GRAPH_BACKFILL):
+            if t in ram_history:
+                cpu_usage_data.append(cpu_usage)
+                ram_usage_data.append(ram_history[t])
+                x_data.append(t - start_time)
+
+        while not token.cancelled:
             # Append the current CPU and RAM usage
-            cpu_usage_data.append(psutil.cpu_percent(interval=1))
-            ram_usage_data.append(psutil.virtual_memory().percent)
+            cpu_usage_data.append(self.provider.cpu_percent(interval=1))
+            ram_usage_data.append(self.provider.virtual_memory().percent)
             x_data.append(time.time() - start_time)
+            del cpu_usage_data[:-GRAPH_POINTS], ram_usage_data[:-GRAPH_POINTS], x_data[:-GRAPH_POINTS]
 
             # Update the data of the lines
             self.cpu_line.set_data(x_data, cpu_usage_data)
             self.ram_line.set_data(x_data, ram_usage_data)
 
             # Adjust the axes limits
-            cpu_ax.set_xlim(0, max(x_data) + 1)
-            ram_ax.set_xlim(0, max(x_data) + 1)
+            cpu_ax.set_xlim(min(x_data), max(x_data) + 1)
+            ram_ax.set_xlim(min(x_data), max(x_data) + 1)
             cpu_ax.set_ylim(0, 100)
             ram_ax.set_ylim(0, 100)
 
@@ -1035,87 +1154,8 @@ class ServiceMonitorApp:
             cpu_ax.figure.canvas.draw()
             ram_ax.figure.canvas.draw()
 
-            time.sleep(1)  # Update every second
-
-    def generate_reports_if_needed(self):
-        if not self.report_active.get():
-            return
-
-        current_time = time.time()
-        last_report_time = self.config.getfloat('REPORTS', 'LastReportTime', fallback=0)
-
-        if self.daily_report.get() and (current_time - last_report_time) >= 86400:
-            self.generate_report('Daily')
-        elif self.weekly_report.get() and (current_time - last_report_time) >= 604800:
-            self.generate_report('Weekly')
-        elif self.monthly_report.get() and (current_time - last_report_time) >= 2592000:
-            self.generate_report('Monthly')
-
-    def generate_report(self, report_type):
-        report_subject = f"{report_type} System Report"
-        report_body = self.get_report_body(report_type)
-        self.send_email(report_subject, report_body)
-        self.config.set('REPORTS', 'LastReportTime', str(time.time()))
-        with open('config.ini', 'w') as configfile:
-            self.config.write(configfile)
-
-    def send_instant_report(self):
-        report_subject = "Instant System Report"
-        report_body = self.get_report_body("Instant")
-        self.send_email(report_subject, report_body)
-
-    def get_report_body(self, report_type):
-        """Generate the report content with system information."""
-        cpu_usage = psutil.cpu_percent(interval=1)
-        ram_usage = psutil.virtual_memory().percent
-        uptime_seconds = time.time() - psutil.boot_time()
-        uptime = time.strftime("%H:%M:%S", time.gmtime(uptime_seconds))
-        disk_usage_details = "<br>".join([
-            "{}: {}% used".format(partition.device, psutil.disk_usage(partition.mountpoint).percent)
-            for partition in psutil.disk_partitions() if partition.fstype
-        ])
-
-        body = f"""
-        <html>
-        <body>
-        <h2>{report_type} System Report</h2>
-        <p><b>Timestamp:</b> {time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())}</p>
-        <p><b>CPU Usage:</b> {cpu_usage}%</p>
-        <p><b>RAM Usage:</b> {ram_usage}%</p>
-        <p><b>System Uptime:</b> {uptime}</p>
-        <p><b>Disk Usage:</b><br>{disk_usage_details.replace('n', '<br>')}</p>
-        </body>
-        </html>
-        """
-        return body
-
-    def setup_flask_routes(self):
-        self.app = Flask(__name__)
-
-        @self.app.route('/')
-        def index():
-            return render_template('index.html')
-
-        @self.app.route('/status')
-        def status():
-            status_data = {
-                'cpu': psutil.cpu_percent(interval=1),
-                'ram': psutil.virtual_memory().percent,
-                'disks': {
-                    partition.device: psutil.disk_usage(partition.mountpoint).percent
-                    for partition in psutil.disk_partitions() if partition.fstype
-                },
-                'services': {service: self.get_service_status(service) for service in self.selected_services},
-                'processes': {
-                    proc: "Running" if proc in self.processes else "Not Running"
-                    for proc in self.selected_processes
-                }
-            }
-            return jsonify(status_data)
-
-    def run_flask_server(self):
-        self.app.run(host=self.server_ip.get(), port=self.server_port.get())
-
+            if token.wait(1):  # Update every second
+                break
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,103 @@
+import math
+from array import array
+
+from app.network import counter_delta
+from app.rules import series_key
+
+# psutil disk_io_counters field -> metric; bytes and operations are per second, busy is a percentage
+DISK_IO_COUNTERS = (
+    ('read_bytes', 'disk_read_bytes'),
+    ('write_bytes', 'disk_write_bytes'),
+    ('read_count', 'disk_read_iops'),
+    ('write_count', 'disk_write_iops'),
+    ('busy_time', 'disk_busy'),
+)
+DISK_IO_METRICS = tuple(metric for _, metric in DISK_IO_COUNTERS)
+IGNORED_DISK_PREFIXES = ('loop', 'ram')  # pseudo devices psutil lists on Linux
+
+
+def busy_milliseconds(reading):
+    # busy_time is only reported on Linux and FreeBSD, the time spent in reads and writes is close elsewhere
+    busy = getattr(reading, 'busy_time', None)
+    return busy if busy is not None else reading.read_time + reading.write_time
+
+
+def disk_snapshot(provider):
+    return {
+        series_key('disk', device=partition.device): provider.disk_usage(partition.mountpoint).percent
+        for partition in provider.disk_partitions() if partition.fstype
+    }
+
+
+class CoreUsage:
+    """Per-core utilisation from `cpu_percent(percpu=True)`, as `cpu_core{core=N}` series."""
+
+    def __init__(self):
+        self.percents = []
+        self._keys = []
+
+    def update(self, percents):
+        if len(percents) != len(self._keys):
+            self._keys = [series_key('cpu_core', core=str(core)) for core in range(len(percents))]
+        self.percents = list(percents)
+        return dict(zip(self._keys, self.percents))
+
+
+class DiskIORates:
+    """Per-device throughput, IOPS and busy time computed from successive `disk_io_counters(perdisk=True)` readings.
+
+    Each reading is flattened into one array of device x counter values, so the rates for every
+    device come out of a single pass over the previous and current arrays.
+    """
+
+    def __init__(self):
+        self.devices = ()
+        self.previous = array('d')
+        self.previous_time = None
+        self.rates = {}  # device -> {metric: rate}
+        self.keys = []  # series key per position of the flat arrays
+
+    def _relayout(self, devices):
+        """Line the previous reading up with a new device list; devices seen for the first time get NaN."""
+        width = len(DISK_IO_COUNTERS)
+        rows = {device: self.previous[index * width:(index + 1) * width]
+                for index, device in enumerate(self.devices)}
+        missing = array('d', [math.nan] * width)
+        previous = array('d')
+        for device in devices:
+            previous.extend(rows.get(device, missing))
+        self.previous = previous
+        self.devices = devices
+        self.keys = [series_key(metric, device=device) for device in devices for metric in DISK_IO_METRICS]
+
+    def update(self, counters, now):
+        """Take a new reading of every device and return `{series key: value}`; empty on the first reading."""
+        devices = tuple(device for device in counters if not device.startswith(IGNORED_DISK_PREFIXES))
+        current = array('d')
+        for device in devices:
+            reading = counters[device]
+            current.extend((reading.read_bytes, reading.write_bytes, reading.read_count, reading.write_count,
+                            busy_milliseconds(reading)))
+        if devices != self.devices:
+            self._relayout(devices)
+
+        snapshot = {}
+        rates = {}
+        elapsed = now - self.previous_time if self.previous_time is not None else 0
+        if elapsed > 0:
+            width = len(DISK_IO_COUNTERS)
+            # busy milliseconds per second of wall time, as a percentage
+            scales = [1 / elapsed] * (width - 1) + [0.1 / elapsed]
+            values = [counter_delta(last, value) * scales[index % width]
+                      for index, (last, value) in enumerate(zip(self.previous, current))]
+            for index, device in enumerate(devices):
+                row = values[index * width:(index + 1) * width]
+                if math.isnan(self.previous[index * width]):
+                    continue
+                row[-1] = min(row[-1], 100.0)
+                rates[device] = dict(zip(DISK_IO_METRICS, row))
+                snapshot.update(zip(self.keys[index * width:(index + 1) * width], row))
+        self.previous = current
+        self.previous_time = now
+        self.rates = rates
+        return snapshot
@@ -0,0 +1,379 @@
+import json
+import math
+import struct
+import sys
+from array import array
+
+HISTORY_CAPACITY = 720  # samples kept per series, one hour at the 5 second check interval
+# (bucket seconds, buckets kept) of the averaged series behind the raw samples: a day of minutes, 31 days of hours
+ROLLUPS = ((60, 1440), (3600, 744))
+QUERY_POINTS = 1000  # points per series a query without a step aims for
+JSON_CHUNK_POINTS = 500  # points formatted per chunk of a streamed JSON response
+# binary history responses: a BINARY_HEADER, then per series a SERIES_HEADER, its key as JSON,
+# the times as int64 epoch milliseconds and the values as float32, all little-endian
+BINARY_MAGIC = b'CMWH'
+BINARY_HEADER = struct.Struct('<4sI')  # magic, series count
+SERIES_HEADER = struct.Struct('<IId')  # key JSON length, point count, resolution in seconds
+
+
+class SeriesBuffer:
+    """Fixed-size ring of (time, value) samples stored in preallocated float arrays."""
+
+    __slots__ = ('times', 'values', 'start', 'size')
+
+    def __init__(self, capacity):
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.size = 0
+
+    def append(self, t, value):
+        capacity = len(self.values)
+        if self.size < capacity:
+            index = self.start + self.size
+            self.size += 1
+        else:
+            # full: overwrite the oldest sample
+            index = self.start
+            self.start = (self.start + 1) % capacity
+        if index >= capacity:
+            index -= capacity
+        self.times[index] = t
+        self.values[index] = value
+
+    def samples(self, since=None):
+        """Return `[(time, value)]` oldest first, optionally only those at or after `since`."""
+        capacity = len(self.values)
+        indexes = [(self.start + i) % capacity for i in range(self.size)]
+        samples = [(self.times[i], self.values[i]) for i in indexes]
+        if since is not None:
+            samples = [sample for sample in samples if sample[0] >= since]
+        return samples
+
+    def tail(self, count):
+        """The values of the newest `count` samples, oldest first."""
+        capacity = len(self.values)
+        count = min(count, self.size)
+        first = self.start + self.size - count
+        return [self.values[(first + i) % capacity] for i in range(count)]
+
+    def latest(self):
+        if not self.size:
+            return None
+        index = (self.start + self.size - 1) % len(self.values)
+        return self.times[index], self.values[index]
+
+    def arrays(self):
+        """The held times and values as two arrays, oldest first."""
+        capacity = len(self.values)
+        end = self.start + self.size
+        if end <= capacity:
+            return self.times[self.start:end], self.values[self.start:end]
+        return (self.times[self.start:] + self.times[:end - capacity],
+                self.values[self.start:] + self.values[:end - capacity])
+
+    def fill(self, times, values):
+        """Replace the contents with arrays of samples, oldest first, keeping the newest that fit."""
+        capacity = len(self.values)
+        count = min(len(times), capacity)
+        self.times[:count] = times[len(times) - count:]
+        self.values[:count] = values[len(values) - count:]
+        self.start = 0
+        self.size = count
+
+    def covers(self, t):
+        """Whether every sample since t is still held, i.e. nothing newer than t was overwritten yet."""
+        return self.size < len(self.values) or self.times[self.start] <= t
+
+    def between(self, start, end):
+        """Yield the `(time, value)` samples from start to end inclusive, oldest first, without copying the ring."""
+        capacity = len(self.values)
+        first, size = self.start, self.size
+        times = self.times
+        # times only grow, so the first sample in range can be found by bisection
+        low, high = 0, size
+        while low < high:
+            middle = (low + high) // 2
+            if times[(first + middle) % capacity] < start:
+                low = middle + 1
+            else:
+                high = middle
+        for i in range(low, size):
+            index = (first + i) % capacity
+            if times[index] > end:
+                break
+            yield times[index], self.values[index]
+
+
+class Rollup:
+    """Average of the samples falling in each `resolution` second bucket; the bucket still filling is included.
+
+    Bucket n covers [n * resolution, (n + 1) * resolution) and lives at n % capacity of a float32 ring, so
+    no times are stored; buckets without samples (the monitor was stopped) hold NaN.
+    """
+
+    __slots__ = ('resolution', 'values', 'first', 'newest', 'total', 'count')
+
+    def __init__(self, resolution, capacity):
+        self.resolution = resolution
+        self.values = array('f', [math.nan]) * capacity
+        self.first = None  # number of the first bucket ever filled
+        self.newest = None  # number of the bucket still filling
+        self.total = 0.0
+        self.count = 0
+
+    def append(self, t, value):
+        number = int(t // self.resolution)
+        if number != self.newest:
+            if self.newest is None:
+                self.first = number
+            else:
+                capacity = len(self.values)
+                self.values[self.newest % capacity] = self.total / self.count if self.count else math.nan
+                for skipped in range(self.newest + 1, min(number, self.newest + 1 + capacity)):
+                    self.values[skipped % capacity] = math.nan
+            self.newest = number
+            self.total = 0.0
+            self.count = 0
+        if value == value:  # NaN would spoil the whole bucket
+            self.total += value
+            self.count += 1
+
+    def oldest(self):
+        return max(self.first, self.newest - len(self.values) + 1)
+
+    def completed(self):
+        """The averages of the finished buckets still held, oldest first, ending with bucket newest - 1."""
+        if self.newest is None:
+            return array('f')
+        capacity = len(self.values)
+        start = self.oldest() % capacity
+        end = start + self.newest - self.oldest()
+        if end <= capacity:
+            return self.values[start:end]
+        return self.values[start:] + self.values[:end - capacity]
+
+    def fill(self, first, newest, total, count, completed):
+        """Restore the state read from completed() and the other fields, as saved by a checkpoint."""
+        capacity = len(self.values)
+        completed = completed[max(0, len(completed) - capacity + 1):]
+        self.values = array('f', [math.nan]) * capacity
+        start = (newest - len(completed)) % capacity
+        head = min(len(completed), capacity - start)
+        self.values[start:start + head] = completed[:head]
+        self.values[:len(completed) - head] = completed[head:]
+        self.first = first
+        self.newest = newest
+        self.total = total
+        self.count = count
+
+    def covers(self, t):
+        if self.newest is None:
+            return True
+        oldest = self.oldest()
+        return oldest == self.first or oldest * self.resolution <= t
+
+    def between(self, start, end):
+        if self.newest is None:
+            return
+        resolution = self.resolution
+        newest, total, count = self.newest, self.total, self.count
+        capacity = len(self.values)
+        last = min(newest, int(end // resolution))
+        for number in range(max(self.oldest(), math.ceil(start / resolution)), last + 1):
+            if number == newest:
+                if count:
+                    yield number * resolution, total / count
+            else:
+                value = self.values[number % capacity]
+                if value == value:
+                    yield number * resolution, value
+
+
+def downsample(samples, step):
+    """Average `(time, value)` samples into `step` second buckets; NaN samples are left out."""
+    if step <= 0:
+        for t, value in samples:
+            if value == value:
+                yield t, value
+        return
+    bucket = None
+    total = 0.0
+    count = 0
+    for t, value in samples:
+        if value != value:
+            continue
+        start = t - t % step
+        if start != bucket:
+            if count:
+                yield bucket, total / count
+            bucket = start
+            total = 0.0
+            count = 0
+        total += value
+        count += 1
+    if count:
+        yield bucket, total / count
+
+
+class HistoryStore:
+    """Recent samples of every metric series, keyed like rule snapshots (see app.rules.series_key)."""
+
+    def __init__(self, capacity=HISTORY_CAPACITY, rollups=ROLLUPS):
+        self.capacity = capacity
+        self.rollup_sizes = rollups
+        self.series = {}
+        self.rollups = {}  # key -> Rollup per entry of rollup_sizes, finest first
+
+    def append(self, key, t, value):
+        buffer = self.series.get(key)
+        if buffer is None:
+            buffer = self.create(key)
+        buffer.append(t, value)
+        for rollup in self.rollups[key]:
+            rollup.append(t, value)
+
+    def create(self, key):
+        buffer = self.series[key] = SeriesBuffer(self.capacity)
+        self.rollups[key] = tuple(Rollup(resolution, capacity) for resolution, capacity in self.rollup_sizes)
+        return buffer
+
+    def restore(self, key, times, values, rollups):
+        """Refill a series from a checkpoint: its raw samples plus `(resolution, first, newest, total, count,
+        completed)` per rollup; rollups whose resolution changed since are left empty.
+        """
+        buffer = self.series.get(key)
+        if buffer is None:
+            buffer = self.create(key)
+        buffer.fill(times, values)
+        saved = {state[0]: state[1:] for state in rollups}
+        for rollup in self.rollups[key]:
+            if rollup.resolution in saved:
+                rollup.fill(*saved[rollup.resolution])
+
+    @property
+    def retention(self):
+        """Seconds the longest rollup reaches back; a series silent for longer has nothing left to show."""
+        return max((resolution * capacity for resolution, capacity in self.rollup_sizes), default=0)
+
+    def remove(self, key):
+        self.rollups.pop(key, None)
+        self.series.pop(key, None)
+
+    def stale(self, before):
+        """Keys of the series whose newest sample is older than `before`."""
+        return [key for key, buffer in list(self.series.items()) if not buffer.size or buffer.latest()[0] < before]
+
+    def record(self, snapshot, t):
+        """Store every value of a `{series key: value}` snapshot taken at time t."""
+        for key, value in snapshot.items():
+            self.append(key, t, value)
+
+    def samples(self, key, since=None):
+        buffer = self.series.get(key)
+        return buffer.samples(since) if buffer is not None else []
+
+    def recent(self, key, count):
+        buffer = self.series.get(key)
+        return buffer.tail(count) if buffer is not None else []
+
+    def latest(self, key):
+        buffer = self.series.get(key)
+        return buffer.latest() if buffer is not None else None
+
+    def keys(self, metric=None):
+        # copied first, the monitoring thread may add series while a request lists them
+        return [key for key in list(self.series) if metric is None or key[0] == metric]
+
+    def select(self, key, start, step=0):
+        """Pick the store to answer a query from: the coarsest one no coarser than `step` that still holds
+        everything since `start`, falling back to the finest one holding it, or the coarsest one at all.
+
+        Returns `(resolution, store)`; resolution 0 stands for the raw samples.
+        """
+        tiers = [(0, self.series[key])] + [(rollup.resolution, rollup) for rollup in self.rollups[key]]
+        covering = [tier for tier in tiers if tier[1].covers(start)] or tiers[-1:]
+        fitting = [tier for tier in covering if tier[0] <= step]
+        return fitting[-1] if fitting else covering[0]
+
+    def query(self, key, start, end, step=None):
+        """Return `(resolution, samples)`, the samples being a generator of `(time, value)` between start and
+        end averaged into `step` second buckets; (0, empty) for an unknown key.
+
+        Without a step the store is picked for about QUERY_POINTS points and its samples are returned as they are.
+        """
+        try:
+            resolution, store = self.select(key, start, (end - start) / QUERY_POINTS if step is None else step)
+        except KeyError:
+            # unknown, or removed by the monitoring thread after a request listed the keys
+            return 0, iter(())
+        if step is None or step <= resolution:
+            return resolution, downsample(store.between(start, end), 0)
+        return step, downsample(store.between(start, end), step)
+
+
+def key_json(key):
+    metric, labels = key
+    return json.dumps({'metric': metric, 'labels': dict(labels)})
+
+
+def stream_json(history, keys, start, end, step=None):
+    """Yield a JSON document of the given series in chunks, one series in flight at a time."""
+    yield json.dumps({'from': start, 'to': end})[:-1] + ', "series": ['
+    for number, key in enumerate(keys):
+        resolution, samples = history.query(key, start, end, step)
+        yield f"{', ' if number else ''}{key_json(key)[:-1]}, \"resolution\": {resolution}, \"points\": ["
+        chunk = []
+        separator = ''
+        for t, value in samples:
+            chunk.append(f"[{t!r}, {value!r}]")
+            if len(chunk) == JSON_CHUNK_POINTS:
+                yield separator + ', '.join(chunk)
+                separator = ', '
+                chunk = []
+        if chunk:
+            yield separator + ', '.join(chunk)
+        yield ']}'
+    yield ']}'
+
+
+def stream_binary(history, keys, start, end, step=None):
+    """Yield the given series in the columnar binary layout described next to BINARY_HEADER."""
+    yield BINARY_HEADER.pack(BINARY_MAGIC, len(keys))
+    for key in keys:
+        resolution, samples = history.query(key, start, end, step)
+        times = array('q')
+        values = array('f')
+        for t, value in samples:
+            times.append(int(t * 1000))
+            values.append(value)
+        if sys.byteorder == 'big':
+            times.byteswap()
+            values.byteswap()
+        encoded = key_json(key).encode()
+        yield SERIES_HEADER.pack(len(encoded), len(times), resolution) + encoded
+        yield times.tobytes()
+        yield values.tobytes()
+
+
+def read_binary(data):
+    """Decode a binary history response into `[(metric, labels, resolution, times, values)]`."""
+    magic, count = BINARY_HEADER.unpack_from(data)
+    if magic != BINARY_MAGIC:
+        raise ValueError("Not a binary history response")
+    offset = BINARY_HEADER.size
+    series = []
+    for _ in range(count):
+        key_length, points, resolution = SERIES_HEADER.unpack_from(data, offset)
+        offset += SERIES_HEADER.size
+        key = json.loads(data[offset:offset + key_length])
+        offset += key_length
+        times = array('q', data[offset:offset + 8 * points])
+        offset += 8 * points
+        values = array('f', data[offset:offset + 4 * points])
+        offset += 4 * points
+        if sys.byteorder == 'big':
+            times.byteswap()
+            values.byteswap()
+        series.append((key['metric'], key['labels'], resolution, [t / 1000 for t in times], list(values)))
+    return series
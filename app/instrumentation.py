@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Bucket upper bounds in seconds: 10 us doubling up to about 84 s
+BUCKET_BOUNDS = [0.00001 * 2 ** i for i in range(24)]
+CPU_SAMPLE_INTERVAL = 5  # seconds between samples of the agent's own CPU use, at most
+
+
+class LatencyHistogram:
+    """Fixed log-spaced buckets, so recording a sample is a binary search and a few additions."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of samples (capped at the observed max)."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                bound = BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': round(self.percentile(0.50) * 1000, 3),
+            'p95_ms': round(self.percentile(0.95) * 1000, 3),
+            'p99_ms': round(self.percentile(0.99) * 1000, 3),
+            'max_ms': round(self.max * 1000, 3),
+        }
+
+
+class Instrumentation:
+    """Timings, counters and gauges the agent keeps about itself."""
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+        self.gauges = {}
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.started_cpu = self._cpu_seconds()
+        self.cpu_sample = (self.started, self.started_cpu)
+        self.cpu_percent = None  # over the latest sampling interval, None until the first one ends
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def increment(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def _cpu_seconds(self):
+        times = os.times()
+        return times.user + times.system
+
+    def sample_cpu(self):
+        """Called every monitoring pass; takes the agent's CPU use over the last CPU_SAMPLE_INTERVAL seconds."""
+        now = time.monotonic()
+        last_time, last_cpu = self.cpu_sample
+        if now - last_time < CPU_SAMPLE_INTERVAL:
+            return
+        cpu = self._cpu_seconds()
+        self.cpu_sample = (now, cpu)
+        self.cpu_percent = round((cpu - last_cpu) / (now - last_time) * 100, 2)
+
+    def agent_usage(self):
+        """CPU used by this process over the latest sampling interval and its lifetime, plus RSS and thread count.
+
+        Reading it changes nothing, so the Diagnostics tab and `/status/self` see the same value.
+        """
+        now = time.monotonic()
+        lifetime = round((self._cpu_seconds() - self.started_cpu) / max(now - self.started, 1e-6) * 100, 2)
+        usage = {
+            'cpu_percent': lifetime if self.cpu_percent is None else self.cpu_percent,
+            'cpu_percent_lifetime': lifetime,
+            'threads': threading.active_count(),
+            'uptime_s': round(now - self.started, 1),
+        }
+        try:
+            import psutil
+            usage['rss_mb'] = round(psutil.Process().memory_info().rss / 1024 ** 2, 1)
+        except Exception as e:
+            usage['rss_mb'] = None
+            print(f"Failed to read agent memory usage: {e}")
+        return usage
+
+    def report(self):
+        with self.lock:
+            timings = {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+            counters = dict(self.counters)
+        return {
+            'timings': timings,
+            'counters': counters,
+            'gauges': dict(self.gauges),
+            'agent': self.agent_usage(),
+        }
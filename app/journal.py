@@ -0,0 +1,322 @@
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from contextlib import closing
+
+from app.config import atomic_write, EVENTS_DIR
+
+SEGMENT_BYTES = 4 * 1024 ** 2  # start a new segment once the current one reaches this size
+MAX_SEGMENTS = 16  # oldest segments are deleted beyond this
+INDEX_EVERY = 64  # events between two entries of the sparse time index
+
+SEGMENT_PREFIX = 'events-'
+SEGMENT_SUFFIX = '.jsonl'
+INDEX_SUFFIX = '.idx'
+
+
+def segment_number(path):
+    return int(os.path.basename(path)[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+
+def read_events(segment_file, offsets):
+    events = []
+    for offset in offsets:
+        segment_file.seek(offset)
+        events.append(json.loads(segment_file.readline()))
+    return events
+
+
+class Segment:
+    """One journal file plus its index: a sparse time -> offset table and the offsets of every event per type
+    and per name, so counts and pages come from the index and only the events shown are decoded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.times = []  # time of every INDEX_EVERY-th event
+        self.offsets = []  # and where it starts
+        self.kinds = {}  # event type -> offsets of its events
+        self.names = {}  # event name -> offsets of its events
+
+    def add(self, event, offset, size):
+        t = event['t']
+        if self.count % INDEX_EVERY == 0:
+            self.times.append(t)
+            self.offsets.append(offset)
+        if self.first is None:
+            self.first = t
+        self.last = t
+        self.kinds.setdefault(event['type'], []).append(offset)
+        self.names.setdefault(event['name'], []).append(offset)
+        self.count += 1
+        self.size = offset + size
+
+    def may_contain(self, since, until, event_type, name):
+        if not self.count:
+            return False
+        if since is not None and self.last < since:
+            return False
+        if until is not None and self.first >= until:
+            return False
+        if event_type is not None and event_type not in self.kinds:
+            return False
+        return name is None or name in self.names
+
+    def filtered(self, event_type, name):
+        """Offsets of the events of that type and name, oldest first; None without either filter."""
+        if name is None:
+            return self.kinds.get(event_type, []) if event_type is not None else None
+        offsets = self.names.get(name, [])
+        if event_type is None:
+            return offsets
+        kind = set(self.kinds.get(event_type, ()))
+        return [offset for offset in offsets if offset in kind]
+
+    def locate(self, segment_file, t, count, size):
+        """`(position, offset)` of the first event at or after `t`, decoding at most one index block."""
+        if t > self.last:
+            return count, size
+        block = bisect_left(self.times, t) - 1
+        if block < 0:
+            return 0, 0
+        position, offset = block * INDEX_EVERY, self.offsets[block]
+        if position >= count:  # indexed after the caller took its snapshot
+            return count, size
+        segment_file.seek(offset)
+        while position < count:
+            line = segment_file.readline()
+            if json.loads(line)['t'] >= t:
+                break
+            position += 1
+            offset += len(line)
+        return position, offset
+
+    def position_of(self, segment_file, offset):
+        """Position of the event starting at `offset`, counting lines from the index entry before it."""
+        block = bisect_right(self.offsets, offset) - 1
+        position, at = block * INDEX_EVERY, self.offsets[block]
+        segment_file.seek(at)
+        while at < offset:
+            at += len(segment_file.readline())
+            position += 1
+        return position
+
+    def read_range(self, segment_file, start, position, count):
+        """`(offset, events)` for `count` events from `position` on, jumping to the index entry before it;
+        `start` is the `(position, offset)` of an event at or before it.
+        """
+        block = position // INDEX_EVERY
+        at, offset = start
+        if block * INDEX_EVERY > at:
+            at, offset = block * INDEX_EVERY, self.offsets[block]
+        segment_file.seek(offset)
+        for _ in range(position - at):
+            offset += len(segment_file.readline())
+        return offset, [json.loads(segment_file.readline()) for _ in range(count)]
+
+    def to_dict(self):
+        return {'size': self.size, 'count': self.count, 'first': self.first, 'last': self.last,
+                'times': self.times, 'offsets': self.offsets, 'kinds': self.kinds, 'names': self.names}
+
+    @classmethod
+    def from_dict(cls, path, data):
+        segment = cls(path)
+        segment.size = data['size']
+        segment.count = data['count']
+        segment.first = data['first']
+        segment.last = data['last']
+        segment.kinds = data['kinds']  # an index written without it is rebuilt by scanning
+        segment.times = data['times']
+        segment.offsets = data['offsets']
+        segment.names = data['names']
+        return segment
+
+    @classmethod
+    def scan(cls, path):
+        """Rebuild the index by reading the segment; a torn last line is cut off."""
+        segment = cls(path)
+        with open(path, 'rb') as segment_file:
+            offset = 0
+            for line in segment_file:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                segment.add(event, offset, len(line))
+                offset += len(line)
+        if os.path.getsize(path) != segment.size:
+            with open(path, 'r+b') as segment_file:
+                segment_file.truncate(segment.size)
+        return segment
+
+
+class Journal:
+    """Append-only event log split into rotated JSON-lines segments, each with a time and name index.
+
+    Sealed segments keep their index in a `.idx` file next to them, so opening the journal only
+    rescans the segment that was still being written.
+    """
+
+    def __init__(self, directory=EVENTS_DIR, segment_bytes=SEGMENT_BYTES, max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.segments = None  # loaded on first use
+        self.file = None
+        self.lock = threading.Lock()
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{number:06d}{SEGMENT_SUFFIX}")
+
+    def _load(self):
+        if self.segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX))
+        self.segments = []
+        for position, name in enumerate(names):
+            path = os.path.join(self.directory, name)
+            segment = None
+            if position < len(names) - 1:
+                try:
+                    with open(path + INDEX_SUFFIX) as index_file:
+                        segment = Segment.from_dict(path, json.load(index_file))
+                except (OSError, ValueError, KeyError):
+                    segment = None
+                if segment is not None and segment.size != os.path.getsize(path):
+                    segment = None
+            self.segments.append(segment or Segment.scan(path))
+
+    def _active(self, incoming):
+        if self.segments and (not self.segments[-1].count or
+                              self.segments[-1].size + incoming <= self.segment_bytes):
+            return self.segments[-1]
+
+        if self.segments:
+            # seal the full segment: persist its index and start the next one
+            sealed = self.segments[-1]
+            atomic_write(sealed.path + INDEX_SUFFIX, lambda index_file: json.dump(sealed.to_dict(), index_file))
+            number = segment_number(sealed.path) + 1
+        else:
+            number = 1
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.segments.append(Segment(self._segment_path(number)))
+
+        while len(self.segments) > self.max_segments:
+            expired = self.segments.pop(0)
+            for path in (expired.path, expired.path + INDEX_SUFFIX):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return self.segments[-1]
+
+    def append(self, event_type, name, t, **fields):
+        """Record one event; `fields` must be JSON serialisable."""
+        event = {'t': t, 'type': event_type, 'name': name}
+        event.update(fields)
+        line = (json.dumps(event, separators=(',', ':')) + '\n').encode()
+        with self.lock:
+            self._load()
+            segment = self._active(len(line))
+            if self.file is None:
+                self.file = open(segment.path, 'ab')
+            self.file.write(line)
+            self.file.flush()
+            segment.add(event, segment.size, len(line))
+        return event
+
+    def _spans(self, since, until, event_type, name, newest_first=False, last_segment=None):
+        """Yield `(segment, open file, start, end, offsets)` for every segment that may match: `start` and `end`
+        are the `(position, offset)` bounds of the time range, `offsets` those of the matching events when
+        filtering on type or name.
+        """
+        with self.lock:
+            self._load()
+            segments = [(segment, segment.count, segment.size) for segment in self.segments
+                        if segment.may_contain(since, until, event_type, name) and
+                        (last_segment is None or segment_number(segment.path) <= last_segment)]
+        if newest_first:
+            segments.reverse()
+
+        for segment, count, size in segments:
+            with open(segment.path, 'rb') as segment_file:
+                start = segment.locate(segment_file, since, count, size) if since is not None else (0, 0)
+                end = segment.locate(segment_file, until, count, size) if until is not None else (count, size)
+                offsets = segment.filtered(event_type, name)
+                if offsets is not None:
+                    offsets = offsets[bisect_left(offsets, start[1]):bisect_left(offsets, end[1])]
+                yield segment, segment_file, start, end, offsets
+
+    def query(self, since=None, until=None, event_type=None, name=None, limit=None, offset=0):
+        """Return matching events, oldest first, skipping `offset` of them and returning at most `limit`.
+
+        Skipped events are counted from the index, not read.
+        """
+        events = []
+        with closing(self._spans(since, until, event_type, name)) as spans:
+            for segment, segment_file, start, end, offsets in spans:
+                if limit is not None and len(events) >= limit:
+                    break
+                matching = len(offsets) if offsets is not None else end[0] - start[0]
+                if offset >= matching:
+                    offset -= matching
+                    continue
+                take = matching - offset if limit is None else min(matching - offset, limit - len(events))
+                if offsets is not None:
+                    events.extend(read_events(segment_file, offsets[offset:offset + take]))
+                else:
+                    events.extend(segment.read_range(segment_file, start, start[0] + offset, take)[1])
+                offset = 0
+        return events
+
+    def newest(self, limit, since=None, until=None, event_type=None, name=None, before=None):
+        """Return `(events, cursor)`: at most `limit` matching events, newest first, and a cursor to pass as
+        `before` for the page of older events. Segments are read newest first, and only the page is decoded.
+        """
+        events = []
+        cursor = before
+        last_segment = before[0] if before is not None else None
+        with closing(self._spans(since, until, event_type, name, True, last_segment)) as spans:
+            for segment, segment_file, start, end, offsets in spans:
+                if len(events) >= limit:
+                    break
+                number = segment_number(segment.path)
+                if number == last_segment:
+                    if offsets is not None:
+                        offsets = offsets[:bisect_left(offsets, before[1])]
+                    elif before[1] < end[1]:
+                        end = (segment.position_of(segment_file, before[1]), before[1])
+                matching = len(offsets) if offsets is not None else end[0] - start[0]
+                take = min(matching, limit - len(events))
+                if take <= 0:
+                    continue
+                if offsets is not None:
+                    offsets = offsets[matching - take:]
+                    page = read_events(segment_file, offsets)
+                    oldest = offsets[0]
+                else:
+                    oldest, page = segment.read_range(segment_file, start, end[0] - take, take)
+                events.extend(reversed(page))
+                cursor = (number, oldest)
+        return events, cursor
+
+    def count(self, since=None, until=None, event_type=None, name=None):
+        """Number of matching events, from the index; only the events next to the time bounds are read."""
+        with closing(self._spans(since, until, event_type, name)) as spans:
+            return sum(len(offsets) if offsets is not None else end[0] - start[0]
+                       for _, _, start, end, offsets in spans)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
@@ -0,0 +1,235 @@
+import glob
+import os
+
+from app.network import counter_delta
+from app.rules import series_key
+
+CGROUP_ROOT = '/sys/fs/cgroup'  # cgroup v2 (unified) mount point
+PRESSURE_DIR = '/proc/pressure'
+PRESSURE_RESOURCES = ('cpu', 'memory', 'io')
+CGROUP_RESCAN_INTERVAL = 60  # seconds between two lookups of the configured cgroup patterns
+READ_SIZE = 4096  # first pread size, doubled while a file does not fit
+
+# counters read per cgroup; the metric reports them per second (or as % of the time for *_usec)
+CGROUP_COUNTERS = (
+    ('cpu.stat', 'usage_usec', 'cgroup_cpu'),
+    ('cpu.stat', 'throttled_usec', 'cgroup_throttled'),
+    ('io.stat', 'rbytes', 'cgroup_io_read_bytes'),
+    ('io.stat', 'wbytes', 'cgroup_io_write_bytes'),
+    ('io.stat', 'rios', 'cgroup_io_read_iops'),
+    ('io.stat', 'wios', 'cgroup_io_write_iops'),
+)
+CGROUP_FILES = ('cpu.stat', 'io.stat', 'memory.current', 'memory.max')
+
+
+class PreadFile:
+    """A file kept open and read again from the start with one pread per call, for /proc, /sys and cgroupfs."""
+
+    __slots__ = ('path', 'fd', 'size')
+
+    def __init__(self, path, size=READ_SIZE):
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+        self.size = size
+
+    def read(self):
+        while True:
+            data = os.pread(self.fd, self.size, 0)
+            if len(data) < self.size:
+                return data
+            self.size *= 2
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def parse_keyed(data):
+    """`key value` lines, as in cpu.stat and memory.stat, into a dict of ints."""
+    values = {}
+    for line in data.split(b'\n'):
+        key, _, value = line.partition(b' ')
+        if value:
+            values[key.decode()] = int(value)
+    return values
+
+
+def parse_io_stat(data):
+    """Sum `MAJ:MIN rbytes=.. wbytes=.. rios=.. wios=..` lines over every device."""
+    totals = {}
+    for line in data.split(b'\n'):
+        for field in line.split(b' ')[1:]:
+            key, _, value = field.partition(b'=')
+            if value:
+                key = key.decode()
+                totals[key] = totals.get(key, 0) + int(value)
+    return totals
+
+
+def parse_pressure(data):
+    """The avg10 stall percentages of a pressure file: `{'some': 2.35, 'full': 0.0}`."""
+    pressure = {}
+    for line in data.split(b'\n'):
+        kind, _, fields = line.partition(b' ')
+        for field in fields.split(b' '):
+            if field.startswith(b'avg10='):
+                pressure[kind.decode()] = float(field[6:])
+                break
+    return pressure
+
+
+class Cgroup:
+    """The open files of one cgroup and its previous counter readings."""
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.files = {}
+        for file_name in CGROUP_FILES:
+            try:
+                self.files[file_name] = PreadFile(os.path.join(directory, file_name))
+            except OSError:
+                pass  # controller not enabled for this cgroup
+        self.previous = {}
+        self.previous_time = None
+        self.keys = {metric: series_key(metric, cgroup=name)
+                     for metric in [metric for _, _, metric in CGROUP_COUNTERS] +
+                     ['cgroup_memory_mb', 'cgroup_memory_percent']}
+
+    def read(self, now):
+        """Return `{metric: value}`; raises OSError once the cgroup is gone."""
+        files = self.files
+        parsed = {}
+        if 'cpu.stat' in files:
+            parsed['cpu.stat'] = parse_keyed(files['cpu.stat'].read())
+        if 'io.stat' in files:
+            parsed['io.stat'] = parse_io_stat(files['io.stat'].read())
+
+        values = {}
+        counters = {}
+        elapsed = now - self.previous_time if self.previous_time is not None else 0
+        for file_name, field, metric in CGROUP_COUNTERS:
+            current = parsed.get(file_name, {}).get(field)
+            if current is None:
+                continue
+            counters[metric] = current
+            last = self.previous.get(metric)
+            if last is not None and elapsed > 0:
+                rate = counter_delta(last, current) / elapsed
+                # microseconds of CPU per second of wall time, as a percentage of one core
+                values[metric] = rate / 10000 if field.endswith('_usec') else rate
+        self.previous = counters
+        self.previous_time = now
+
+        if 'memory.current' in files:
+            current = int(files['memory.current'].read())
+            values['cgroup_memory_mb'] = current / 1024 ** 2
+            limit = files['memory.max'].read().strip() if 'memory.max' in files else b'max'
+            if limit != b'max':
+                values['cgroup_memory_percent'] = current / int(limit) * 100
+        return values
+
+    def close(self):
+        for pread_file in self.files.values():
+            pread_file.close()
+        self.files = {}
+
+
+class CgroupMonitor:
+    """Reads the configured cgroups and the host's pressure stall information (PSI) with pread on open files.
+
+    Patterns are globs relative to the cgroup root (e.g. `system.slice/docker-*.scope`) and are looked
+    up again every CGROUP_RESCAN_INTERVAL seconds, so containers that start later are picked up.
+    """
+
+    def __init__(self, root=CGROUP_ROOT, pressure_dir=PRESSURE_DIR):
+        self.root = root
+        self.pressure_dir = pressure_dir
+        self.patterns = []
+        self.pressure_enabled = False
+        self.cgroups = {}  # name -> Cgroup
+        self.pressure_files = None  # opened on first use
+        self.next_scan = 0.0
+        self.values = {}  # cgroup name -> {metric: value}
+        self.pressure = {}  # resource -> {'some': avg10, 'full': avg10}
+        self.removed = []  # series keys of deleted cgroups, for the history to drop
+
+    def configure(self, patterns, root=CGROUP_ROOT, pressure=False):
+        patterns = [pattern.strip().strip('/') for pattern in patterns if pattern.strip()]
+        if patterns != self.patterns or root != self.root or pressure != self.pressure_enabled:
+            self.close()
+            self.patterns = patterns
+            self.root = root
+            self.pressure_enabled = pressure
+            self.next_scan = 0.0
+            self.values = {}
+            self.pressure = {}
+
+    @property
+    def enabled(self):
+        return bool(self.patterns) or self.pressure_enabled
+
+    def cgroup_name(self, directory):
+        relative = os.path.relpath(directory, self.root)
+        return '/' if relative == '.' else '/' + relative.replace(os.sep, '/')
+
+    def scan(self):
+        """Open newly matching cgroups; vanished ones are dropped when reading them fails."""
+        for pattern in self.patterns:
+            for directory in glob.glob(os.path.join(self.root, pattern)):
+                if not os.path.isfile(os.path.join(directory, 'cgroup.procs')):
+                    continue
+                name = self.cgroup_name(directory)
+                if name not in self.cgroups:
+                    self.cgroups[name] = Cgroup(directory, name)
+
+    def read_pressure(self):
+        if self.pressure_files is None:
+            self.pressure_files = {}
+            for resource in PRESSURE_RESOURCES:
+                try:
+                    self.pressure_files[resource] = PreadFile(os.path.join(self.pressure_dir, resource))
+                except OSError:
+                    pass  # kernel without PSI, or not Linux
+        return {resource: parse_pressure(pressure_file.read())
+                for resource, pressure_file in self.pressure_files.items()}
+
+    def update(self, now):
+        """Read every cgroup and the pressure files; returns `{series key: value}`."""
+        snapshot = {}
+        self.pressure = self.read_pressure() if self.pressure_enabled else {}
+        for resource, stalls in self.pressure.items():
+            for kind, value in stalls.items():
+                snapshot[series_key(f"psi_{kind}", resource=resource)] = value
+
+        if not self.patterns:
+            return snapshot
+        if now >= self.next_scan:
+            self.scan()
+            self.next_scan = now + CGROUP_RESCAN_INTERVAL
+        values = {}
+        for name, cgroup in list(self.cgroups.items()):
+            try:
+                metrics = cgroup.read(now)
+            except (OSError, ValueError):
+                cgroup.close()
+                del self.cgroups[name]
+                self.removed.extend(cgroup.keys.values())
+                continue
+            values[name] = metrics
+            for metric, value in metrics.items():
+                snapshot[cgroup.keys[metric]] = value
+        self.values = values
+        return snapshot
+
+    def drain_removed(self):
+        removed, self.removed = self.removed, []
+        return removed
+
+    def close(self):
+        for cgroup in self.cgroups.values():
+            cgroup.close()
+        self.cgroups = {}
+        for pressure_file in (self.pressure_files or {}).values():
+            pressure_file.close()
+        self.pressure_files = None
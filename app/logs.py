@@ -0,0 +1,218 @@
+import os
+import re
+
+from app.rules import AlertRule, series_key
+
+LOG_SECTION_PREFIX = 'LOG '
+CHUNK_SIZE = 1024 * 1024  # bytes read at a time
+MAX_READ = 32 * 1024 * 1024  # bytes read per check at most; a log growing faster is caught up on later checks
+MAX_LINE = 64 * 1024  # an unterminated line longer than this is matched as it is
+MAX_SAMPLE_LINE = 500  # characters of the last matching line kept for the journal
+# on Windows an open handle would keep the application from rotating its log
+KEEP_OPEN = os.name != 'nt'
+PATTERN_NAME = re.compile(r'^(\w+)\s*:\s*(.+)$')
+
+
+def parse_patterns(text):
+    """Parse one pattern per line, optionally named: `error: \\bERROR\\b`; unnamed ones are numbered."""
+    patterns = {}
+    for number, line in enumerate(line.strip() for line in text.splitlines() if line.strip()):
+        named = PATTERN_NAME.match(line)
+        if named:
+            patterns[named.group(1)] = named.group(2)
+        else:
+            patterns[f"pattern{number + 1}"] = line
+    return patterns
+
+
+def compile_patterns(patterns, ignore_case=False):
+    """One alternation of every pattern to scan with, plus each pattern alone to tell which one hit.
+
+    The alternation has no capturing groups, which would slow the scan down by a third.
+    """
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    compiled = [(name, re.compile(pattern.encode(), flags)) for name, pattern in patterns.items()]
+    return re.compile(b'|'.join(b'(?:%s)' % pattern.encode() for pattern in patterns.values()), flags), compiled
+
+
+class LogTail:
+    """Follows one log file like `tail -F`, counting the new lines that match its patterns (once per line,
+    for the pattern found first in it).
+
+    The file is identified by device and inode: when the path points at another file the rest of the old one
+    is read through the still open handle and the new one is read from the start; a file that got shorter
+    was truncated and is read again from the start. Existing content is skipped when the tail starts.
+    """
+
+    def __init__(self, name, path, patterns, ignore_case=False, severity='warning', channel=None):
+        self.name = name
+        self.path = path
+        self.patterns = patterns
+        self.severity = severity
+        self.channel = channel
+        self.regex, self.compiled = compile_patterns(patterns, ignore_case)
+        self.keys = {name: series_key('log_matches', log=self.name, pattern=name) for name in patterns}
+        self.signature = (path, tuple(patterns.items()), ignore_case)
+        self.file = None
+        self.identity = None
+        self.offset = None  # None until the first check decides where to start
+        self.partial = b''  # an incomplete last line, completed by the next read
+
+    def open(self):
+        try:
+            self.file = open(self.path, 'rb')
+        except OSError:
+            return None
+        stat = os.fstat(self.file.fileno())
+        return stat.st_dev, stat.st_ino
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def poll(self):
+        """Read what was appended since the last poll; returns `({pattern: count}, {pattern: last matching line})`."""
+        counts = dict.fromkeys(self.patterns, 0)
+        lines = {}
+        try:
+            stat = os.stat(self.path)
+            identity = stat.st_dev, stat.st_ino
+        except OSError:
+            stat = identity = None
+
+        if self.identity is not None and identity != self.identity:
+            if self.file is not None:
+                self.read(counts, lines)  # the end of the rotated file
+                self.close()
+            self.identity = None
+            self.offset = 0
+            self.partial = b''
+        if stat is None:
+            if self.offset is None:
+                self.offset = 0  # created later on, so read it from the start
+            return counts, lines
+
+        if self.identity is None:
+            if self.offset is None:
+                self.offset = stat.st_size
+            self.identity = identity
+        elif stat.st_size < self.offset:
+            self.offset = 0
+            self.partial = b''
+        if stat.st_size > self.offset:
+            if self.file is None and self.open() != self.identity:
+                # replaced between the stat and the open, pick it up on the next check
+                self.close()
+                return counts, lines
+            self.read(counts, lines)
+        if not KEEP_OPEN:
+            self.close()
+        return counts, lines
+
+    def read(self, counts, lines):
+        self.file.seek(self.offset)
+        budget = MAX_READ
+        last = {}
+        while budget > 0:
+            chunk = self.file.read(min(CHUNK_SIZE, budget))
+            if not chunk:
+                break
+            self.offset += len(chunk)
+            budget -= len(chunk)
+            data = self.partial + chunk if self.partial else chunk
+            end = data.rfind(b'\n') + 1
+            if not end and len(data) > MAX_LINE:
+                end = len(data)
+            self.partial = data[end:]
+            self.scan(data, end, counts, last)
+        for name, (data, start) in last.items():
+            line_end = data.find(b'\n', start, start + MAX_SAMPLE_LINE * 4)
+            line = data[start:line_end if line_end >= 0 else start + MAX_SAMPLE_LINE * 4]
+            lines[name] = line.decode(errors='replace').strip()[:MAX_SAMPLE_LINE]
+
+    def scan(self, data, end, counts, last):
+        """Count the matching lines of `data[:end]`; only lines that match cost any Python code."""
+        search = self.regex.search
+        position = 0
+        while True:
+            match = search(data, position, end)
+            if match is None:
+                return
+            hit = match.start()
+            # the first alternative matching where the scan hit is the one that matched
+            name = next((name for name, regex in self.compiled if regex.match(data, hit, end)), self.compiled[0][0])
+            counts[name] += 1
+            last[name] = (data, data.rfind(b'\n', 0, hit) + 1)
+            position = data.find(b'\n', match.end(), end) + 1
+            if not position:
+                return
+
+
+def load_log_tails(config):
+    """Read every `[LOG <name>]` section of the config into a LogTail."""
+    tails = []
+    for section in config.sections():
+        if not section.startswith(LOG_SECTION_PREFIX):
+            continue
+        options = config[section]
+        try:
+            patterns = parse_patterns(options.get('Patterns', ''))
+            if not options.get('Path') or not patterns:
+                raise ValueError("Path and Patterns are required")
+            tails.append(LogTail(section[len(LOG_SECTION_PREFIX):].strip(), options.get('Path'), patterns,
+                                 options.getboolean('Ignore_Case', fallback=False),
+                                 options.get('Severity', 'warning'), options.get('Channel') or None))
+        except (re.error, ValueError) as e:
+            print(f"Invalid log check [{section}]: {e}")
+    return tails
+
+
+class LogMonitor:
+    """The configured log tails, polled once per check into `log_matches{log, pattern}` counts."""
+
+    def __init__(self):
+        self.tails = {}
+        self.matched = {}  # (log, pattern) -> last matching line of the latest poll, for the alert email
+
+    def configure(self, tails):
+        """Swap in new tails; a tail whose file and patterns are unchanged keeps its position."""
+        current = self.tails
+        self.tails = {}
+        for tail in tails:
+            existing = current.pop(tail.name, None)
+            if existing is not None and existing.signature == tail.signature:
+                existing.severity = tail.severity
+                existing.channel = tail.channel
+                tail = existing
+            self.tails[tail.name] = tail
+        for tail in current.values():
+            tail.close()
+
+    def rules(self):
+        """An alert rule per log, firing on a check that found any matching line."""
+        return [AlertRule(f"Log {tail.name}", 'log_matches', 0, labels={'log': tail.name}, severity=tail.severity,
+                          channel=tail.channel)
+                for tail in self.tails.values()]
+
+    def poll(self):
+        """Returns the `{series key: count}` snapshot and `{(log, pattern): last matching line}`."""
+        snapshot = {}
+        matched = {}
+        for tail in self.tails.values():
+            try:
+                counts, lines = tail.poll()
+            except OSError as e:
+                print(f"Failed to read log {tail.path}: {e}")
+                tail.close()
+                continue
+            for pattern, count in counts.items():
+                snapshot[tail.keys[pattern]] = count
+            for pattern, line in lines.items():
+                matched[(tail.name, pattern)] = line
+        self.matched = matched
+        return snapshot, matched
+
+    def close(self):
+        for tail in self.tails.values():
+            tail.close()
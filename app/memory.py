@@ -0,0 +1,163 @@
+import gc
+import sys
+import threading
+import time
+import tracemalloc
+
+from app.rules import series_key
+
+MEMORY_SAMPLE_INTERVAL = 60  # seconds between two RSS readings
+MEMORY_SNAPSHOT_INTERVAL = 3600  # seconds between two tracemalloc snapshots kept for diffing
+MEMORY_SNAPSHOTS = 24  # periodic snapshots kept besides the first one
+TRACE_FRAMES = 1  # frames tracemalloc keeps per allocation; more cost memory for every live block
+TOP_ALLOCATIONS = 20  # lines listed in a memory report
+
+
+def rss_mb():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except Exception as e:
+        print(f"Failed to read agent memory usage: {e}")
+        return None
+
+
+def object_counts():
+    """Counts of the objects that grew without bound in the past: threads, figures and gc-tracked objects."""
+    counts = {'threads': threading.active_count(), 'gc_objects': len(gc.get_objects())}
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    if pyplot is not None:
+        counts['figures'] = len(pyplot.get_fignums())
+    return counts
+
+
+class MemorySnapshot:
+    """The traced size and count of live blocks per allocating source line, without the tracemalloc objects."""
+
+    __slots__ = ('t', 'traced', 'lines')
+
+    def __init__(self, t):
+        self.t = t
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ))
+        self.lines = {}  # "file:line" -> (bytes, blocks)
+        for statistic in snapshot.statistics('lineno'):
+            frame = statistic.traceback[0]
+            self.lines[f"{frame.filename}:{frame.lineno}"] = (statistic.size, statistic.count)
+        self.traced = sum(size for size, _ in self.lines.values())
+
+    def top(self, count=TOP_ALLOCATIONS):
+        lines = sorted(self.lines.items(), key=lambda item: item[1][0], reverse=True)[:count]
+        return [{'location': location, 'size_kb': round(size / 1024, 1), 'blocks': blocks}
+                for location, (size, blocks) in lines]
+
+    def diff(self, older, count=TOP_ALLOCATIONS):
+        """The lines whose live memory changed most since `older`, growth and shrinkage alike."""
+        changes = []
+        for location in self.lines.keys() | older.lines.keys():
+            size, blocks = self.lines.get(location, (0, 0))
+            old_size, old_blocks = older.lines.get(location, (0, 0))
+            if size != old_size or blocks != old_blocks:
+                changes.append((size - old_size, blocks - old_blocks, size, location))
+        changes.sort(key=lambda change: abs(change[0]), reverse=True)
+        return [{'location': location, 'size_kb': round(size / 1024, 1), 'size_diff_kb': round(difference / 1024, 1),
+                 'blocks_diff': block_difference}
+                for difference, block_difference, size, location in changes[:count]]
+
+
+class MemoryWatchdog:
+    """Watches the agent's own memory: RSS every minute against an optional budget, and with tracing on,
+    a tracemalloc snapshot every hour to diff against the first one or the previous one.
+
+    Tracing costs memory per live block and slows allocations down, so it is off unless asked for.
+    """
+
+    def __init__(self):
+        self.tracing = False
+        self.budget_mb = 0
+        self.lock = threading.Lock()
+        self.first = None
+        self.snapshots = []
+        self.rss = None
+        self.next_sample = 0.0
+        self.next_snapshot = 0.0
+
+    def configure(self, tracing, budget_mb=0):
+        self.budget_mb = budget_mb
+        if tracing == self.tracing:
+            return
+        with self.lock:
+            self.tracing = tracing
+            self.first = None
+            self.snapshots = []
+            self.next_snapshot = 0.0
+            if tracing:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(TRACE_FRAMES)
+            elif tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    @property
+    def enabled(self):
+        return self.tracing or bool(self.budget_mb)
+
+    def snapshot(self, t):
+        with self.lock:
+            return MemorySnapshot(t) if self.tracing else None
+
+    def check(self, now, monotonic=None):
+        """Read RSS when due, and keep a snapshot when one is due; returns the `{series key: value}` readings."""
+        if monotonic is None:
+            monotonic = time.monotonic()
+        if not self.enabled or monotonic < self.next_sample:
+            return {}
+        self.next_sample = monotonic + MEMORY_SAMPLE_INTERVAL
+        readings = {}
+        self.rss = rss_mb()
+        if self.rss is not None:
+            readings[series_key('agent_rss_mb')] = self.rss
+        if self.tracing:
+            readings[series_key('agent_traced_mb')] = tracemalloc.get_traced_memory()[0] / 1024 ** 2
+            if monotonic >= self.next_snapshot:
+                self.next_snapshot = monotonic + MEMORY_SNAPSHOT_INTERVAL
+                snapshot = self.snapshot(now)
+                with self.lock:
+                    if self.first is None:
+                        self.first = snapshot
+                    else:
+                        self.snapshots = (self.snapshots + [snapshot])[-MEMORY_SNAPSHOTS:]
+        return readings
+
+    def report(self, now, against='first', top=TOP_ALLOCATIONS):
+        """Current usage and, with tracing on, the top allocations of a fresh snapshot and its diff against the
+        first snapshot (`against='first'`) or the newest periodic one (`'previous'`).
+        """
+        rss = rss_mb()
+        report = {
+            'rss_mb': round(rss, 1) if rss is not None else None,
+            'budget_mb': self.budget_mb or None,
+            'tracing': self.tracing,
+        }
+        if not self.tracing:
+            return report
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = self.snapshot(now)
+        with self.lock:
+            older = self.snapshots[-1] if against == 'previous' and self.snapshots else self.first
+            kept = ([self.first] if self.first is not None else []) + self.snapshots
+        report.update({
+            'traced_mb': round(current / 1024 ** 2, 1),
+            'peak_traced_mb': round(peak / 1024 ** 2, 1),
+            'snapshots': [{'t': kept_snapshot.t, 'traced_mb': round(kept_snapshot.traced / 1024 ** 2, 1)}
+                          for kept_snapshot in kept],
+            'top': snapshot.top(top),
+            'diff_since': older.t if older is not None else None,
+            'diff': snapshot.diff(older, top) if older is not None else [],
+        })
+        return report
+
+    def close(self):
+        self.configure(False, self.budget_mb)
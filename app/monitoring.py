@@ -1,6 +1,7 @@
 import psutil
 import threading
 import time
+from app.rules import series_key
 
 def start_monitoring(app):
     monitoring_thread = threading.Thread(target=monitor_services_and_processes, args=(app,), daemon=True)
@@ -40,16 +41,17 @@ def check_cpu_ram_usage(app):
     cpu_usage = psutil.cpu_percent(interval=1)
     ram_usage = psutil.virtual_memory().percent
 
-    if cpu_usage > app.cpu_threshold.get():
-        app.handle_hardware_overload("CPU Usage", cpu_usage, app.cpu_threshold.get())
-    if ram_usage > app.ram_threshold.get():
-        app.handle_hardware_overload("RAM Usage", ram_usage, app.ram_threshold.get())
+    app.evaluate_rules({
+        series_key('cpu'): cpu_usage,
+        series_key('ram'): ram_usage,
+    })
 
 def check_disk_space(app):
-    for partition in psutil.disk_partitions():
-        if partition.device in app.disk_thresholds:
-            usage = psutil.disk_usage(partition.mountpoint).percent
-            if usage > app.disk_thresholds[partition.device]:
-                app.handle_hardware_overload(f"Disk Space {partition.device}", usage, app.disk_thresholds[partition.device])
+    if not app.rule_engine.plan.has_metric('disk') and not app.disk_thresholds:
+        return
+    app.evaluate_rules({
+        series_key('disk', device=partition.device): psutil.disk_usage(partition.mountpoint).percent
+        for partition in psutil.disk_partitions() if partition.fstype
+    })
 
 
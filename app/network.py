@@ -0,0 +1,67 @@
+from app.rules import series_key
+
+# psutil counter field -> metric name, every metric is a per-second rate labelled with the interface
+NET_COUNTERS = (
+    ('bytes_recv', 'net_rx_bytes'),
+    ('bytes_sent', 'net_tx_bytes'),
+    ('packets_recv', 'net_rx_packets'),
+    ('packets_sent', 'net_tx_packets'),
+    ('errin', 'net_rx_errors'),
+    ('errout', 'net_tx_errors'),
+    ('dropin', 'net_rx_drops'),
+    ('dropout', 'net_tx_drops'),
+)
+
+
+def counter_delta(previous, current):
+    """Increase of a monotonic counter between two readings, allowing for 32/64-bit wraparound and resets."""
+    if current >= previous:
+        return current - previous
+    modulus = 2 ** 32 if previous < 2 ** 32 else 2 ** 64
+    delta = current + modulus - previous
+    # a wrap only skips past the top by a little, anything larger means the counter was reset
+    return delta if delta < modulus // 2 else current
+
+
+class NetworkRates:
+    """Per-interface rates computed from successive `net_io_counters(pernic=True)` readings."""
+
+    def __init__(self):
+        self.previous = {}
+        self.previous_time = None
+        self.rates = {}  # interface -> {metric: rate}
+        self._keys = {}  # interface -> [(field, metric, series key)]
+        self.removed = []  # series keys of interfaces that disappeared, for the history to drop
+
+    def keys_for(self, nic):
+        keys = self._keys.get(nic)
+        if keys is None:
+            keys = self._keys[nic] = [(field, metric, series_key(metric, nic=nic)) for field, metric in NET_COUNTERS]
+        return keys
+
+    def update(self, counters, now):
+        """Take a new reading of every interface and return `{series key: rate}`; empty on the first reading."""
+        snapshot = {}
+        rates = {}
+        elapsed = now - self.previous_time if self.previous_time is not None else 0
+        if elapsed > 0:
+            for nic, reading in counters.items():
+                last = self.previous.get(nic)
+                if last is None:
+                    continue
+                nic_rates = rates[nic] = {}
+                for field, metric, key in self.keys_for(nic):
+                    rate = counter_delta(getattr(last, field), getattr(reading, field)) / elapsed
+                    nic_rates[metric] = rate
+                    snapshot[key] = rate
+        # veth and tun interfaces come and go with containers and VPN sessions
+        for nic in [nic for nic in self._keys if nic not in counters]:
+            self.removed.extend(key for _, _, key in self._keys.pop(nic))
+        self.previous = counters
+        self.previous_time = now
+        self.rates = rates
+        return snapshot
+
+    def drain_removed(self):
+        removed, self.removed = self.removed, []
+        return removed
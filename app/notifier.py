@@ -0,0 +1,296 @@
+import abc
+import json
+import queue
+import threading
+import time
+
+CHANNEL_SECTION_PREFIX = 'CHANNEL '
+SEVERITIES = ('info', 'warning', 'critical')
+QUEUE_SIZE = 100  # notifications waiting per channel; newer ones are dropped beyond this
+SEND_TIMEOUT = 10  # seconds a webhook post may take
+RETRY_DELAYS = (1, 5)  # seconds before each retry of a failed delivery
+STOP_TIMEOUT = 5  # seconds stop() waits for the workers to drain their queues
+
+SYSLOG_PORT = 514
+SYSLOG_IDENT = 'CyberMooseWatch: '
+SYSLOG_PRIORITIES = {'info': 6, 'warning': 4, 'critical': 2}  # syslog severity codes
+SYSLOG_FACILITIES = {'user': 1, 'daemon': 3, **{f"local{number}": 16 + number for number in range(8)}}
+
+
+def parse_severities(text):
+    """Parse `warning, critical` into a set; an empty value means every severity."""
+    severities = {severity.strip().lower() for severity in (text or '').split(',') if severity.strip()}
+    return severities or set(SEVERITIES)
+
+
+class Channel(abc.ABC):
+    """One notification destination with its own bounded queue and worker thread.
+
+    Subclasses implement send(rendered, severity) and raise on failure; a failed delivery is
+    retried after each of RETRY_DELAYS seconds, then counted and dropped.
+    """
+
+    def __init__(self, name, severities=None, queue_size=QUEUE_SIZE):
+        self.name = name
+        self.severities = set(severities or SEVERITIES)
+        self.queue = queue.Queue(queue_size)
+        self.retry_delays = RETRY_DELAYS
+        self.instrumentation = None
+        self.signature = None  # options the channel was built from, to keep it across config reloads
+        self.worker = None
+        self.lock = threading.Lock()
+
+    def accepts(self, severity):
+        return severity in self.severities
+
+    def submit(self, rendered, severity):
+        """Queue a notification without blocking; returns False when the queue is full."""
+        with self.lock:
+            if self.worker is None or not self.worker.is_alive():
+                self.worker = threading.Thread(target=self._run, name=f"notify-{self.name}", daemon=True)
+                self.worker.start()
+        try:
+            self.queue.put_nowait((rendered, severity))
+        except queue.Full:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._deliver(*item)
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, rendered, severity):
+        instrumentation = self.instrumentation
+        error = None
+        for delay in self.retry_delays + (None,):
+            start = time.perf_counter()
+            try:
+                self.send(rendered, severity)
+            except Exception as e:
+                error = e
+            else:
+                if instrumentation is not None:
+                    instrumentation.record(f"notify_{self.name}", time.perf_counter() - start)
+                    instrumentation.increment('notifications_sent')
+                return
+            if delay is None:
+                break
+            time.sleep(delay)
+        if instrumentation is not None:
+            instrumentation.increment('notifications_failed')
+        print(f"Failed to send '{rendered.subject}' to channel {self.name}: {error}")
+
+    @abc.abstractmethod
+    def send(self, rendered, severity):
+        """Deliver one notification, raising on failure."""
+
+    def flush(self, timeout=None):
+        """Wait until every queued notification was handled; returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Let the worker finish what is queued, waiting at most `timeout` seconds."""
+        worker = self.worker
+        if worker is None or not worker.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        worker.join(timeout)
+
+
+class EmailChannel(Channel):
+    """Hands notifications to the monitor's email delivery, which owns the SMTP settings."""
+
+    def __init__(self, deliver, severities=None, name='email', queue_size=QUEUE_SIZE):
+        super().__init__(name, severities, queue_size)
+        self.deliver = deliver
+
+    def send(self, rendered, severity):
+        self.deliver(rendered)
+
+
+class WebhookChannel(Channel):
+    """POSTs a Slack/Teams style JSON message: `text` carries the subject and the plain-text body."""
+
+    def __init__(self, name, url, severities=None, timeout=SEND_TIMEOUT, queue_size=QUEUE_SIZE):
+        super().__init__(name, severities, queue_size)
+        self.url = url
+        self.timeout = timeout
+
+    @staticmethod
+    def payload(rendered, severity):
+        return {'title': rendered.subject, 'severity': severity, 'text': f"{rendered.subject}\n\n{rendered.text}"}
+
+    def send(self, rendered, severity):
+        import urllib.request
+
+        request = urllib.request.Request(
+            self.url, data=json.dumps(self.payload(rendered, severity)).encode(),
+            headers={'Content-Type': 'application/json'}, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+class SyslogChannel(Channel):
+    """Sends the subject line to syslog (RFC 3164), over a local socket such as /dev/log or UDP `host:port`."""
+
+    def __init__(self, name, address, severities=None, facility='user', queue_size=QUEUE_SIZE):
+        super().__init__(name, severities, queue_size)
+        if facility not in SYSLOG_FACILITIES:
+            raise ValueError(f"unknown syslog facility '{facility}'")
+        self.address = address
+        self.facility = facility
+        self.socket = None  # opened by the worker on first use
+
+    def _connect(self):
+        import socket
+
+        if self.address.startswith('/'):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            address = self.address
+        else:
+            host, _, port = self.address.rpartition(':') if ':' in self.address else (self.address, '', '')
+            address = (host, int(port or SYSLOG_PORT))
+            sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def send(self, rendered, severity):
+        priority = SYSLOG_FACILITIES[self.facility] * 8 + SYSLOG_PRIORITIES.get(severity, 4)
+        data = f"<{priority}>{SYSLOG_IDENT}[{severity}] {rendered.subject}".encode()
+        if self.socket is None:
+            self.socket = self._connect()
+        try:
+            self.socket.send(data)
+        except OSError:
+            self.socket.close()
+            self.socket = None
+            raise
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        super().stop(timeout)
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class FileChannel(Channel):
+    """Appends one JSON line per notification to a local file."""
+
+    def __init__(self, name, path, severities=None, queue_size=QUEUE_SIZE):
+        super().__init__(name, severities, queue_size)
+        self.path = path
+
+    def send(self, rendered, severity):
+        line = json.dumps({'t': time.time(), 'severity': severity, 'subject': rendered.subject,
+                           'text': rendered.text}, separators=(',', ':'))
+        with open(self.path, 'a', encoding='utf-8') as log_file:
+            log_file.write(line + '\n')
+
+
+def load_channels(config):
+    """Read every `[CHANNEL <name>]` section of the config into a channel."""
+    channels = []
+    for section in config.sections():
+        if not section.startswith(CHANNEL_SECTION_PREFIX):
+            continue
+        options = config[section]
+        name = section[len(CHANNEL_SECTION_PREFIX):].strip()
+        kind = options.get('Type', '').strip().lower()
+        try:
+            severities = parse_severities(options.get('Severities', ''))
+            queue_size = options.getint('Queue_Size', fallback=QUEUE_SIZE)
+            if kind == 'webhook':
+                channel = WebhookChannel(name, options['URL'], severities,
+                                         options.getfloat('Timeout', fallback=SEND_TIMEOUT), queue_size)
+            elif kind == 'syslog':
+                channel = SyslogChannel(name, options.get('Address', '/dev/log'), severities,
+                                        options.get('Facility', 'user'), queue_size)
+            elif kind == 'file':
+                channel = FileChannel(name, options['Path'], severities, queue_size)
+            else:
+                raise ValueError(f"unknown channel type '{kind}'")
+        except (KeyError, ValueError) as e:
+            print(f"Invalid notification channel [{section}]: {e}")
+            continue
+        channel.signature = (kind, tuple(sorted(options.items())))
+        channels.append(channel)
+    return channels
+
+
+class Notifier:
+    """Fans each notification out to the channels routed for its severity, without waiting on any of them."""
+
+    def __init__(self, instrumentation=None):
+        self.instrumentation = instrumentation
+        self.channels = {}
+
+    def configure(self, channels):
+        """Switch to a new set of channels; unchanged ones keep their queue and worker."""
+        current = {}
+        for channel in channels:
+            existing = self.channels.get(channel.name)
+            if existing is not None and channel.signature is not None and existing.signature == channel.signature:
+                channel = existing
+            channel.instrumentation = self.instrumentation
+            current[channel.name] = channel
+        replaced = [channel for name, channel in self.channels.items() if current.get(name) is not channel]
+        self.channels = current
+        for channel in replaced:
+            threading.Thread(target=channel.stop, name=f"stop-{channel.name}", daemon=True).start()
+
+    def notify(self, rendered, severity='warning', channel=None):
+        """Queue a rendered alert on `channel`, or on every channel accepting `severity`; returns their names."""
+        if channel is not None:
+            if channel not in self.channels:
+                print(f"Notification channel '{channel}' is not configured, dropping '{rendered.subject}'")
+                return []
+            targets = [self.channels[channel]]
+        else:
+            targets = [target for target in self.channels.values() if target.accepts(severity)]
+
+        queued = []
+        for target in targets:
+            if target.submit(rendered, severity):
+                queued.append(target.name)
+            else:
+                if self.instrumentation is not None:
+                    self.instrumentation.increment('notifications_dropped')
+                print(f"Channel {target.name} is backed up, dropping '{rendered.subject}'")
+            if self.instrumentation is not None:
+                self.instrumentation.set_gauge(f"notify_queue_{target.name}", target.queue.qsize())
+        return queued
+
+    def flush(self, timeout=None):
+        """Wait for every channel to empty its queue; returns False if one did not within `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = True
+        for channel in list(self.channels.values()):
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            flushed = channel.flush(remaining) and flushed
+        return flushed
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Drain and stop every worker, waiting at most `timeout` seconds in total."""
+        deadline = time.monotonic() + timeout
+        for channel in list(self.channels.values()):
+            channel.stop(max(0.0, deadline - time.monotonic()))
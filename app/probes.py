@@ -0,0 +1,241 @@
+import asyncio
+import ssl
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from app.config import PROBE_SECTION_PREFIX
+from app.instrumentation import LatencyHistogram
+from app.rules import series_key
+
+PROBE_INTERVAL = 30  # seconds between two runs of a probe
+PROBE_TIMEOUT = 5  # seconds a probe may take in total before it counts as failed
+MAX_CONCURRENT_PROBES = 256  # probes in flight at once, to stay clear of the open file limit
+USER_AGENT = 'ServiceMonitor-Probe'
+
+ProbeResult = namedtuple('ProbeResult', ['name', 'up', 'connect', 'response', 'error', 't', 'status'])
+
+
+def parse_address(address):
+    """`host:port` (or `[::1]:port`) into `(host, port)`."""
+    host, _, port = address.strip().rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid address {address!r}, expected host:port")
+    return host.strip('[]'), int(port)
+
+
+class Probe:
+    """A synthetic check of one TCP port or HTTP(S) URL.
+
+    TCP probes time the connect; HTTP probes also send a GET and time the wait for the status line.
+    """
+
+    def __init__(self, name, address=None, url=None, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT,
+                 expect_status=None, failures=1, service=None):
+        self.name = name
+        self.url = url
+        if url:
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError(f"Invalid URL {url!r}")
+            self.kind = 'http'
+            self.tls = parts.scheme == 'https'
+            self.host = parts.hostname
+            self.port = parts.port or (443 if self.tls else 80)
+            path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+            self.request = (f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nUser-Agent: {USER_AGENT}\r\n"
+                            f"Connection: close\r\n\r\n").encode()
+        else:
+            self.kind = 'tcp'
+            self.tls = False
+            self.host, self.port = parse_address(address or '')
+        self.interval = interval
+        self.timeout = timeout
+        self.expect_status = expect_status  # None accepts any status below 400
+        self.failures = max(1, failures)  # consecutive failures before the probe is Down
+        self.service = service  # restarted when the probe goes Down and auto restart is on
+        self.ssl_context = None  # loading the CA store is slow, so it is done once and shared by the runner
+        self.signature = (name, address, url, interval, timeout, expect_status, failures, service)
+        self.keys = {metric: series_key(metric, probe=name)
+                     for metric in ('probe_up', 'probe_connect_ms', 'probe_response_ms')}
+
+    async def check(self):
+        """Returns `(connect seconds, response seconds or None)`; raises on failure."""
+        if self.tls and self.ssl_context is None:
+            self.ssl_context = ssl.create_default_context()
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl_context)
+        try:
+            connected = time.perf_counter()
+            if self.kind == 'tcp':
+                return connected - start, None
+            writer.write(self.request)
+            await writer.drain()
+            status_line = await reader.readline()
+            response = time.perf_counter() - connected
+            fields = status_line.split()
+            if len(fields) < 2 or not fields[0].startswith(b'HTTP/') or not fields[1].isdigit():
+                raise ValueError(f"Invalid response {status_line[:80]!r}")
+            status = int(fields[1])
+            accepted = status in self.expect_status if self.expect_status else status < 400
+            if not accepted:
+                raise ValueError(f"HTTP status {status}")
+            return connected - start, response
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def run(self):
+        t = time.time()
+        try:
+            connect, response = await asyncio.wait_for(self.check(), self.timeout)
+        except asyncio.TimeoutError:
+            return ProbeResult(self.name, False, None, None, f"Timed out after {self.timeout} s", t, None)
+        except (OSError, ValueError) as e:
+            return ProbeResult(self.name, False, None, None, str(e) or type(e).__name__, t, None)
+        return ProbeResult(self.name, True, connect, response, None, t, None)
+
+
+def load_probes(config):
+    """Read every `[PROBE <name>]` section of the config into a Probe."""
+    probes = []
+    for section in config.sections():
+        if not section.startswith(PROBE_SECTION_PREFIX):
+            continue
+        options = config[section]
+        try:
+            expect_status = tuple(int(code) for code in options.get('Expect_Status', '').split(',') if code.strip())
+            probes.append(Probe(section[len(PROBE_SECTION_PREFIX):].strip(), options.get('Address'),
+                                options.get('URL'), options.getfloat('Interval', fallback=PROBE_INTERVAL),
+                                options.getfloat('Timeout', fallback=PROBE_TIMEOUT), expect_status or None,
+                                options.getint('Failures', fallback=1), options.get('Service') or None))
+        except ValueError as e:
+            print(f"Invalid probe [{section}]: {e}")
+    return probes
+
+
+class ProbeRunner:
+    """Runs every probe on its own interval in one asyncio loop, so hundreds of them need a single thread.
+
+    Finished results queue up until the monitor drains them on its next check, each carrying the probe's
+    status (`Up`, or `Down` after `failures` failed runs in a row).
+    """
+
+    def __init__(self):
+        self.probes = {}
+        self.signature = ()
+        self.lock = threading.Lock()
+        self.completed = []
+        self.failures = {}  # probe name -> consecutive failed runs
+        self.last = {}  # probe name -> latest ProbeResult
+        self.histograms = {}  # probe name -> {'connect': LatencyHistogram, 'response': LatencyHistogram}
+        self.removed = []  # series keys of probes taken out of the config, for the history to drop
+        self.ssl_context = None
+
+    def configure(self, probes):
+        for probe in probes:
+            if probe.tls:
+                if self.ssl_context is None:
+                    self.ssl_context = ssl.create_default_context()
+                probe.ssl_context = self.ssl_context
+        names = {probe.name for probe in probes}
+        with self.lock:
+            removed = [probe for name, probe in self.probes.items() if name not in names]
+            self.probes = {probe.name: probe for probe in probes}
+            self.signature = tuple(probe.signature for probe in probes)
+            self.removed.extend(key for probe in removed for key in probe.keys.values())
+            # describe() reads these from the web server's thread
+            for state in (self.failures, self.last, self.histograms):
+                for name in [name for name in state if name not in names]:
+                    del state[name]
+
+    def record(self, result):
+        probe = self.probes.get(result.name)
+        if probe is None:
+            return  # removed while it ran
+        failures = 0 if result.up else self.failures.get(result.name, 0) + 1
+        result = result._replace(status="Down" if failures >= probe.failures else "Up")
+        with self.lock:
+            self.failures[result.name] = failures
+            self.last[result.name] = result
+            if result.up:
+                histograms = self.histograms.get(result.name)
+                if histograms is None:
+                    histograms = self.histograms[result.name] = {'connect': LatencyHistogram(),
+                                                                 'response': LatencyHistogram()}
+                histograms['connect'].record(result.connect)
+                if result.response is not None:
+                    histograms['response'].record(result.response)
+            self.completed.append(result)
+
+    def drain(self):
+        """The results finished since the last call, oldest first."""
+        with self.lock:
+            completed, self.completed = self.completed, []
+        return completed
+
+    def drain_removed(self):
+        with self.lock:
+            removed, self.removed = self.removed, []
+        return removed
+
+    async def run_all(self, probes):
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+
+        async def run(probe):
+            async with semaphore:
+                self.record(await probe.run())
+        await asyncio.gather(*(run(probe) for probe in probes))
+
+    def run_once(self):
+        """Run every probe once, concurrently, and wait for all of them."""
+        asyncio.run(self.run_all(list(self.probes.values())))
+
+    def run(self, token):
+        """Supervised worker: run each probe every `interval` seconds until cancelled."""
+        asyncio.run(self.schedule(token, list(self.probes.values())))
+
+    async def schedule(self, token, probes):
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+
+        def stop():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(stopped.set)
+        token.on_cancel(stop)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+
+        async def repeat(probe, delay):
+            await asyncio.sleep(delay)
+            while True:
+                started = loop.time()
+                async with semaphore:
+                    self.record(await probe.run())
+                await asyncio.sleep(max(0.0, probe.interval - (loop.time() - started)))
+
+        # spread the first runs over a second so hundreds of probes do not connect in the same instant
+        tasks = [asyncio.create_task(repeat(probe, index / len(probes))) for index, probe in enumerate(probes)]
+        try:
+            await stopped.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def describe(self):
+        """Status, last error and latency percentiles of every probe, for /status."""
+        with self.lock:
+            return {
+                name: {
+                    'status': self.last[name].status if name in self.last else "Unknown",
+                    'error': self.last[name].error if name in self.last else None,
+                    'connect': self.histograms[name]['connect'].summary() if name in self.histograms else None,
+                    'response': self.histograms[name]['response'].summary()
+                    if name in self.histograms and self.probes[name].kind == 'http' else None,
+                }
+                for name in self.probes
+            }
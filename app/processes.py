@@ -0,0 +1,94 @@
+import psutil
+
+from app.network import counter_delta
+from app.rules import series_key
+
+PROCESS_METRICS = ('proc_instances', 'proc_cpu', 'proc_rss_mb', 'proc_threads', 'proc_fds', 'proc_io_read_bytes',
+                   'proc_io_write_bytes')
+# open file descriptors on POSIX, handles on Windows
+FD_METHOD = 'num_fds' if hasattr(psutil.Process, 'num_fds') else 'num_handles'
+
+
+def find_instances(provider, names):
+    """Group the running processes by name, for the given names only."""
+    instances = {name: [] for name in names if name}
+    for proc in provider.process_iter(['name']):
+        matching = instances.get(proc.info['name'])
+        if matching is not None:
+            matching.append(proc)
+    return instances
+
+
+class ProcessMetrics:
+    """Resource usage of the monitored processes, summed over all running instances of each name.
+
+    Process handles are kept between ticks, so cpu_percent() measures since the previous tick, and
+    every process is read inside oneshot() so its /proc (or Windows API) reads happen once.
+    """
+
+    def __init__(self):
+        self.handles = {}  # pid -> process handle
+        self.io = {}  # pid -> (read bytes, write bytes, time)
+        self.totals = {}  # process name -> {metric: value}
+        self._keys = {}  # process name -> [(metric, series key)]
+
+    def keys_for(self, name):
+        keys = self._keys.get(name)
+        if keys is None:
+            keys = self._keys[name] = [(metric, series_key(metric, process=name)) for metric in PROCESS_METRICS]
+        return keys
+
+    def read(self, handle, now):
+        """Return (cpu %, rss, threads, fds, read bytes/s, write bytes/s) for one process."""
+        with handle.oneshot():
+            cpu = handle.cpu_percent()
+            rss = handle.memory_info().rss
+            threads = handle.num_threads()
+            fds = getattr(handle, FD_METHOD)()
+            try:
+                io = handle.io_counters()
+            except (psutil.AccessDenied, AttributeError):
+                io = None
+
+        read_rate = write_rate = 0.0
+        if io is not None:
+            last = self.io.get(handle.pid)
+            if last is not None and now > last[2]:
+                read_rate = counter_delta(last[0], io.read_bytes) / (now - last[2])
+                write_rate = counter_delta(last[1], io.write_bytes) / (now - last[2])
+            self.io[handle.pid] = (io.read_bytes, io.write_bytes, now)
+        return cpu, rss, threads, fds, read_rate, write_rate
+
+    def update(self, instances, now):
+        """Read `{process name: [processes]}` and return a `{series key: value}` snapshot of the totals."""
+        handles = {}
+        totals = {}
+        snapshot = {}
+        for name, processes in instances.items():
+            count = cpu = rss = threads = fds = read_rate = write_rate = 0
+            for proc in processes:
+                handle = self.handles.get(proc.pid, proc)
+                try:
+                    values = self.read(handle, now)
+                except psutil.Error:
+                    continue  # exited or not ours to inspect
+                handles[proc.pid] = handle
+                count += 1
+                cpu += values[0]
+                rss += values[1]
+                threads += values[2]
+                fds += values[3]
+                read_rate += values[4]
+                write_rate += values[5]
+
+            values = dict(zip(PROCESS_METRICS, (count, cpu, round(rss / 1024 ** 2, 1), threads, fds, read_rate,
+                                                write_rate)))
+            totals[name] = values
+            for metric, key in self.keys_for(name):
+                snapshot[key] = values[metric]
+
+        # forget processes that have exited
+        self.handles = handles
+        self.io = {pid: io for pid, io in self.io.items() if pid in handles}
+        self.totals = totals
+        return snapshot
@@ -0,0 +1,185 @@
+import os
+import threading
+import time
+from array import array
+from collections import namedtuple
+
+from app.linux import PreadFile
+from app.providers import PsutilProvider
+
+PROC_ROOT = '/proc'
+SYS_BLOCK = '/sys/block'  # whole disks; partitions only appear below them
+SECTOR_SIZE = 512  # /proc/diskstats counts 512 byte sectors whatever the device's block size
+CPU_FIELDS = 10  # user nice system idle iowait irq softirq steal guest guest_nice
+MEMINFO_FIELDS = (b'MemTotal:', b'MemFree:', b'MemAvailable:', b'Buffers:', b'Cached:', b'SReclaimable:')
+
+# the same fields as psutil's named tuples, so callers cannot tell the providers apart
+VirtualMemory = namedtuple('VirtualMemory', ['total', 'available', 'percent', 'used', 'free', 'buffers', 'cached'])
+NetIO = namedtuple('NetIO', ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin',
+                             'dropout'])
+DiskIO = namedtuple('DiskIO', ['read_count', 'write_count', 'read_bytes', 'write_bytes', 'read_time', 'write_time',
+                               'read_merged_count', 'write_merged_count', 'busy_time'])
+
+
+def cpu_busy_percent(times, previous, row):
+    """Busy share of one /proc/stat row between two readings, computed like psutil.cpu_percent."""
+    start = row * CPU_FIELDS
+    # guest time is already part of user and nice; idle includes iowait
+    total = sum(times[start:start + 8]) - sum(previous[start:start + 8])
+    idle = times[start + 3] + times[start + 4] - previous[start + 3] - previous[start + 4]
+    if total <= 0:
+        return 0.0
+    return round(min(100.0, max(0.0, (total - idle) / total * 100)), 1)
+
+
+class ProcProvider(PsutilProvider):
+    """Linux fast path for the host-wide metrics: /proc files kept open, re-read with one pread each.
+
+    CPU, memory, load, network and disk counters skip psutil's per-call work; processes, services,
+    partitions and everything else still come from psutil.
+    """
+
+    def __init__(self, root=PROC_ROOT, sys_block=SYS_BLOCK):
+        self.root = root
+        self.sys_block = sys_block
+        self.files = {}
+        self.cpu_rows = 0
+        self.cpu_times = array('d')  # parse buffer, only touched under cpu_lock
+        self.cpu_lock = threading.Lock()
+        # each thread's times at its previous non-blocking call, per percpu flag; the monitor, the
+        # status refresh and the graphs all ask, and must not reset each other's baseline
+        self.cpu_previous = threading.local()
+        self.meminfo_rows = None  # line number of each MEMINFO_FIELDS entry, None where the kernel lacks it
+        self.meminfo_values = array('q', bytes(8 * len(MEMINFO_FIELDS)))
+        self.meminfo_lock = threading.Lock()
+        self.whole_disks = {}  # device name -> whether it is a whole disk rather than a partition
+
+    def _read(self, name):
+        pread_file = self.files.get(name)
+        if pread_file is None:
+            pread_file = self.files[name] = PreadFile(os.path.join(self.root, name))
+        return pread_file.read()
+
+    def _parse_stat(self):
+        """Parse the `cpu` and `cpuN` rows of /proc/stat into the preallocated times array (clock ticks).
+
+        Callers hold cpu_lock and copy what they keep; the array is overwritten by the next reading.
+        """
+        lines = self._read('stat').split(b'\n')
+        rows = 0
+        while rows < len(lines) and lines[rows].startswith(b'cpu'):
+            rows += 1
+        if rows != self.cpu_rows:
+            self.cpu_rows = rows
+            self.cpu_times = array('d', bytes(8 * rows * CPU_FIELDS))
+        times = self.cpu_times
+        for row in range(rows):
+            fields = lines[row].split()[1:CPU_FIELDS + 1]
+            start = row * CPU_FIELDS
+            for index, value in enumerate(fields):
+                times[start + index] = int(value)
+        return times
+
+    def cpu_times_array(self):
+        """A copy of the current /proc/stat times, one CPU_FIELDS row for the total and one per core."""
+        with self.cpu_lock:
+            return array('d', self._parse_stat())
+
+    def _percents(self, times, previous, percpu):
+        if percpu:
+            return [cpu_busy_percent(times, previous, row) for row in range(1, self.cpu_rows)]
+        return cpu_busy_percent(times, previous, 0)
+
+    def cpu_percent(self, interval=None, percpu=False):
+        if interval:
+            # like psutil, a blocking call times against its own first reading and leaves the baselines alone
+            start = self.cpu_times_array()
+            time.sleep(interval)
+            with self.cpu_lock:
+                times = self._parse_stat()
+                if len(times) == len(start):
+                    return self._percents(times, start, percpu)
+                return [0.0] * (self.cpu_rows - 1) if percpu else 0.0
+        baselines = getattr(self.cpu_previous, 'times', None)
+        if baselines is None:
+            baselines = self.cpu_previous.times = {}
+        with self.cpu_lock:
+            times = self._parse_stat()
+            previous = baselines.get(percpu)
+            if previous is None or len(previous) != len(times):  # first call, or a CPU came online
+                baselines[percpu] = array('d', times)
+                return [0.0] * (self.cpu_rows - 1) if percpu else 0.0
+            percents = self._percents(times, previous, percpu)
+            previous[:] = times  # reuse the array, no allocation per call
+        return percents
+
+    def _meminfo_rows(self, lines):
+        rows = {}
+        for number, line in enumerate(lines):
+            rows[line.partition(b':')[0] + b':'] = number
+        return [rows.get(field) for field in MEMINFO_FIELDS]
+
+    def virtual_memory(self):
+        lines = self._read('meminfo').split(b'\n')
+        with self.meminfo_lock:
+            rows = self.meminfo_rows
+            # the kernel prints meminfo in a fixed order, so the rows are only looked up again if it moved
+            if rows is None or not all(row is None or (row < len(lines) and lines[row].startswith(field))
+                                       for field, row in zip(MEMINFO_FIELDS, rows)):
+                rows = self.meminfo_rows = self._meminfo_rows(lines)
+            values = self.meminfo_values
+            for index, row in enumerate(rows):
+                values[index] = int(lines[row].split()[1]) * 1024 if row is not None else -1
+            total, free, available, buffers, cached, reclaimable = values
+        buffers = max(buffers, 0)
+        cached = max(cached, 0) + max(reclaimable, 0)
+        if available < 0:
+            available = free + buffers + cached
+        used = total - available
+        return VirtualMemory(total, available, round(used / total * 100, 1), used, free, buffers, cached)
+
+    def getloadavg(self):
+        fields = self._read('loadavg').split()
+        return float(fields[0]), float(fields[1]), float(fields[2])
+
+    def net_io_counters(self, pernic=False):
+        counters = {}
+        for line in self._read('net/dev').split(b'\n')[2:]:
+            name, _, rest = line.partition(b':')
+            fields = rest.split()
+            if len(fields) < 16:
+                continue
+            # receive: bytes packets errs drop ..., transmit starts at field 8
+            counters[name.strip().decode()] = NetIO(int(fields[8]), int(fields[0]), int(fields[9]), int(fields[1]),
+                                                    int(fields[2]), int(fields[10]), int(fields[3]), int(fields[11]))
+        if pernic:
+            return counters
+        return NetIO(*(sum(values) for values in zip(*counters.values()))) if counters else None
+
+    def _is_whole_disk(self, name):
+        whole = self.whole_disks.get(name)
+        if whole is None:
+            whole = self.whole_disks[name] = os.path.exists(
+                os.path.join(self.sys_block, name.replace('/', '!')))
+        return whole
+
+    def disk_io_counters(self, perdisk=False):
+        counters = {}
+        for line in self._read('diskstats').split(b'\n'):
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            name = fields[2].decode()
+            counters[name] = DiskIO(int(fields[3]), int(fields[7]), int(fields[5]) * SECTOR_SIZE,
+                                    int(fields[9]) * SECTOR_SIZE, int(fields[6]), int(fields[10]), int(fields[4]),
+                                    int(fields[8]), int(fields[12]))
+        if perdisk:
+            return counters
+        # partitions would count their disk's I/O twice
+        disks = [reading for name, reading in counters.items() if self._is_whole_disk(name)]
+        return DiskIO(*(sum(values) for values in zip(*disks))) if disks else None
+
+    def close(self):
+        for pread_file in self.files.values():
+            pread_file.close()
+        self.files = {}
@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from app.config import atomic_write
+
+PROFILES_DIR = 'profiles'
+PROFILE_SECONDS = 10  # default length of a capture
+PROFILE_RATE = 100  # stack samples per second
+MAX_PROFILE_SECONDS = 300
+MAX_PROFILE_RATE = 1000
+
+
+def frame_label(code):
+    """`module.Class.function` for a code object, as flame graph tools expect one frame per `;`."""
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_qualname}".replace(';', ':')
+
+
+class Profile:
+    """Stack samples per thread, kept as code objects and only turned into labels when written out."""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.stacks = Counter()  # (thread name, (innermost code, ..., outermost code)) -> samples
+        self.samples = 0
+        self.started = time.time()
+        self.duration = 0.0
+        self.overhead = 0.0  # seconds spent walking stacks
+
+    def threads(self):
+        """`{thread name: samples}`, busiest first."""
+        totals = Counter()
+        for (thread, _), count in self.stacks.items():
+            totals[thread] += count
+        return dict(totals.most_common())
+
+    def collapsed(self, thread=None):
+        """Lines of `thread;outermost;...;innermost count`, the input format of flamegraph.pl and speedscope.
+
+        `thread` keeps only the threads whose name starts with it.
+        """
+        labels = {}
+        merged = Counter()
+        for (name, codes), count in self.stacks.items():
+            if thread and not name.startswith(thread):
+                continue
+            frames = []
+            for code in reversed(codes):
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = frame_label(code)
+                frames.append(label)
+            merged[';'.join([name.replace(';', ':')] + frames)] += count
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(merged.items()))
+
+    def hottest(self):
+        """`{thread name: (innermost frame, samples)}` for the frame each thread was seen in most."""
+        leaves = {}
+        for (thread, codes), count in self.stacks.items():
+            if codes:
+                thread_leaves = leaves.setdefault(thread, Counter())
+                thread_leaves[codes[0]] += count
+        return {thread: (frame_label(code), count)
+                for thread, counts in leaves.items() for code, count in counts.most_common(1)}
+
+    def describe(self):
+        return {
+            'started': self.started,
+            'duration_s': round(self.duration, 2),
+            'rate': self.rate,
+            'samples': self.samples,
+            'overhead_percent': round(100 * self.overhead / self.duration, 2) if self.duration else 0.0,
+            'threads': self.threads(),
+        }
+
+    def write(self, file_name):
+        collapsed = self.collapsed()
+        atomic_write(file_name, lambda profile_file: profile_file.write(collapsed))
+
+
+class SamplingProfiler:
+    """Samples the stack of every other thread through `sys._current_frames()` for a while.
+
+    Nothing is installed in the threads themselves, so it costs nothing between captures and
+    can be pointed at a running agent. Only one capture runs at a time.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.lock.locked()
+
+    def capture(self, seconds=PROFILE_SECONDS, rate=PROFILE_RATE, token=None):
+        """Sample for `seconds` at `rate` per second, or until `token` is cancelled; returns the Profile."""
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+        if not 0 < rate <= MAX_PROFILE_RATE:
+            raise ValueError(f"rate must be between 0 and {MAX_PROFILE_RATE}")
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already being captured")
+        try:
+            return self.sample(Profile(rate), seconds, token)
+        finally:
+            self.lock.release()
+
+    def sample(self, profile, seconds, token):
+        own = threading.get_ident()
+        interval = 1.0 / profile.rate
+        start = time.perf_counter()
+        end = start + seconds
+        next_sample = start
+        stacks = profile.stacks
+        idents = frozenset()
+        names = {}
+        # thread ident -> (innermost frame, stack key) of the previous sample. While the innermost frame is the
+        # same object its callers cannot have changed, so a thread blocked in a wait is not walked again.
+        previous = {}
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            frames = sys._current_frames()
+            if frames.keys() != idents:
+                idents = frozenset(frames)
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                previous = {ident: seen for ident, seen in previous.items() if ident in idents}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                seen = previous.get(ident)
+                if seen is not None and seen[0] is frame:
+                    stacks[seen[1]] += 1
+                    continue
+                top = frame
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                key = (names.get(ident, f"thread {ident}"), tuple(codes))
+                previous[ident] = (top, key)
+                stacks[key] += 1
+            del frames, frame
+            profile.samples += 1
+            finished = time.perf_counter()
+            profile.overhead += finished - now
+            # a late sample is not made up for, the next one keeps to the schedule
+            next_sample = max(next_sample + interval, finished)
+            delay = min(next_sample, end) - finished
+            if token is not None:
+                if token.wait(delay):
+                    break
+            elif delay > 0:
+                time.sleep(delay)
+        profile.duration = time.perf_counter() - start
+        return profile
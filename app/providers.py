@@ -0,0 +1,87 @@
+import sys
+import time
+import psutil
+
+
+class SystemClock:
+    """Wall clock used by the monitor; the simulation swaps in a VirtualClock."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, token, seconds):
+        """Sleep until `seconds` passed or the token is cancelled; returns True when cancelled."""
+        return token.wait(seconds)
+
+
+def create_provider(name='psutil'):
+    """The provider named by `Provider` in [MONITORING]: 'psutil', or 'proc' for the Linux /proc fast path."""
+    if name == 'proc':
+        if sys.platform.startswith('linux'):
+            from app.procfs import ProcProvider
+            return ProcProvider()
+        print("The proc provider only works on Linux, using psutil")
+    elif name != 'psutil':
+        print(f"Unknown provider '{name}', using psutil")
+    return PsutilProvider()
+
+
+class PsutilProvider:
+    """System metrics read from psutil.
+
+    Every metric the monitor and the GUI use goes through a provider with this interface, so a
+    simulated host (see app.simulation) can stand in for the real machine.
+    """
+
+    def cpu_percent(self, interval=None, percpu=False):
+        return psutil.cpu_percent(interval=interval, percpu=percpu)
+
+    def virtual_memory(self):
+        return psutil.virtual_memory()
+
+    def disk_partitions(self):
+        return psutil.disk_partitions()
+
+    def disk_usage(self, path):
+        return psutil.disk_usage(path)
+
+    def disk_io_counters(self, perdisk=False):
+        return psutil.disk_io_counters(perdisk=perdisk)
+
+    def process_iter(self, attrs=None):
+        return psutil.process_iter(attrs)
+
+    def pids(self):
+        return psutil.pids()
+
+    def win_service_get(self, name):
+        return psutil.win_service_get(name)
+
+    def win_service_iter(self):
+        return psutil.win_service_iter()
+
+    def boot_time(self):
+        return psutil.boot_time()
+
+    def net_io_counters(self, pernic=False):
+        return psutil.net_io_counters(pernic=pernic)
+
+    def getloadavg(self):
+        if hasattr(psutil, 'getloadavg'):
+            return psutil.getloadavg()
+        return 'N/A', 'N/A', 'N/A'
+
+    def start_service(self, name):
+        import win32serviceutil  # Windows only
+        win32serviceutil.StartService(name)
+
+    def stop_service(self, name):
+        import win32serviceutil  # Windows only
+        win32serviceutil.StopService(name)
+
+    def restart_service(self, name):
+        import win32serviceutil  # Windows only
+        win32serviceutil.RestartService(name)
@@ -0,0 +1,276 @@
+import time
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+
+from app.thresholds import SustainedThreshold, COMPARATORS, OK
+
+RULE_SECTION_PREFIX = 'RULE '
+
+# threshold is only set when it differs from the rule's, e.g. the learned bound of an anomaly rule
+RuleAlert = namedtuple('RuleAlert', ['name', 'rule', 'host', 'series', 'value', 'state', 'threshold'],
+                       defaults=(None,))
+
+
+def series_key(metric, **labels):
+    """Build the snapshot key for a metric and its labels, e.g. series_key('disk', device='C:')."""
+    return metric, tuple(sorted(labels.items()))
+
+
+class AlertRule:
+    """A single declarative alert rule: `metric{labels} op threshold for duration`.
+
+    Anomaly rules (see app.baselines) compare against a learned baseline instead: their thresholds are
+    numbers of standard deviations from it, optionally from the baseline of the current hour of the day.
+    """
+
+    def __init__(self, name, metric, threshold, op='>', labels=None, clear_threshold=None, duration=0,
+                 severity='warning', channel=None, anomaly=False, seasonal=False, min_deviation=0.0):
+        if op not in COMPARATORS:
+            raise ValueError(f"Unsupported comparison in rule {name}: {op}")
+        self.name = name
+        self.metric = metric
+        self.threshold = threshold
+        self.op = op
+        self.labels = dict(labels or {})
+        self.clear_threshold = clear_threshold
+        self.duration = duration
+        self.severity = severity
+        self.channel = channel
+        self.anomaly = anomaly
+        self.seasonal = seasonal
+        self.min_deviation = min_deviation
+
+    def __repr__(self):
+        return f"AlertRule({self.name!r}, {self.metric!r} {self.op} {self.threshold})"
+
+
+def parse_labels(text):
+    """Parse `key=value,key=value` into a dict."""
+    labels = {}
+    for pair in text.split(','):
+        if '=' in pair:
+            key, value = pair.split('=', 1)
+            labels[key.strip()] = value.strip()
+    return labels
+
+
+def load_rules(config):
+    """Read every `[RULE <name>]` section of the config into AlertRule objects."""
+    rules = []
+    for section in config.sections():
+        if not section.startswith(RULE_SECTION_PREFIX):
+            continue
+        options = config[section]
+        try:
+            metric = options.get('Metric', '').strip()
+            if not metric:
+                raise ValueError("Metric is required")
+            clear_threshold = options.get('Clear_Threshold')
+            anomaly = options.get('Anomaly')
+            rules.append(AlertRule(
+                name=section[len(RULE_SECTION_PREFIX):].strip(),
+                metric=metric,
+                threshold=float(anomaly or options.get('Threshold')),
+                op=options.get('Op', '>'),
+                labels=parse_labels(options.get('Labels', '')),
+                clear_threshold=float(clear_threshold) if clear_threshold else None,
+                duration=options.getfloat('Duration', fallback=0),
+                severity=options.get('Severity', 'warning'),
+                channel=options.get('Channel') or None,
+                anomaly=bool(anomaly),
+                seasonal=options.getboolean('Seasonal', fallback=False),
+                min_deviation=options.getfloat('Min_Deviation', fallback=0.0),
+            ))
+        except (TypeError, ValueError) as e:
+            print(f"Invalid alert rule [{section}]: {e}")
+    return rules
+
+
+class _RuleGroup:
+    """Rules sharing a metric and label matcher, with thresholds kept sorted per comparison."""
+
+    def __init__(self, matcher):
+        self.matcher = matcher
+        self.thresholds = {op: [] for op in COMPARATORS}
+        self.indexes = {op: [] for op in COMPARATORS}
+
+    def add(self, rule, index):
+        thresholds = self.thresholds[rule.op]
+        position = bisect_right(thresholds, rule.threshold)
+        thresholds.insert(position, rule.threshold)
+        self.indexes[rule.op].insert(position, index)
+
+    def matches(self, labels, host):
+        for key, value in self.matcher:
+            if key == 'host':
+                if value != host:
+                    return False
+            elif labels.get(key) != value:
+                return False
+        return True
+
+    def breaching(self, value):
+        """Return the indexes of every rule in the group that the value breaches."""
+        found = []
+        if self.indexes['>']:
+            found.extend(self.indexes['>'][:bisect_left(self.thresholds['>'], value)])
+        if self.indexes['>=']:
+            found.extend(self.indexes['>='][:bisect_right(self.thresholds['>='], value)])
+        if self.indexes['<']:
+            found.extend(self.indexes['<'][bisect_right(self.thresholds['<'], value):])
+        if self.indexes['<=']:
+            found.extend(self.indexes['<='][bisect_left(self.thresholds['<='], value):])
+        return found
+
+
+class RulePlan:
+    """Rules compiled once into per-metric groups so a sample is checked with a binary search per group."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.groups = {}
+        self._match_cache = {}
+
+        by_matcher = {}
+        for index, rule in enumerate(self.rules):
+            matcher = tuple(sorted(rule.labels.items()))
+            group = by_matcher.get((rule.metric, matcher))
+            if group is None:
+                group = by_matcher[(rule.metric, matcher)] = _RuleGroup(matcher)
+                self.groups.setdefault(rule.metric, []).append(group)
+            group.add(rule, index)
+
+    def has_metric(self, metric):
+        return metric in self.groups
+
+    def groups_for(self, key, host=None):
+        cache_key = (host, key)
+        groups = self._match_cache.get(cache_key)
+        if groups is None:
+            metric, labels = key
+            labels = dict(labels)
+            groups = [group for group in self.groups.get(metric, ()) if group.matches(labels, host)]
+            self._match_cache[cache_key] = groups
+        return groups
+
+    def forget(self, keys):
+        self._match_cache = {cache_key: groups for cache_key, groups in self._match_cache.items()
+                             if cache_key[1] not in keys}
+
+    def breaching(self, key, value, host=None):
+        found = []
+        for group in self.groups_for(key, host):
+            found.extend(group.breaching(value))
+        return found
+
+
+class RuleEngine:
+    """Evaluates a compiled rule plan against metric snapshots and tracks pending/firing state."""
+
+    def __init__(self, rules=()):
+        self.plan = RulePlan(rules)
+        self.active = {}  # (rule index, host, series key) -> SustainedThreshold
+
+    @property
+    def rules(self):
+        return self.plan.rules
+
+    def load(self, rules):
+        """Recompile the plan, keeping the state of rules that still exist under the same name."""
+        old_rules = self.plan.rules
+        self.plan = RulePlan(rules)
+        new_indexes = {rule.name: index for index, rule in enumerate(self.plan.rules)}
+
+        active = {}
+        for (index, host, key), tracker in self.active.items():
+            new_index = new_indexes.get(old_rules[index].name)
+            if new_index is None:
+                continue
+            rule = self.plan.rules[new_index]
+            tracker.configure(rule.threshold, rule.duration, rule.clear_threshold, rule.op)
+            active[(new_index, host, key)] = tracker
+        self.active = active
+
+    def evaluate(self, snapshot, now=None, host=None):
+        """Evaluate a snapshot of `{series key: value}` and return a RuleAlert for every pending or firing rule."""
+        return self.evaluate_fleet({host: snapshot}, now)
+
+    def evaluate_fleet(self, snapshots, now=None):
+        """Evaluate `{host: snapshot}` for a whole fleet in one pass."""
+        if now is None:
+            now = time.time()
+        plan = self.plan
+        active = self.active
+
+        candidates = set()
+        for host, snapshot in snapshots.items():
+            for key, value in snapshot.items():
+                for index in plan.breaching(key, value, host):
+                    candidates.add((index, host, key))
+        # rules already pending or firing must see the sample too, so they can clear
+        for state_key in active:
+            snapshot = snapshots.get(state_key[1])
+            if snapshot is not None and state_key[2] in snapshot:
+                candidates.add(state_key)
+
+        alerts = []
+        for state_key in candidates:
+            index, host, key = state_key
+            rule = plan.rules[index]
+            value = snapshots[host][key]
+            tracker = active.get(state_key)
+            if tracker is None:
+                tracker = active[state_key] = SustainedThreshold(rule.threshold, rule.duration,
+                                                                 rule.clear_threshold, rule.op)
+            state = tracker.update(value, now)
+            if state == OK:
+                del active[state_key]
+            else:
+                alerts.append(RuleAlert(alert_name(rule, key), rule, host, key, value, state))
+        return alerts
+
+    def forget(self, keys):
+        """Drop the state kept for series that are gone for good, e.g. a deleted container's."""
+        keys = set(keys)
+        self.plan.forget(keys)
+        self.active = {state_key: tracker for state_key, tracker in self.active.items() if state_key[2] not in keys}
+
+    def export_trackers(self):
+        """The pending and firing thresholds as JSON-ready `[rule name, host, metric, labels, state]` lists."""
+        return [[self.plan.rules[index].name, host, key[0], dict(key[1]), tracker.export()]
+                for (index, host, key), tracker in self.active.items()]
+
+    def restore_trackers(self, exported):
+        """Reinstate thresholds from export_trackers(); those of rules no longer loaded are dropped."""
+        indexes = {rule.name: index for index, rule in enumerate(self.plan.rules)}
+        for name, host, metric, labels, state in exported:
+            index = indexes.get(name)
+            if index is None:
+                continue
+            rule = self.plan.rules[index]
+            tracker = SustainedThreshold(rule.threshold, rule.duration, rule.clear_threshold, rule.op)
+            tracker.restore(state)
+            self.active[(index, host, (metric, tuple(sorted(labels.items()))))] = tracker
+
+    def states(self, host=None):
+        """Return `{alert name: state}` for every rule that is currently pending or firing."""
+        return {
+            alert_name(self.plan.rules[index], key): tracker.state
+            for (index, tracker_host, key), tracker in self.active.items() if tracker_host == host
+        }
+
+
+def alert_names(rules, key):
+    """Names of the alerts the rules matching a series raise for it."""
+    metric, labels = key
+    labels = dict(labels)
+    return [alert_name(rule, key) for rule in rules
+            if rule.metric == metric and all(labels.get(label) == value for label, value in rule.labels.items())]
+
+
+def alert_name(rule, key):
+    """Name an alert after its rule plus any series labels the rule did not pin down."""
+    extra = [str(value) for label, value in key[1] if label not in rule.labels]
+    if not extra:
+        return rule.name
+    return f"{rule.name} {' '.join(extra)}"
@@ -0,0 +1,82 @@
+NGRAM = 3
+
+
+class SearchIndex:
+    """Case-insensitive substring search over a fixed list of names.
+
+    Names are lowercased once and every trigram maps to the names containing it, so a query only
+    checks the names sharing all of its trigrams. Shorter queries narrow the previous result when the
+    user is typing forward, and scan the lowercased cache otherwise.
+    """
+
+    def __init__(self, items=()):
+        self.items = list(dict.fromkeys(items))  # unique, in scan order
+        self.lowered = [item.lower() for item in self.items]
+        self.postings = {}
+        for index, text in enumerate(self.lowered):
+            for gram in {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}:
+                self.postings.setdefault(gram, []).append(index)
+        self.last_query = ''
+        self.last_result = list(range(len(self.items)))
+
+    def search(self, query):
+        """Return the indexes of the matching items in their original order."""
+        query = query.lower()
+        if not query:
+            result = list(range(len(self.items)))
+        elif len(query) == NGRAM:
+            result = list(self.postings.get(query, ()))  # postings are already in item order
+        elif len(query) > NGRAM:
+            grams = {query[i:i + NGRAM] for i in range(len(query) - NGRAM + 1)}
+            postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    break
+            lowered = self.lowered
+            result = sorted(index for index in candidates if query in lowered[index])
+        else:
+            lowered = self.lowered
+            candidates = self.last_result if self.last_query and self.last_query in query else range(len(lowered))
+            result = [index for index in candidates if query in lowered[index]]
+        self.last_query = query
+        self.last_result = result
+        return result
+
+
+def sync_listbox(listbox, items, shown, wanted):
+    """Update a Listbox showing `items[i] for i in shown` to show `wanted` with as few edits as possible.
+
+    Both index lists must be sorted. Runs of removed rows are deleted and runs of new rows inserted in
+    single calls, and rows that stay keep their selection.
+    """
+    keep = set(wanted)
+
+    # delete from the bottom up so earlier positions stay valid
+    position = len(shown) - 1
+    while position >= 0:
+        if shown[position] in keep:
+            position -= 1
+            continue
+        end = position
+        while position >= 0 and shown[position] not in keep:
+            position -= 1
+        listbox.delete(position + 1, end)
+
+    kept = [index for index in shown if index in keep]
+    position = 0
+    run = []
+    for index in wanted:
+        if position < len(kept) and kept[position] == index:
+            if run:
+                listbox.insert(position, *[items[i] for i in run])
+                kept[position:position] = run
+                position += len(run)
+                run = []
+            position += 1
+        else:
+            run.append(index)
+    if run:
+        listbox.insert(position, *[items[i] for i in run])
+    return list(wanted)
@@ -0,0 +1,317 @@
+"""Simulated host and virtual clock for running the real monitor against synthetic or recorded traces.
+
+    clock = VirtualClock(start=time.time())
+    host = SimulatedProvider(clock, processes=5000, cpu=with_noise(sine(40, 30, 86400), 5),
+                             service_outages={'Spooler': flap(every=3600, down_for=60, until=30 * 86400)})
+    monitor = MonitorCore(provider=host, clock=clock)
+    emails = record_emails(monitor)
+    simulate(monitor, 30 * 86400)  # a month of monitoring in seconds
+"""
+import contextlib
+import csv
+import importlib.util
+import math
+import unittest
+from bisect import bisect_right
+from collections import namedtuple
+
+from app.core import CHECK_INTERVAL
+
+HAS_FLASK = importlib.util.find_spec('flask') is not None  # the web server is optional
+requires_flask = unittest.skipUnless(HAS_FLASK, "Flask is not installed")
+
+DiskPartition = namedtuple('DiskPartition', ['device', 'mountpoint', 'fstype', 'opts'])
+DiskUsage = namedtuple('DiskUsage', ['total', 'used', 'free', 'percent'])
+VirtualMemory = namedtuple('VirtualMemory', ['total', 'available', 'percent', 'used', 'free'])
+NetIO = namedtuple('NetIO', ['bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv', 'errin', 'errout', 'dropin',
+                             'dropout'])
+MemoryInfo = namedtuple('MemoryInfo', ['rss', 'vms'])
+IOCounters = namedtuple('IOCounters', ['read_count', 'write_count', 'read_bytes', 'write_bytes'])
+DiskIO = namedtuple('DiskIO', ['read_count', 'write_count', 'read_bytes', 'write_bytes', 'read_time', 'write_time',
+                               'busy_time'])
+
+DISK_SIZE = 500 * 1024 ** 3
+MEMORY_SIZE = 16 * 1024 ** 3
+
+
+class VirtualClock:
+    """Clock that only moves when told to, so days of monitoring run in seconds."""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def wait(self, token, seconds):
+        self.now += seconds
+        return token.cancelled
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+# Traces are functions of the seconds elapsed since the simulation started.
+
+def constant(value):
+    return lambda t: value
+
+
+def sine(mean, amplitude, period, phase=0):
+    return lambda t: mean + amplitude * math.sin(2 * math.pi * (t + phase) / period)
+
+
+def ramp(start, end, duration):
+    """Linear change from `start` to `end` over `duration` seconds, then hold (e.g. a disk filling up)."""
+    return lambda t: start + (end - start) * min(1.0, max(0.0, t / duration))
+
+
+def spikes(base, peak, every, length):
+    """`base` with a spike to `peak` lasting `length` seconds every `every` seconds."""
+    return lambda t: peak if t % every < length else base
+
+
+def steps(points):
+    """Replay recorded `(t, value)` points, holding each value until the next one."""
+    points = sorted(points)
+    times = [t for t, _ in points]
+    values = [value for _, value in points]
+
+    def trace(t):
+        return values[max(0, bisect_right(times, t) - 1)]
+    return trace
+
+
+def with_noise(trace, amplitude, seed=1):
+    """Add deterministic noise in [-amplitude, amplitude] that only depends on the (whole second) time."""
+    def noisy(t):
+        bucket = (int(t) * 2654435761 + seed * 40503) % 4294967296
+        return trace(t) + amplitude * (2 * bucket / 4294967296 - 1)
+    return noisy
+
+
+def load_trace_csv(file_name):
+    """Read a recorded trace; the first column is seconds since start, every other column becomes a trace."""
+    with open(file_name, newline='') as trace_file:
+        reader = csv.reader(trace_file)
+        header = next(reader)
+        rows = [[float(cell) for cell in row] for row in reader if row]
+    return {name: steps([(row[0], row[i]) for row in rows]) for i, name in enumerate(header) if i > 0}
+
+
+def flap(every, down_for, until, start=0):
+    """Outage windows of `down_for` seconds every `every` seconds, for service_outages/process_outages."""
+    return [(t, t + down_for) for t in range(int(start), int(until), int(every))]
+
+
+def _clamp(value):
+    return min(100.0, max(0.0, value))
+
+
+def _in_outage(windows, t):
+    return any(start <= t < end for start, end in windows)
+
+
+class SimulatedService:
+    def __init__(self, host, name):
+        self.host = host
+        self._name = name
+
+    def name(self):
+        return self._name
+
+    def status(self):
+        return 'stopped' if self.host.service_is_down(self._name) else 'running'
+
+
+class SimulatedProcess:
+    """Process with the psutil.Process methods the monitor reads; does steady I/O while the host runs."""
+
+    def __init__(self, host, pid, name, seed):
+        bucket = (seed * 2654435761) % 4294967296 / 4294967296
+        self.host = host
+        self.pid = pid
+        self.info = {'name': name, 'cpu_percent': bucket * 5, 'memory_percent': bucket * 2}
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def cpu_percent(self, interval=None):
+        return self.info['cpu_percent']
+
+    def memory_info(self):
+        rss = int(MEMORY_SIZE * self.info['memory_percent'] / 100)
+        return MemoryInfo(rss, rss * 2)
+
+    def num_threads(self):
+        return 4
+
+    def num_fds(self):
+        return 16
+
+    num_handles = num_fds
+
+    def io_counters(self):
+        elapsed = int(self.host.elapsed())
+        return IOCounters(elapsed, elapsed, elapsed * 4096, elapsed * 1024)
+
+
+class SimulatedProvider:
+    """Synthetic host behind the PsutilProvider interface.
+
+    cpu, ram and disk are traces; disk may also be `{mountpoint: trace}`. Every one of the `cores` follows
+    the cpu trace unless `core_cpu` maps its index to a trace of its own. `process_churn` short lived
+    worker processes are replaced every `churn_interval` seconds. Outages map a service or process name
+    to `(start, end)` windows in seconds since the start during which it is stopped.
+    """
+
+    def __init__(self, clock, processes=100, services=10, mounts=2, cpu=None, ram=None, disk=None,
+                 process_churn=0, churn_interval=60, service_outages=None, process_outages=None,
+                 network_rate=125000, seed=1, cores=4, core_cpu=None, disk_io_rate=4 * 1024 ** 2):
+        self.clock = clock
+        self.start = clock.time()
+        self.cpu = cpu or with_noise(sine(30, 15, 86400), 5, seed)
+        self.ram = ram or constant(40.0)
+        self.partitions = [DiskPartition(f"/dev/sd{chr(97 + i % 26)}{i // 26 + 1}", f"/mnt/disk{i}", 'ext4', 'rw')
+                           for i in range(mounts)]
+        if isinstance(disk, dict):
+            self.disk = disk
+        else:
+            self.disk = {partition.mountpoint: disk or constant(40.0) for partition in self.partitions}
+        self.process_churn = process_churn
+        self.churn_interval = churn_interval
+        self.service_outages = service_outages or {}
+        self.process_outages = process_outages or {}
+        self.restarted = {}  # service name -> time of the last restart, ends the outage it happened in
+        self.network_rate = network_rate
+        self.cores = cores
+        self.core_cpu = core_cpu or {}
+        self.disk_io_rate = disk_io_rate
+
+        self.processes = [self._process(1000 + i, f"proc{i}.exe", seed + i) for i in range(processes)]
+        self.services = {f"Service{i}": SimulatedService(self, f"Service{i}") for i in range(services)}
+        for name in self.service_outages:
+            self.services.setdefault(name, SimulatedService(self, name))
+        self._churn_bucket = None
+        self._churned = []
+
+    def _process(self, pid, name, seed):
+        return SimulatedProcess(self, pid, name, seed)
+
+    def elapsed(self):
+        return self.clock.time() - self.start
+
+    def service_is_down(self, name):
+        t = self.elapsed()
+        for start, end in self.service_outages.get(name, ()):
+            if start <= t < end:
+                restarted = self.restarted.get(name)
+                return restarted is None or not start <= restarted < end
+        return False
+
+    def cpu_percent(self, interval=None, percpu=False):
+        t = self.elapsed()
+        if percpu:
+            return [round(_clamp(self.core_cpu.get(core, self.cpu)(t)), 1) for core in range(self.cores)]
+        return round(_clamp(self.cpu(t)), 1)
+
+    def virtual_memory(self):
+        percent = round(_clamp(self.ram(self.elapsed())), 1)
+        used = int(MEMORY_SIZE * percent / 100)
+        return VirtualMemory(MEMORY_SIZE, MEMORY_SIZE - used, percent, used, MEMORY_SIZE - used)
+
+    def disk_partitions(self):
+        return list(self.partitions)
+
+    def disk_usage(self, path):
+        percent = round(_clamp(self.disk[path](self.elapsed())), 1)
+        used = int(DISK_SIZE * percent / 100)
+        return DiskUsage(DISK_SIZE, used, DISK_SIZE - used, percent)
+
+    def disk_io_counters(self, perdisk=False):
+        # every device reads at disk_io_rate, writes at half of it in 4 KB operations and is busy a quarter of the time
+        t = self.elapsed()
+        read = int(self.disk_io_rate * t)
+        counters = DiskIO(read // 4096, read // 8192, read, read // 2, int(t * 200), int(t * 50), int(t * 250))
+        devices = [partition.device.rsplit('/', 1)[-1] for partition in self.partitions]
+        if perdisk:
+            return {device: counters for device in devices}
+        return DiskIO(*(value * len(devices) for value in counters))
+
+    def process_iter(self, attrs=None):
+        t = self.elapsed()
+        processes = self.processes
+        if self.process_churn:
+            bucket = int(t // self.churn_interval)
+            if bucket != self._churn_bucket:
+                self._churn_bucket = bucket
+                self._churned = [self._process(100000 + bucket * self.process_churn + i, f"worker{bucket}_{i}.exe", i)
+                                 for i in range(self.process_churn)]
+            processes = processes + self._churned
+        if self.process_outages:
+            down = {name for name, windows in self.process_outages.items() if _in_outage(windows, t)}
+            if down:
+                processes = [proc for proc in processes if proc.info['name'] not in down]
+        return iter(processes)
+
+    def pids(self):
+        return [proc.pid for proc in self.process_iter()]
+
+    def win_service_get(self, name):
+        try:
+            return self.services[name]
+        except KeyError:
+            raise LookupError(f"Service {name} not found") from None
+
+    def win_service_iter(self):
+        return iter(self.services.values())
+
+    def boot_time(self):
+        return self.start - 3600
+
+    def net_io_counters(self, pernic=False):
+        sent = int(self.network_rate * self.elapsed())
+        counters = NetIO(sent, sent * 2, sent // 1500, sent * 2 // 1500, 0, 0, 0, 0)
+        if pernic:
+            return {'eth0': counters, 'lo': NetIO(0, 0, 0, 0, 0, 0, 0, 0)}
+        return counters
+
+    def getloadavg(self):
+        load = self.cpu_percent() / 25
+        return load, load, load
+
+    def start_service(self, name):
+        self.restart_service(name)
+
+    def stop_service(self, name):
+        self.service_outages.setdefault(name, []).append((self.elapsed(), float('inf')))
+
+    def restart_service(self, name):
+        self.win_service_get(name)
+        self.restarted[name] = self.elapsed()
+
+
+def record_emails(monitor):
+    """Capture the monitor's outgoing emails as `(time, subject, html body)` instead of sending them."""
+    sent = []
+
+    def send_message(msg, email_from, email_to_list):
+        sent.append((monitor.clock.time(), msg['Subject'], msg.get_payload()[-1].get_payload(decode=True).decode()))
+    monitor.send_message = send_message
+    return sent
+
+
+def simulate(monitor, seconds, interval=CHECK_INTERVAL):
+    """Run the monitor's checks every `interval` seconds of virtual time for `seconds`; returns the tick count."""
+    clock = monitor.clock
+    end = clock.time() + seconds
+    ticks = 0
+    while clock.time() < end:
+        monitor.run_checks()
+        monitor.notifier.flush()  # deliver this tick's alerts before virtual time moves on
+        clock.advance(interval)
+        ticks += 1
+    return ticks
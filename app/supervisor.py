@@ -0,0 +1,161 @@
+import threading
+import time
+
+RESTART_DELAYS = (1, 2, 5, 10, 30, 60)  # seconds before each successive restart of a crashed worker
+STABLE_RUN = 300  # seconds a worker has to run before its restart delays start over
+SHUTDOWN_TIMEOUT = 5  # seconds shutdown() waits for all workers together
+
+
+class CancelToken:
+    """Tells a worker to stop; workers wait through it so a cancel ends their sleep at once."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.callbacks = []
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+    def wait(self, seconds):
+        """Sleep up to `seconds`; returns True if the worker was cancelled meanwhile."""
+        return self.event.wait(seconds)
+
+    def on_cancel(self, callback):
+        """Run `callback` when cancelled, e.g. to unblock a call the worker cannot time out (tray icon loop)."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        with self.lock:
+            if self.event.is_set():
+                return
+            self.event.set()
+            callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Failed to stop worker: {e}")
+
+
+class Worker:
+    """A supervised thread running `target(token, *args)`, restarted with growing delays if it raises."""
+
+    def __init__(self, name, target, args=(), restart=True, restart_delays=RESTART_DELAYS, instrumentation=None):
+        self.name = name
+        self.target = target
+        self.args = args
+        self.restart = restart
+        self.restart_delays = restart_delays
+        self.instrumentation = instrumentation
+        self.token = CancelToken()
+        self.state = 'starting'
+        self.restarts = 0
+        self.last_error = None
+        self.started = None
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def _run(self):
+        failures = 0
+        while not self.token.cancelled:
+            self.state = 'running'
+            self.started = time.monotonic()
+            try:
+                self.target(self.token, *self.args)
+                break  # returning means the work is done, or it noticed the cancel
+            except Exception as e:
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Worker {self.name} crashed: {self.last_error}")
+                if self.instrumentation is not None:
+                    self.instrumentation.increment('worker_crashes')
+            if self.token.cancelled:
+                break
+            if not self.restart:
+                self.state = 'failed'
+                return
+            if time.monotonic() - self.started > STABLE_RUN:
+                failures = 0
+            delay = self.restart_delays[min(failures, len(self.restart_delays) - 1)]
+            failures += 1
+            self.state = 'restarting'
+            if self.token.wait(delay):
+                break
+            self.restarts += 1
+        self.state = 'stopped'
+
+    @property
+    def alive(self):
+        return self.thread.is_alive()
+
+    def describe(self):
+        return {
+            'name': self.name,
+            'state': self.state,
+            'alive': self.alive,
+            'restarts': self.restarts,
+            'uptime_s': round(time.monotonic() - self.started, 1) if self.started is not None and self.alive else 0.0,
+            'last_error': self.last_error,
+        }
+
+
+class Supervisor:
+    """Owns every long-running thread of the app: starts them by name, restarts crashed ones and stops
+    them all within a bounded time.
+
+    Starting a worker under a name that is already running stops the old one first, so restarting the
+    web server after a settings change replaces it instead of adding another.
+    """
+
+    def __init__(self, instrumentation=None, restart_delays=RESTART_DELAYS):
+        self.instrumentation = instrumentation
+        self.restart_delays = restart_delays
+        self.workers = {}
+        self.lock = threading.Lock()
+
+    def start(self, name, target, *args, restart=True, timeout=SHUTDOWN_TIMEOUT):
+        """Run `target(token, *args)` in a supervised thread; `restart=False` for one-off jobs."""
+        self.stop(name, timeout)
+        worker = Worker(name, target, args, restart, self.restart_delays, self.instrumentation)
+        with self.lock:
+            # drop workers that finished on their own, the inventory only keeps the live ones and failures
+            self.workers = {key: value for key, value in self.workers.items() if value.alive or value.state == 'failed'}
+            self.workers[name] = worker
+        worker.thread.start()
+        return worker
+
+    def cancel(self, name):
+        worker = self.workers.get(name)
+        if worker is not None:
+            worker.token.cancel()
+        return worker
+
+    def stop(self, name, timeout=SHUTDOWN_TIMEOUT):
+        """Cancel a worker and wait up to `timeout` seconds for it; returns False if it is still running."""
+        worker = self.cancel(name)
+        if worker is None or not worker.alive:
+            return True
+        if worker.thread is not threading.current_thread():
+            worker.thread.join(timeout)
+        return not worker.alive
+
+    def shutdown(self, timeout=SHUTDOWN_TIMEOUT):
+        """Cancel every worker, then wait for them sharing one `timeout`; returns the names still running."""
+        with self.lock:
+            workers = list(self.workers.values())
+        for worker in workers:
+            worker.token.cancel()
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            if worker.thread is not threading.current_thread():
+                worker.thread.join(max(0.0, deadline - time.monotonic()))
+        return [worker.name for worker in workers if worker.alive]
+
+    def inventory(self):
+        with self.lock:
+            workers = list(self.workers.values())
+        return [worker.describe() for worker in workers]
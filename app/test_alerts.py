@@ -0,0 +1,48 @@
+import unittest
+from app.alerts import TEMPLATES, Markup, Template, format_labels, format_reading
+
+CONTEXT = {
+    'timestamp': '2024-01-01 00:00:00', 'uptime': '01:00:00', 'cpu': 12.5, 'ram': 40.0,
+    'ram_total_mb': 16384, 'ram_available_mb': 9830, 'disks': ['C:: 40.0% used, Free: 1024 MB'],
+    'network': 'Sent: 0 bytes, Received: 0 bytes', 'process_count': 3, 'load_avg': '1.0, 1.0, 1.0',
+    'top_cpu': ['python.exe: 5.0% CPU'], 'top_ram': ['python.exe: 2.00% RAM'],
+}
+
+
+class TestAlertTemplates(unittest.TestCase):
+
+    def test_template_escaping(self):
+        """Test that values are escaped in HTML while markup and lists are rendered per variant."""
+        source = "<p>{name}</p>{body}<ul>{items}</ul> {value:.1f}"
+        context = {'name': '<b>', 'body': Markup('<p>a &amp; b</p>'), 'items': ['x<y'], 'value': 2.25}
+        self.assertEqual(Template(source, html=True).render(context),
+                         "<p>&lt;b&gt;</p><p>a &amp; b</p><ul><li>x&lt;y</li></ul> 2.2")
+        self.assertEqual(Template(source).render(context), "<p><b></p>a & b<ul>\n  - x<y</ul> 2.2")
+
+    def test_status_change_keeps_caller_body(self):
+        """Test that the status change alert includes the caller's message in both variants."""
+        rendered = TEMPLATES['status_change'].render(dict(
+            CONTEXT, subject="Service Stopped", name="Spooler", status="Stopped", previous_status="Running",
+            description="N/A", kind="service", message=Markup("<p>The service <strong>Spooler</strong> stopped.</p>")))
+        self.assertEqual(rendered.subject, "Service Stopped: Spooler")
+        self.assertIn("<p>The service <strong>Spooler</strong> stopped.</p>", rendered.html)
+        self.assertIn("The service Spooler stopped.", rendered.text)
+        self.assertIn("<li>python.exe: 5.0% CPU</li>", rendered.html)
+        self.assertNotIn("<", rendered.text)
+
+    def test_rule_alert_has_no_units(self):
+        """Test the generic rule alert shows the comparison, the labels and the value as the rule saw it."""
+        self.assertEqual((format_reading(0), format_reading(2500000.0), format_reading(0.4)), ("0", "2,500,000", "0.4"))
+        self.assertEqual((format_labels((('probe', 'api'),)), format_labels(())), ("probe=api", "none"))
+        rendered = TEMPLATES['rule_alert'].render(dict(
+            CONTEXT, name="API down", rule="API down", metric='probe_up', labels="probe=api",
+            condition="probe_up < 1", value="0", severity='critical'))
+        self.assertEqual(rendered.subject, "Alert: API down")
+        self.assertIn("Condition: probe_up < 1", rendered.text)
+        self.assertIn("Current Value: 0\n", rendered.text)
+        self.assertNotIn("Exceeded", rendered.text)
+        self.assertIn("<li><strong>Labels:</strong> probe=api</li>", rendered.html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import os
+import random
+import tempfile
+import time
+import unittest
+from app.baselines import AnomalyDetector, Baseline, BASELINE_HALF_LIFE
+from app.rules import AlertRule, series_key
+from app.thresholds import FIRING
+
+HOUR = 3600
+
+
+class TestBaselines(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(7)
+
+    def feed(self, detector, values, start, interval=60):
+        """Feed `{series key: value function of t}` for a number of samples; returns the alerts of the last one."""
+        alerts = []
+        for sample in range(values.pop('samples')):
+            t = start + sample * interval
+            alerts = detector.evaluate({key: value(t) for key, value in values.items()}, now=t)
+        return alerts
+
+    def test_baseline_tracks_mean_and_deviation(self):
+        """Test the weighted mean and variance settle on the series' own level and spread."""
+        baseline = Baseline()
+        for sample in range(5000):
+            baseline.update(self.random.gauss(50, 5), sample * 5, BASELINE_HALF_LIFE)
+        self.assertAlmostEqual(baseline.mean, 50, delta=1)
+        self.assertAlmostEqual(baseline.variance ** 0.5, 5, delta=1)
+
+    def test_deviation_is_judged_per_series(self):
+        """Test one rule flags a jump on a quiet series but not the same value on a busy one."""
+        detector = AnomalyDetector()
+        detector.load([AlertRule("Latency", 'latency', 4, anomaly=True),
+                       AlertRule("Latency Drop", 'latency', 4, op='<', anomaly=True)])
+        quiet = series_key('latency', host='quiet')
+        busy = series_key('latency', host='busy')
+        self.feed(detector, {'samples': 500, quiet: lambda t: self.random.gauss(10, 1),
+                             busy: lambda t: self.random.gauss(100, 10)}, start=0)
+
+        alerts = detector.evaluate({quiet: 25, busy: 110}, now=500 * 60)
+        self.assertEqual([(alert.name, alert.state) for alert in alerts], [("Latency quiet", FIRING)])
+        self.assertAlmostEqual(alerts[0].threshold, 14, delta=1.5)
+        alerts = detector.evaluate({quiet: 10, busy: 30}, now=501 * 60)
+        self.assertEqual([alert.name for alert in alerts], ["Latency Drop busy"])
+        self.assertEqual(detector.evaluate({series_key('cpu'): 99}, now=502 * 60), [])
+        self.assertFalse(detector.has_metric('cpu'))
+
+    def test_seasonal_profile(self):
+        """Test a daily busy hour is only normal per hour of the day, which also catches a quiet hour running hot."""
+        detector = AnomalyDetector()
+        detector.load([AlertRule("Seasonal", 'load', 4, anomaly=True, seasonal=True),
+                       AlertRule("Flat", 'load', 4, anomaly=True)])
+        key = series_key('load')
+        start = 1700000000 - 1700000000 % (24 * HOUR)
+        busy_hour = time.localtime(start).tm_hour
+
+        def load(t):
+            return self.random.gauss(80 if time.localtime(t).tm_hour == busy_hour else 10, 2)
+
+        self.feed(detector, {'samples': 3 * 24 * 60, key: load}, start=start)
+        day = start + 3 * 24 * HOUR
+        alerts = detector.evaluate({key: 80}, now=day)
+        self.assertEqual([alert.name for alert in alerts], ["Flat"])
+
+        # the busy hour widens the overall spread, hiding this from the flat rule
+        self.feed(detector, {'samples': 2 * 60 - 1, key: load}, start=day + 60)
+        alerts = detector.evaluate({key: 40}, now=day + 2 * HOUR)
+        self.assertEqual([alert.name for alert in alerts], ["Seasonal"])
+
+    def test_baselines_survive_a_restart(self):
+        """Test saved baselines are restored and a damaged file is ignored."""
+        detector = AnomalyDetector()
+        detector.load([AlertRule("Latency", 'latency', 3, anomaly=True, seasonal=True)])
+        key = series_key('latency', host='a')
+        self.feed(detector, {'samples': 100, key: lambda t: self.random.gauss(10, 1)}, start=0)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'baselines.json')
+            detector.save(file_name)
+            restored = AnomalyDetector()
+            restored.restore(file_name)
+            self.assertEqual(restored.baselines[key].expected(), detector.baselines[key].expected())
+            self.assertEqual(restored.baselines[key].hours[0].to_list(), detector.baselines[key].hours[0].to_list())
+
+            with open(file_name, 'w') as damaged:
+                damaged.write("{")
+            restored.restore(file_name)
+            self.assertIn(key, restored.baselines)
+
+
+if __name__ == '__main__':
+    unittest.main()
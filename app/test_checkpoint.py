@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.checkpoint import read_checkpoint, write_checkpoint
+from app.history import HistoryStore
+from app.rules import AlertRule, RuleEngine, series_key
+from app.thresholds import PENDING, FIRING
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.directory.name, 'checkpoint.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_history_round_trip(self):
+        history = HistoryStore(capacity=10, rollups=((60, 5), (600, 3)))
+        cpu = series_key('cpu')
+        disk = series_key('disk', device='C:')
+        # wraps the raw ring and the minute rollup
+        for i in range(100):
+            history.append(cpu, 1000 + i * 7, float(i))
+        history.append(disk, 1000, 55.5)
+        write_checkpoint(self.file_name, {'services': {'Spooler': "Running"}}, history, 1700.0)
+
+        restored = HistoryStore(capacity=10, rollups=((60, 5), (600, 3)))
+        self.assertEqual(read_checkpoint(self.file_name, restored), (1700.0, {'services': {'Spooler': "Running"}}))
+        self.assertEqual(restored.samples(cpu), history.samples(cpu))
+        self.assertEqual(restored.samples(disk), [(1000, 55.5)])
+        for start, step in ((0, 60), (0, 600), (1500, 60)):
+            self.assertEqual(list(restored.query(cpu, start, 2000, step)[1]),
+                             list(history.query(cpu, start, 2000, step)[1]))
+
+        # both carry on alike
+        history.append(cpu, 1700, 1.0)
+        restored.append(cpu, 1700, 1.0)
+        self.assertEqual(list(restored.query(cpu, 0, 2000, 600)[1]), list(history.query(cpu, 0, 2000, 600)[1]))
+
+    def test_damaged_or_missing_checkpoint_is_ignored(self):
+        history = HistoryStore()
+        self.assertIsNone(read_checkpoint(self.file_name, history))
+        history.append(series_key('cpu'), 1000, 10.0)
+        write_checkpoint(self.file_name, {}, history, 1000.0)
+        with open(self.file_name, 'rb') as checkpoint_file:
+            data = checkpoint_file.read()
+        with open(self.file_name, 'wb') as checkpoint_file:
+            checkpoint_file.write(data[:-10])
+
+        restored = HistoryStore()
+        with mock.patch('builtins.print') as printed:
+            self.assertIsNone(read_checkpoint(self.file_name, restored))
+        self.assertIn("damaged", printed.call_args[0][0])
+        self.assertEqual(restored.keys(), [])
+
+    def test_rule_trackers_carry_over(self):
+        rules = [AlertRule("CPU Usage", 'cpu', 80, duration=60), AlertRule("Disk", 'disk', 90)]
+        engine = RuleEngine(rules)
+        engine.evaluate({series_key('cpu'): 95, series_key('disk', device='C:'): 99}, now=1000)
+        self.assertEqual(engine.states(), {"CPU Usage": PENDING, "Disk C:": FIRING})
+
+        restored = RuleEngine(rules[:1])
+        restored.restore_trackers(engine.export_trackers())
+        self.assertEqual(restored.states(), {"CPU Usage": PENDING})
+        # the breach started before the restart, so it fires when the duration is up
+        alert, = restored.evaluate({series_key('cpu'): 96}, now=1060)
+        self.assertEqual(alert.state, FIRING)
+
+
+if __name__ == '__main__':
+    unittest.main()
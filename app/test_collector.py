@@ -0,0 +1,87 @@
+import os
+import signal
+import time
+import unittest
+from unittest import mock
+from app.collector import Collector, SharedRing, labelled_values
+from app.rules import series_key
+from app.supervisor import RESTART_DELAYS, STABLE_RUN
+
+CPU = series_key('cpu')
+RX = series_key('net_rx_bytes', nic='eth0')
+
+
+class TestSharedRing(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = SharedRing.create([CPU, RX], capacity=4)
+        self.reader = SharedRing.attach(self.ring.shm.name, [CPU, RX])
+
+    def tearDown(self):
+        self.reader.close()
+        self.ring.close()
+        self.ring.shm.unlink()
+
+    def test_write_and_read(self):
+        """Test samples written by one handle are read back through another, oldest overwritten first."""
+        self.assertIsNone(self.reader.read())
+        for t in range(6):
+            self.ring.write(t, {CPU: t * 10, RX: 100})
+        self.ring.write(6, {CPU: 60})
+        self.assertEqual(self.reader.read(), (6, {CPU: 60}))
+        self.assertEqual(self.reader.read(keys=[RX]), (6, {}))
+        self.assertEqual(self.reader.samples(CPU), [(3, 30), (4, 40), (5, 50), (6, 60)])
+        self.assertEqual(self.reader.samples(RX, count=2), [(5, 100)])
+        self.assertIsNone(self.reader.read(sequence=2))
+
+    def test_labelled_values(self):
+        """Test regrouping collected series by label for display."""
+        self.assertEqual(labelled_values({CPU: 1, RX: 2}, 'nic'), {'eth0': {'net_rx_bytes': 2}})
+
+
+class TestCollectorProcess(unittest.TestCase):
+
+    def test_worker_is_restarted(self):
+        """Test the worker writes samples and is restarted after it is killed."""
+        collector = Collector([CPU, series_key('ram')], [], interval=0.1)
+        try:
+            collector.supervise()
+            deadline = time.time() + 10
+            while collector.latest() is None and time.time() < deadline:
+                time.sleep(0.05)
+            self.assertIn(CPU, collector.latest())
+
+            pid = collector.process.pid
+            os.kill(pid, signal.SIGTERM)
+            collector.process.join(5)
+            collector.supervise()  # notices the exit and schedules a restart
+            self.assertEqual(collector.restarts, 1)
+            collector.next_start = 0
+            collector.supervise()
+            self.assertNotEqual(collector.process.pid, pid)
+            self.assertTrue(collector.process.is_alive())
+        finally:
+            collector.stop()
+
+    def test_restart_delays_start_over_after_stable_run(self):
+        """Test crashes back off up to the longest delay, and a worker that ran for STABLE_RUN starts over."""
+        collector = Collector([CPU], [], interval=0.1)
+        crashed = mock.Mock(exitcode=1)
+        crashed.is_alive.return_value = False
+        delays = []
+        try:
+            with mock.patch.object(collector, 'start'), mock.patch('builtins.print'):
+                for uptime in [1] * (len(RESTART_DELAYS) + 2) + [STABLE_RUN + 1, 1]:
+                    collector.process = crashed
+                    collector.started = time.time() - uptime
+                    before = time.time()
+                    collector.supervise()
+                    delays.append(round(collector.next_start - before))
+        finally:
+            collector.stop()
+        self.assertEqual(delays, list(RESTART_DELAYS) + [RESTART_DELAYS[-1]] * 2 + list(RESTART_DELAYS[:2]))
+        self.assertEqual(collector.restarts, len(RESTART_DELAYS) + 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from app.config import load_config, save_config, load_state, save_state, ConfigWatcher
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config_file = os.path.join(self.directory.name, 'config.ini')
+        self.state_file = os.path.join(self.directory.name, 'state.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_config_is_atomic(self):
+        """Test that saving replaces the file and leaves no temp files behind."""
+        config = load_config(self.config_file)
+        config['HARDWARE'] = {'CPU_Threshold': '75'}
+        save_config(config, self.config_file)
+        self.assertEqual(os.listdir(self.directory.name), ['config.ini'])
+        self.assertEqual(load_config(self.config_file).getint('HARDWARE', 'CPU_Threshold'), 75)
+
+    def test_state_round_trip(self):
+        """Test runtime state is stored separately and survives corrupt files."""
+        self.assertEqual(load_state(self.state_file), {})
+        save_state({'LastReportTime': 123.5}, self.state_file)
+        self.assertEqual(load_state(self.state_file), {'LastReportTime': 123.5})
+        with open(self.state_file, 'w') as state_file:
+            state_file.write('{broken')
+        self.assertEqual(load_state(self.state_file), {})
+
+    def test_watcher_detects_changes(self):
+        """Test the watcher ignores our own writes and reports external edits."""
+        config = load_config(self.config_file)
+        config['HARDWARE'] = {'CPU_Threshold': '75'}
+        save_config(config, self.config_file)
+        watcher = ConfigWatcher(self.config_file)
+        self.assertFalse(watcher.changed())
+
+        with open(self.config_file, 'a') as config_file:
+            config_file.write('RAM_Threshold = 60\n')
+        self.assertTrue(watcher.changed())
+        self.assertFalse(watcher.changed())
+
+        save_config(config, self.config_file)
+        watcher.mark_written()
+        self.assertFalse(watcher.changed())
+
+
+if __name__ == '__main__':
+    unittest.main()
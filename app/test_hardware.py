@@ -0,0 +1,51 @@
+import unittest
+from collections import namedtuple
+from app.hardware import CoreUsage, DiskIORates
+from app.rules import AlertRule, RuleEngine, series_key
+from app.simulation import DiskIO
+
+WindowsDiskIO = namedtuple('WindowsDiskIO', ['read_count', 'write_count', 'read_bytes', 'write_bytes', 'read_time',
+                                             'write_time'])
+
+
+def reading(read_bytes, busy_ms=0, write_bytes=0):
+    return DiskIO(read_bytes // 4096, write_bytes // 4096, read_bytes, write_bytes, 0, 0, busy_ms)
+
+
+class TestHardware(unittest.TestCase):
+
+    def test_core_usage_is_alertable(self):
+        """Test that one pegged core fires a per-core rule although the average stays low."""
+        engine = RuleEngine([AlertRule("Core pegged", 'cpu_core', 95)])
+        snapshot = CoreUsage().update([3.0, 100.0, 2.0, 5.0])
+        self.assertEqual(snapshot[series_key('cpu_core', core='1')], 100.0)
+        alerts = engine.evaluate(snapshot, now=0)
+        self.assertEqual([(alert.name, alert.series) for alert in alerts],
+                         [("Core pegged 1", series_key('cpu_core', core='1'))])
+
+    def test_disk_io_rates(self):
+        """Test throughput, IOPS and busy percentage per device from two readings, skipping loop devices."""
+        rates = DiskIORates()
+        self.assertEqual(rates.update({'sda': reading(0), 'loop0': reading(0)}, now=0), {})
+        snapshot = rates.update({'sda': reading(40960, busy_ms=2500, write_bytes=8192), 'loop0': reading(99)}, now=5)
+        self.assertEqual(snapshot[series_key('disk_read_bytes', device='sda')], 8192)
+        self.assertEqual(snapshot[series_key('disk_write_bytes', device='sda')], 8192 / 5)
+        self.assertEqual(snapshot[series_key('disk_read_iops', device='sda')], 2)
+        self.assertEqual(snapshot[series_key('disk_busy', device='sda')], 50)
+        self.assertEqual(list(rates.rates), ['sda'])
+
+    def test_devices_appearing_and_busy_fallback(self):
+        """Test a new device waits for its second reading and busy time falls back to read plus write time."""
+        rates = DiskIORates()
+        rates.update({'PhysicalDrive0': WindowsDiskIO(0, 0, 0, 0, 0, 0)}, now=0)
+        snapshot = rates.update({'PhysicalDrive0': WindowsDiskIO(10, 0, 0, 0, 3000, 2000),
+                                 'PhysicalDrive1': WindowsDiskIO(0, 0, 0, 0, 0, 0)}, now=5)
+        self.assertEqual(snapshot[series_key('disk_busy', device='PhysicalDrive0')], 100)
+        self.assertNotIn(series_key('disk_busy', device='PhysicalDrive1'), snapshot)
+        snapshot = rates.update({'PhysicalDrive1': WindowsDiskIO(0, 50, 0, 0, 0, 0)}, now=10)
+        self.assertEqual(snapshot, {key: value for key, value in snapshot.items() if key[1][0][1] == 'PhysicalDrive1'})
+        self.assertEqual(snapshot[series_key('disk_write_iops', device='PhysicalDrive1')], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
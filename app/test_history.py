@@ -0,0 +1,59 @@
+import unittest
+from app.history import HistoryStore, downsample
+from app.rules import series_key
+
+
+class TestHistoryStore(unittest.TestCase):
+
+    def test_ring_buffer_keeps_latest_samples(self):
+        """Test that each series keeps only its newest samples, oldest first."""
+        history = HistoryStore(capacity=3)
+        key = series_key('net_rx_bytes', nic='eth0')
+        for t in range(5):
+            history.record({key: t * 10, series_key('cpu'): 1}, t)
+        self.assertEqual(history.samples(key), [(2, 20), (3, 30), (4, 40)])
+        self.assertEqual(history.samples(key, since=3), [(3, 30), (4, 40)])
+        self.assertEqual(history.latest(key), (4, 40))
+        self.assertEqual(history.keys('net_rx_bytes'), [key])
+        self.assertEqual(history.samples(series_key('ram')), [])
+        self.assertEqual(history.recent(key, 2), [30, 40])
+        self.assertEqual(history.recent(key, 10), [20, 30, 40])
+        self.assertEqual(history.recent(series_key('ram'), 2), [])
+
+    def test_rollups_and_range_queries(self):
+        """Test older ranges are answered from averaged buckets and the open bucket is included."""
+        history = HistoryStore(capacity=10, rollups=((60, 10), (600, 10)))
+        key = series_key('cpu')
+        for t in range(0, 1800, 10):
+            history.record({key: t % 60}, t)
+        # raw samples only reach back 100 s, minute buckets 10 minutes
+        self.assertEqual(history.select(key, 1750)[0], 0)
+        self.assertEqual(history.select(key, 1300)[0], 60)
+        self.assertEqual(history.select(key, 0)[0], 600)
+        self.assertEqual(history.select(key, 1750, step=300)[0], 60)
+
+        resolution, samples = history.query(key, 1500, 1800, step=None)
+        self.assertEqual(resolution, 60)
+        self.assertEqual(list(samples), [(t, 25.0) for t in range(1500, 1800, 60)])
+        resolution, samples = history.query(key, 0, 1800, step=1200)
+        self.assertEqual((resolution, list(samples)), (1200, [(0, 25.0), (1200, 25.0)]))
+        self.assertEqual(list(history.query(series_key('ram'), 0, 1800)[1]), [])
+        self.assertEqual(list(downsample([(0, 1), (5, float('nan')), (10, 3), (20, 5)], 20)), [(0, 2.0), (20, 5.0)])
+
+    def test_stale_series_are_removed(self):
+        """Test series silent for longer than the longest rollup are listed and dropped with their rollups."""
+        history = HistoryStore(capacity=10, rollups=((60, 10), (600, 10)))
+        self.assertEqual(history.retention, 6000)
+        busy, gone = series_key('cpu'), series_key('net_rx_bytes', nic='veth1')
+        history.record({busy: 1, gone: 2}, 0)
+        history.record({busy: 1}, 7000)
+        self.assertEqual(history.stale(7000 - history.retention), [gone])
+        history.remove(gone)
+        self.assertEqual(history.keys('net_rx_bytes'), [])
+        self.assertNotIn(gone, history.rollups)
+        self.assertEqual(list(history.query(gone, 0, 7000)[1]), [])
+        history.remove(gone)
+
+
+if __name__ == '__main__':
+    unittest.main()
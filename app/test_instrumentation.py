@@ -0,0 +1,46 @@
+import unittest
+from unittest import mock
+from app.instrumentation import Instrumentation, LatencyHistogram
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_histogram_percentiles(self):
+        """Test that percentiles land in the right bucket and never exceed the max."""
+        histogram = LatencyHistogram()
+        for _ in range(99):
+            histogram.record(0.001)
+        histogram.record(0.5)
+        self.assertLessEqual(histogram.percentile(0.5), 0.00128)
+        self.assertGreaterEqual(histogram.percentile(0.5), 0.001)
+        self.assertEqual(histogram.percentile(1.0), 0.5)
+        self.assertEqual(histogram.summary()['count'], 100)
+
+    def test_report(self):
+        """Test timings, counters and agent usage end up in the report."""
+        instrumentation = Instrumentation()
+        with instrumentation.timed('check_services'):
+            pass
+        instrumentation.increment('tick_overruns')
+        instrumentation.set_gauge('queue_depth', 3)
+        report = instrumentation.report()
+        self.assertEqual(report['timings']['check_services']['count'], 1)
+        self.assertEqual(report['counters'], {'tick_overruns': 1})
+        self.assertEqual(report['gauges'], {'queue_depth': 3})
+        self.assertIn('cpu_percent', report['agent'])
+        self.assertIn('rss_mb', report['agent'])
+
+    def test_agent_cpu_is_sampled_on_its_own_tick(self):
+        """Test that reading the agent's usage leaves the CPU sample alone until the next sampling interval."""
+        instrumentation = Instrumentation()
+        with mock.patch('app.instrumentation.time.monotonic', return_value=instrumentation.started + 10), \
+                mock.patch.object(instrumentation, '_cpu_seconds', return_value=instrumentation.started_cpu + 2.5):
+            self.assertEqual(instrumentation.agent_usage()['cpu_percent'], 25.0)  # the lifetime until sampled
+            instrumentation.sample_cpu()
+            self.assertEqual(instrumentation.cpu_percent, 25.0)
+            instrumentation.sample_cpu()  # too soon, keeps the last interval
+            self.assertEqual([instrumentation.agent_usage()['cpu_percent'] for _ in range(2)], [25.0, 25.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import json
+import unittest
+from unittest import mock
+from app.journal import Journal, INDEX_EVERY
+
+DAY = 86400
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def fill(self, journal, days=30):
+        for hour in range(days * 24):
+            t = hour * 3600
+            journal.append('service', f"Service{hour % 5}", t, status="Stopped" if hour % 2 else "Running")
+            journal.append('alert', "CPU Usage", t + 1, state="Firing", value=95.0)
+
+    def test_query_filters(self):
+        """Test time, type and name filters plus paging."""
+        journal = Journal(self.directory.name)
+        self.fill(journal, days=2)
+        outages = journal.query(since=DAY, until=2 * DAY, event_type='service', name='Service1')
+        self.assertTrue(outages)
+        self.assertTrue(all(DAY <= event['t'] < 2 * DAY and event['name'] == 'Service1' for event in outages))
+        self.assertEqual(journal.count(event_type='alert'), 48)
+        page = journal.query(event_type='alert', offset=10, limit=5)
+        self.assertEqual([event['t'] for event in page], [hour * 3600 + 1 for hour in range(10, 15)])
+        self.assertEqual(journal.query(name='missing'), [])
+
+    def test_pages_and_counts_from_the_index(self):
+        """Test newest-first pages and counts match a full read while decoding little more than the page."""
+        journal = Journal(self.directory.name, segment_bytes=32 * 1024)
+        self.fill(journal, days=20)
+        self.assertGreater(len(journal.segments), 2)
+        for filters in ({}, {'since': 3 * DAY + 5, 'until': 17 * DAY}, {'event_type': 'alert', 'since': DAY},
+                        {'name': 'Service2', 'until': 11 * DAY}, {'event_type': 'service', 'name': 'Service4'}):
+            expected = journal.query(**filters)
+            with mock.patch('app.journal.json.loads', side_effect=json.loads) as loads:
+                self.assertEqual(journal.count(**filters), len(expected))
+                pages, cursor = [], None
+                while True:
+                    loads.reset_mock()
+                    page, cursor = journal.newest(100, before=cursor, **filters)
+                    self.assertLessEqual(loads.call_count, len(page) + 2 * INDEX_EVERY)
+                    if not page:
+                        break
+                    pages.extend(page)
+                self.assertEqual(pages, expected[::-1], filters)
+                loads.reset_mock()
+                self.assertEqual(journal.query(offset=len(expected) - 3, **filters), expected[-3:])
+                self.assertLessEqual(loads.call_count, 3 + 2 * INDEX_EVERY)
+
+    def test_rotation_and_reopen(self):
+        """Test segments rotate, expire and are indexed again from their sidecar files after a restart."""
+        journal = Journal(self.directory.name, segment_bytes=8 * 1024, max_segments=4)
+        self.fill(journal)
+        journal.close()
+        files = sorted(os.listdir(self.directory.name))
+        self.assertEqual(len([name for name in files if name.endswith('.jsonl')]), 4)
+        self.assertEqual(len([name for name in files if name.endswith('.idx')]), 3)
+
+        reopened = Journal(self.directory.name, segment_bytes=8 * 1024, max_segments=4)
+        expected = journal.query(name='Service3')
+        self.assertEqual(reopened.query(name='Service3'), expected)
+        reopened.append('restart', 'Service3', 30 * DAY, success=True)
+        self.assertEqual(reopened.query(name='Service3')[-1]['type'], 'restart')
+
+    def test_torn_line_is_dropped(self):
+        """Test a partially written last event is cut off when the journal is reopened."""
+        journal = Journal(self.directory.name)
+        journal.append('service', 'Spooler', 1, status="Stopped")
+        journal.close()
+        with open(os.path.join(self.directory.name, 'events-000001.jsonl'), 'ab') as segment_file:
+            segment_file.write(b'{"t":2,"type":"serv')
+        reopened = Journal(self.directory.name)
+        reopened.append('service', 'Spooler', 3, status="Running")
+        self.assertEqual([event['t'] for event in reopened.query()], [1, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
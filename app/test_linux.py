@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+from app.linux import CgroupMonitor, PreadFile, parse_io_stat, parse_pressure
+from app.rules import AlertRule, RuleEngine, series_key
+
+PRESSURE = "some avg10={some} avg60=1.00 avg300=0.50 total=123456\nfull avg10={full} avg60=0.00 avg300=0.00 total=0\n"
+
+
+class TestLinux(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, 'cgroup')
+        self.pressure_dir = os.path.join(self.directory.name, 'pressure')
+        os.makedirs(self.pressure_dir)
+        self.write(self.root, 'cgroup.procs', "1\n")
+        for resource in ('cpu', 'memory', 'io'):
+            self.write(self.pressure_dir, resource, PRESSURE.format(some=2.5, full=0.0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, directory, name, text):
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, name), 'w') as fixture:
+            fixture.write(text)
+
+    def container(self, name, usage_usec, current, limit='max', io=(0, 0, 0, 0), throttled_usec=0):
+        directory = os.path.join(self.root, 'system.slice', name)
+        self.write(directory, 'cgroup.procs', "4242\n")
+        self.write(directory, 'cpu.stat', f"usage_usec {usage_usec}\nuser_usec {usage_usec}\nsystem_usec 0\n"
+                                          f"nr_periods 10\nnr_throttled 1\nthrottled_usec {throttled_usec}\n")
+        self.write(directory, 'memory.current', f"{current}\n")
+        self.write(directory, 'memory.max', f"{limit}\n")
+        self.write(directory, 'io.stat',
+                   f"8:0 rbytes={io[0]} wbytes={io[1]} rios={io[2]} wios={io[3]} dbytes=0 dios=0\n"
+                   f"8:16 rbytes={io[0]} wbytes=0 rios=0 wios=0 dbytes=0 dios=0\n")
+
+    def test_parsers_and_pread(self):
+        """Test pressure and io.stat parsing, and a reopened read seeing rewritten content."""
+        self.assertEqual(parse_pressure(PRESSURE.format(some=2.5, full=0.25).encode()), {'some': 2.5, 'full': 0.25})
+        self.assertEqual(parse_io_stat(b"8:0 rbytes=10 wbytes=5\n8:16 rbytes=1 wbytes=0\n"),
+                         {'rbytes': 11, 'wbytes': 5})
+        pread_file = PreadFile(os.path.join(self.pressure_dir, 'cpu'), size=16)
+        self.assertEqual(parse_pressure(pread_file.read())['some'], 2.5)
+        self.write(self.pressure_dir, 'cpu', PRESSURE.format(some=7.0, full=1.0))
+        self.assertEqual(parse_pressure(pread_file.read())['some'], 7.0)
+        pread_file.close()
+
+    def test_cgroup_metrics(self):
+        """Test usage rates, memory against its limit and pressure stall figures from a fixture tree."""
+        self.container('docker-web.scope', 0, 256 * 1024 ** 2, limit=512 * 1024 ** 2)
+        self.container('docker-batch.scope', 0, 64 * 1024 ** 2)
+        monitor = CgroupMonitor(self.root, self.pressure_dir)
+        monitor.configure(['system.slice/docker-*.scope'], root=self.root, pressure=True)
+        first = monitor.update(now=0)
+        self.assertEqual(first[series_key('psi_some', resource='memory')], 2.5)
+        self.assertNotIn(series_key('cgroup_cpu', cgroup='/system.slice/docker-web.scope'), first)
+
+        self.container('docker-web.scope', 2500000, 480 * 1024 ** 2, limit=512 * 1024 ** 2,
+                       io=(5 * 4096, 4096, 5, 1), throttled_usec=500000)
+        snapshot = monitor.update(now=5)
+        web = monitor.values['/system.slice/docker-web.scope']
+        self.assertEqual(web['cgroup_cpu'], 50)
+        self.assertEqual(web['cgroup_throttled'], 10)
+        self.assertEqual(web['cgroup_memory_mb'], 480)
+        self.assertEqual(web['cgroup_memory_percent'], 93.75)
+        self.assertEqual(web['cgroup_io_read_bytes'], 2 * 4096)
+        self.assertEqual(web['cgroup_io_write_iops'], 0.2)
+        self.assertNotIn('cgroup_memory_percent', monitor.values['/system.slice/docker-batch.scope'])
+
+        engine = RuleEngine([AlertRule("Container memory", 'cgroup_memory_percent', 90)])
+        alerts = engine.evaluate(snapshot, now=5)
+        self.assertEqual([alert.name for alert in alerts], ["Container memory /system.slice/docker-web.scope"])
+        monitor.close()
+
+    def test_new_cgroups_are_picked_up(self):
+        """Test cgroups matching a pattern later are found on the next rescan, and missing PSI is skipped."""
+        monitor = CgroupMonitor(self.root, os.path.join(self.directory.name, 'missing'))
+        monitor.configure([], root=self.root, pressure=True)
+        self.assertEqual(monitor.update(now=0), {})
+        monitor.configure(['/', 'system.slice/*'], root=self.root, pressure=True)
+        self.assertEqual(monitor.update(now=0), {})
+        self.assertEqual(list(monitor.values), ['/'])
+        self.container('app.service', 0, 1024 ** 2)
+        monitor.update(now=30)
+        self.assertEqual(list(monitor.values), ['/'])
+        monitor.update(now=60)
+        self.assertEqual(sorted(monitor.values), ['/', '/system.slice/app.service'])
+        monitor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import configparser
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app.logs import LogTail, LogMonitor, load_log_tails, parse_patterns
+
+PATTERNS = {'error': r'\bERROR\b', 'oom': 'Out of memory'}
+
+
+class TestLogTail(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'app.log')
+        self.append("ERROR before the monitor started\n")
+        self.tail = LogTail('app', self.path, PATTERNS)
+        self.assertEqual(self.tail.poll(), ({'error': 0, 'oom': 0}, {}))
+
+    def tearDown(self):
+        self.tail.close()
+        self.directory.cleanup()
+
+    def append(self, text, path=None):
+        with open(path or self.path, 'ab') as log_file:
+            log_file.write(text.encode())
+
+    def test_counts_new_matching_lines_once(self):
+        self.append("INFO fine\nERROR disk ERROR twice\nkernel: Out of memory: killed 42\nERRORS are not errors\n")
+        counts, lines = self.tail.poll()
+        self.assertEqual(counts, {'error': 1, 'oom': 1})
+        self.assertEqual(lines, {'error': "ERROR disk ERROR twice", 'oom': "kernel: Out of memory: killed 42"})
+        self.assertEqual(self.tail.poll()[0], {'error': 0, 'oom': 0})
+
+    def test_partial_line_waits_for_its_end(self):
+        self.append("2024-05-01 ERR")
+        self.assertEqual(self.tail.poll()[0]['error'], 0)
+        self.append("OR timeout\n")
+        self.assertEqual(self.tail.poll(), ({'error': 1, 'oom': 0}, {'error': "2024-05-01 ERROR timeout"}))
+
+    def test_rotation_reads_the_end_of_the_old_file_then_the_new_one(self):
+        self.append("ERROR one\n")
+        self.tail.poll()
+        self.append("ERROR written before the rotation\n")
+        os.rename(self.path, self.path + '.1')
+        self.append("Out of memory\n")
+        counts, _ = self.tail.poll()
+        if os.name == 'nt':
+            self.assertEqual(counts, {'error': 0, 'oom': 1})  # no handle is kept open, so the old end is missed
+        else:
+            self.assertEqual(counts, {'error': 1, 'oom': 1})
+
+    def test_truncation_starts_over(self):
+        self.append("ERROR one\nERROR two\n")
+        self.tail.poll()
+        with open(self.path, 'wb') as log_file:
+            log_file.write(b"ERROR after truncation\n")
+        self.assertEqual(self.tail.poll()[0]['error'], 1)
+
+    def test_missing_file_is_read_from_the_start_once_created(self):
+        tail = LogTail('later', os.path.join(self.directory.name, 'later.log'), PATTERNS)
+        self.assertEqual(tail.poll()[0], {'error': 0, 'oom': 0})
+        self.append("ERROR first line\n", tail.path)
+        self.assertEqual(tail.poll()[0]['error'], 1)
+        tail.close()
+
+    def test_reads_across_chunks(self):
+        lines = "".join(f"{'ERROR' if number % 10 == 0 else 'INFO'} request {number}\n" for number in range(5000))
+        self.append(lines)
+        with mock.patch('app.logs.CHUNK_SIZE', 1000):
+            counts, found = self.tail.poll()
+        self.assertEqual(counts['error'], 500)
+        self.assertEqual(found['error'], "ERROR request 4990")
+
+
+class TestLogConfig(unittest.TestCase):
+
+    def test_sections_and_rules(self):
+        config = configparser.ConfigParser()
+        config.read_string("""
+[LOG web]
+Path = /var/log/web.log
+Patterns =
+    error: \\bERROR\\b
+    Traceback
+Severity = critical
+Ignore_Case = True
+
+[LOG broken]
+Path = /var/log/broken.log
+Patterns = (unclosed
+""")
+        with mock.patch('builtins.print'):
+            tails = load_log_tails(config)
+        self.assertEqual(len(tails), 1)
+        self.assertEqual(tails[0].patterns, {'error': r'\bERROR\b', 'pattern2': 'Traceback'})
+        self.assertTrue(tails[0].regex.search(b"an error here"))
+
+        monitor = LogMonitor()
+        monitor.configure(tails)
+        rule, = monitor.rules()
+        self.assertEqual((rule.name, rule.metric, rule.threshold, rule.labels, rule.severity),
+                         ("Log web", 'log_matches', 0, {'log': 'web'}, 'critical'))
+        # unchanged tails keep their position
+        monitor.configure([LogTail('web', '/var/log/web.log', dict(tails[0].patterns), True, 'warning')])
+        self.assertIs(monitor.tails['web'], tails[0])
+        self.assertEqual(monitor.tails['web'].severity, 'warning')
+
+    def test_parse_patterns(self):
+        self.assertEqual(parse_patterns("panic\n  fatal: FATAL|CRIT  \n"), {'pattern1': 'panic', 'fatal': 'FATAL|CRIT'})
+
+
+if __name__ == '__main__':
+    unittest.main()
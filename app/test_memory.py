@@ -0,0 +1,61 @@
+import unittest
+from unittest import mock
+from app.memory import MemoryWatchdog, MEMORY_SAMPLE_INTERVAL
+from app.rules import series_key
+
+
+class TestMemoryWatchdog(unittest.TestCase):
+
+    def setUp(self):
+        self.watchdog = MemoryWatchdog()
+
+    def tearDown(self):
+        self.watchdog.close()
+
+    def test_rss_read_once_per_interval(self):
+        self.assertEqual(self.watchdog.check(1000, monotonic=0), {})  # neither tracing nor a budget
+        self.watchdog.configure(False, budget_mb=100)
+        with mock.patch('app.memory.rss_mb', return_value=42.0):
+            self.assertEqual(self.watchdog.check(1000, monotonic=0), {series_key('agent_rss_mb'): 42.0})
+            self.assertEqual(self.watchdog.check(1005, monotonic=5), {})
+            self.assertEqual(self.watchdog.check(1060, monotonic=MEMORY_SAMPLE_INTERVAL),
+                             {series_key('agent_rss_mb'): 42.0})
+            report = self.watchdog.report(1060)
+        self.assertEqual(report, {'rss_mb': 42.0, 'budget_mb': 100, 'tracing': False})
+
+    def test_diff_points_at_growing_line(self):
+        self.watchdog.configure(True)
+        readings = self.watchdog.check(1000, monotonic=0)
+        self.assertIn(series_key('agent_traced_mb'), readings)
+        leak = [bytearray(1024) for _ in range(2000)]
+        report = self.watchdog.report(1060)
+
+        self.assertEqual(report['diff_since'], 1000)
+        self.assertEqual([snapshot['t'] for snapshot in report['snapshots']], [1000])
+        grown = report['diff'][0]
+        self.assertIn('test_memory.py', grown['location'])
+        self.assertGreater(grown['size_diff_kb'], 2000)
+        self.assertGreaterEqual(grown['blocks_diff'], 2000)
+        self.assertIn(grown['location'], [line['location'] for line in report['top']])
+        del leak
+
+    def test_previous_snapshot_and_stopping(self):
+        self.watchdog.configure(True)
+        self.watchdog.check(1000, monotonic=0)
+        leak = [bytearray(1024) for _ in range(1000)]
+        self.watchdog.check(4600, monotonic=3600)
+        # nothing allocated since the previous snapshot, everything since the first
+        previous = self.watchdog.report(4660, against='previous')
+        self.assertEqual(previous['diff_since'], 4600)
+        self.assertLess(sum(line['size_diff_kb'] for line in previous['diff'] if 'test_memory.py' in line['location']),
+                        100)
+        self.assertIn('test_memory.py', self.watchdog.report(4660)['diff'][0]['location'])
+        del leak
+
+        self.watchdog.configure(False)
+        self.assertNotIn('top', self.watchdog.report(4700))
+        self.assertEqual(self.watchdog.snapshots, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
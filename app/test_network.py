@@ -0,0 +1,52 @@
+import unittest
+from app.network import NetworkRates, counter_delta
+from app.rules import AlertRule, RuleEngine, series_key
+from app.simulation import NetIO
+
+
+def reading(received, sent=0, errin=0):
+    return NetIO(sent, received, sent // 1000, received // 1000, errin, 0, 0, 0)
+
+
+class TestNetworkRates(unittest.TestCase):
+
+    def test_counter_delta(self):
+        """Test plain increases, 32/64-bit wraparound and counter resets."""
+        self.assertEqual(counter_delta(100, 250), 150)
+        self.assertEqual(counter_delta(2 ** 32 - 100, 50), 150)
+        self.assertEqual(counter_delta(2 ** 64 - 10, 5), 15)
+        self.assertEqual(counter_delta(5000000, 20), 20)
+
+    def test_rates_per_interface(self):
+        """Test rates for every interface from two readings, skipping interfaces seen only once."""
+        rates = NetworkRates()
+        self.assertEqual(rates.update({'eth0': reading(1000)}, now=0), {})
+        snapshot = rates.update({'eth0': reading(11000, sent=5000, errin=2), 'wlan0': reading(10)}, now=5)
+        self.assertEqual(snapshot[series_key('net_rx_bytes', nic='eth0')], 2000)
+        self.assertEqual(snapshot[series_key('net_tx_bytes', nic='eth0')], 1000)
+        self.assertEqual(snapshot[series_key('net_rx_errors', nic='eth0')], 0.4)
+        self.assertEqual(list(rates.rates), ['eth0'])
+
+    def test_vanished_interfaces_are_reported(self):
+        """Test the series of an interface that is gone are handed out once so their history can be dropped."""
+        rates = NetworkRates()
+        rates.update({'eth0': reading(0), 'veth1': reading(0)}, now=0)
+        rates.update({'eth0': reading(500), 'veth1': reading(500)}, now=5)
+        self.assertEqual(rates.drain_removed(), [])
+        snapshot = rates.update({'eth0': reading(1000)}, now=10)
+        removed = rates.drain_removed()
+        self.assertIn(series_key('net_rx_bytes', nic='veth1'), removed)
+        self.assertFalse(any(key in snapshot for key in removed))
+        self.assertEqual(rates.drain_removed(), [])
+
+    def test_rates_are_alertable(self):
+        """Test that interface rates go through the same rule engine as CPU and RAM."""
+        engine = RuleEngine([AlertRule("Saturated", 'net_rx_bytes', 1500, labels={'nic': 'eth0'})])
+        rates = NetworkRates()
+        rates.update({'eth0': reading(0)}, now=0)
+        alerts = engine.evaluate(rates.update({'eth0': reading(10000)}, now=5), now=5)
+        self.assertEqual([(alert.name, alert.value) for alert in alerts], [("Saturated", 2000)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import configparser
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from app.alerts import RenderedAlert
+from app.instrumentation import Instrumentation
+from app.notifier import Channel, Notifier, FileChannel, SyslogChannel, WebhookChannel, load_channels
+
+ALERT = RenderedAlert("Service Stopped: Spooler", "<p>down</p>", "down")
+
+
+class StandInServer:
+    """Local webhook endpoint recording the JSON bodies it receives, optionally slow or failing."""
+
+    def __init__(self, delay=0.0, status=200):
+        self.received = []
+        self.delay = delay
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(stand_in.delay)
+                stand_in.received.append(json.loads(body))
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TestNotifier(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.directory.name, 'alerts.log')
+        self.servers = []
+        self.notifier = Notifier(Instrumentation())
+
+    def tearDown(self):
+        self.notifier.stop(timeout=1)
+        for server in self.servers:
+            server.close()
+        self.directory.cleanup()
+
+    def stand_in(self, **kwargs):
+        server = StandInServer(**kwargs)
+        self.servers.append(server)
+        return server
+
+    def logged(self):
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path) as log_file:
+            return [json.loads(line) for line in log_file]
+
+    def test_webhook_and_severity_routing(self):
+        """Test the webhook posts Slack/Teams style JSON and only channels routed for the severity get it."""
+        server = self.stand_in()
+        self.notifier.configure([
+            WebhookChannel('ops', server.url, severities={'critical'}),
+            FileChannel('log', self.log_path),
+        ])
+        self.assertEqual(self.notifier.notify(ALERT, 'critical'), ['ops', 'log'])
+        self.assertEqual(self.notifier.notify(ALERT, 'info'), ['log'])
+        self.assertEqual(self.notifier.notify(ALERT, 'info', channel='ops'), ['ops'])
+        self.assertEqual(self.notifier.notify(ALERT, 'info', channel='missing'), [])
+        self.assertTrue(self.notifier.flush(timeout=5))
+
+        self.assertEqual(len(server.received), 2)
+        self.assertEqual(server.received[0]['title'], ALERT.subject)
+        self.assertEqual(server.received[0]['severity'], 'critical')
+        self.assertIn("down", server.received[0]['text'])
+        self.assertEqual([entry['severity'] for entry in self.logged()], ['critical', 'info'])
+        self.assertEqual(self.notifier.instrumentation.counters['notifications_sent'], 4)
+
+    def test_slow_channel_does_not_delay_others(self):
+        """Test a webhook stuck on a slow endpoint leaves the file channel and the caller unaffected."""
+        slow = self.stand_in(delay=1.0)
+        self.notifier.configure([WebhookChannel('slow', slow.url), FileChannel('log', self.log_path)])
+        start = time.perf_counter()
+        for _ in range(3):
+            self.notifier.notify(ALERT, 'warning')
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertTrue(self.notifier.channels['log'].flush(timeout=0.5))
+        self.assertEqual(len(self.logged()), 3)
+        self.assertLess(len(slow.received), 3)
+
+    def test_full_queue_drops_and_failures_retry(self):
+        """Test a backed up channel drops new notifications and a failing endpoint is retried, then counted."""
+        failing = self.stand_in(status=500)
+        slow = self.stand_in(delay=0.5)
+        channel = WebhookChannel('failing', failing.url)
+        channel.retry_delays = (0.01,)
+        self.notifier.configure([channel, WebhookChannel('slow', slow.url, queue_size=1)])
+        queued = [self.notifier.notify(ALERT, 'warning') for _ in range(4)]
+        self.assertEqual(queued[0], ['failing', 'slow'])
+        # one notification in flight and one waiting, the rest are dropped
+        self.assertLessEqual(sum('slow' in names for names in queued), 2)
+        self.assertTrue(all('failing' in names for names in queued))
+        self.assertTrue(self.notifier.channels['failing'].flush(timeout=5))
+
+        counters = self.notifier.instrumentation.counters
+        self.assertEqual(len(failing.received), 8)  # every notification tried twice
+        self.assertEqual(counters['notifications_failed'], 4)
+        self.assertGreaterEqual(counters['notifications_dropped'], 2)
+
+    def test_syslog(self):
+        """Test syslog messages carry the facility and severity priority."""
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(5)
+        self.addCleanup(receiver.close)
+        self.notifier.configure([SyslogChannel('syslog', f"127.0.0.1:{receiver.getsockname()[1]}",
+                                               facility='local0')])
+        self.notifier.notify(ALERT, 'critical')
+        self.assertEqual(receiver.recv(1024).decode(), "<130>CyberMooseWatch: [critical] Service Stopped: Spooler")
+
+    def test_load_channels_and_reconfigure(self):
+        """Test channels are read from [CHANNEL] sections and unchanged ones survive a config reload."""
+        config = configparser.ConfigParser()
+        config.optionxform = str
+        config.read_string(f"""
+[CHANNEL slack]
+Type = webhook
+URL = http://127.0.0.1:9/hook
+Severities = warning, critical
+
+[CHANNEL local]
+Type = file
+Path = {self.log_path}
+
+[CHANNEL broken]
+Type = pager
+""")
+        channels = load_channels(config)
+        self.assertEqual([channel.name for channel in channels], ['slack', 'local'])
+        self.assertEqual(channels[0].severities, {'warning', 'critical'})
+        self.notifier.configure(channels)
+        self.notifier.notify(ALERT, 'info')
+
+        config['CHANNEL slack']['Severities'] = 'critical'
+        self.notifier.configure(load_channels(config))
+        self.assertIs(self.notifier.channels['local'], channels[1])
+        self.assertIsNot(self.notifier.channels['slack'], channels[0])
+        self.assertEqual(self.notifier.channels['slack'].severities, {'critical'})
+
+    def test_channel_without_send_fails_at_construction(self):
+        class Pager(Channel):
+            pass
+
+        with self.assertRaises(TypeError):
+            Pager('pager')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import asyncio
+import configparser
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from app.probes import Probe, ProbeRunner, load_probes, parse_address
+from app.supervisor import CancelToken
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """/health answers 200, /fail 500 and /slow after half a second."""
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(0.5)
+        self.send_response(500 if self.path == '/fail' else 200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default of 5 would drop concurrent connects until they retry
+
+
+def closed_port():
+    with socket.socket() as probe_socket:
+        probe_socket.bind(('127.0.0.1', 0))
+        return probe_socket.getsockname()[1]
+
+
+class TestProbes(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(('127.0.0.1', 0), StandInHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.runner = ProbeRunner()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def run_probes(self, *probes):
+        self.runner.configure(probes)
+        self.runner.run_once()
+        return {result.name: result for result in self.runner.drain()}
+
+    def test_tcp_and_http_results(self):
+        results = self.run_probes(
+            Probe('port', address=f"127.0.0.1:{self.server.server_address[1]}"),
+            Probe('refused', address=f"127.0.0.1:{closed_port()}"),
+            Probe('health', url=self.base + '/health'),
+            Probe('error', url=self.base + '/fail'),
+            Probe('expected error', url=self.base + '/fail', expect_status=(500,)),
+            Probe('slow', url=self.base + '/slow', timeout=0.2))
+
+        self.assertTrue(results['port'].up)
+        self.assertIsNone(results['port'].response)
+        self.assertEqual(results['refused'].status, "Down")
+        self.assertTrue(results['health'].up)
+        self.assertGreater(results['health'].response, 0)
+        self.assertEqual((results['error'].status, results['error'].error), ("Down", "HTTP status 500"))
+        self.assertEqual(results['expected error'].status, "Up")
+        self.assertEqual(results['slow'].error, "Timed out after 0.2 s")
+
+        described = self.runner.describe()
+        self.assertEqual(described['health']['connect']['count'], 1)
+        self.assertEqual(described['health']['response']['count'], 1)
+        self.assertIsNone(described['port']['response'])
+        self.assertIsNone(described['refused']['connect'])
+
+    def test_probes_run_concurrently(self):
+        probes = [Probe(f"slow{index}", url=self.base + '/slow') for index in range(40)]
+        start = time.perf_counter()
+        results = self.run_probes(*probes)
+        self.assertLess(time.perf_counter() - start, 3)  # 20 s one after another
+        self.assertTrue(all(result.up for result in results.values()))
+
+    def test_down_after_consecutive_failures(self):
+        probe = Probe('flaky', address=f"127.0.0.1:{closed_port()}", failures=2)
+        self.assertEqual(self.run_probes(probe)['flaky'].status, "Up")
+        self.assertEqual(self.run_probes(probe)['flaky'].status, "Down")
+
+    def test_worker_repeats_until_cancelled(self):
+        self.runner.configure([Probe('health', url=self.base + '/health', interval=0.1)])
+        token = CancelToken()
+        worker = threading.Thread(target=self.runner.run, args=(token,))
+        worker.start()
+        time.sleep(0.6)
+        token.cancel()
+        worker.join(2)
+        self.assertFalse(worker.is_alive())
+        self.assertGreaterEqual(len(self.runner.drain()), 3)
+
+    def test_config(self):
+        config = configparser.ConfigParser()
+        config.read_string("""
+[PROBE api]
+URL = https://example.com:8443/health?full=1
+Interval = 10
+Expect_Status = 200, 204
+Failures = 3
+Service = ApiService
+
+[PROBE db]
+Address = [::1]:5432
+
+[PROBE broken]
+Address = localhost
+""")
+        with mock.patch('builtins.print'):
+            api, db = load_probes(config)
+        self.assertEqual((api.kind, api.tls, api.host, api.port, api.interval, api.expect_status, api.failures,
+                          api.service), ('http', True, 'example.com', 8443, 10, (200, 204), 3, 'ApiService'))
+        self.assertTrue(api.request.startswith(b"GET /health?full=1 HTTP/1.1\r\nHost: example.com:8443\r\n"))
+        self.assertEqual((db.kind, db.host, db.port), ('tcp', '::1', 5432))
+        self.assertEqual(parse_address('db.local:5432'), ('db.local', 5432))
+
+    def test_configure_shares_tls_context_and_drops_state(self):
+        """Test HTTPS probes share one TLS context and a removed probe's state goes with it."""
+        probes = [Probe(f"api{index}", url=f"https://api{index}.example.com/") for index in range(3)]
+        tcp = Probe('db', address=f"127.0.0.1:{closed_port()}")
+        with mock.patch('app.probes.ssl.create_default_context', return_value=mock.sentinel.context) as create:
+            self.runner.configure(probes + [tcp])
+            self.runner.configure(probes[:1] + [tcp])
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual({probe.ssl_context for probe in probes}, {mock.sentinel.context})
+        self.assertIsNone(tcp.ssl_context)
+
+        asyncio.run(self.runner.run_all([tcp]))  # the HTTPS probes would not get far with a stand-in context
+        self.assertIn('db', self.runner.last)
+        self.runner.configure(probes[:1])
+        self.assertNotIn('db', self.runner.last)
+        self.assertEqual(list(self.runner.describe()), ['api0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
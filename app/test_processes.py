@@ -0,0 +1,55 @@
+import unittest
+from app.processes import ProcessMetrics
+from app.rules import AlertRule, RuleEngine, series_key
+from app.simulation import SimulatedProvider, VirtualClock
+
+
+class TestProcessMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = VirtualClock(start=1000)
+        self.host = SimulatedProvider(self.clock, processes=3)
+
+    def instances(self, *names):
+        found = {name: [] for name in names}
+        for proc in self.host.process_iter(['name']):
+            if proc.info['name'] in found:
+                found[proc.info['name']].append(proc)
+        return found
+
+    def test_totals_over_instances(self):
+        """Test metrics are summed across instances and I/O rates come from counter deltas."""
+        self.host.processes.append(self.host._process(5000, 'proc0.exe', 1))
+        metrics = ProcessMetrics()
+        metrics.update(self.instances('proc0.exe', 'missing.exe'), self.clock.time())
+        self.clock.advance(10)
+        snapshot = metrics.update(self.instances('proc0.exe', 'missing.exe'), self.clock.time())
+
+        totals = metrics.totals['proc0.exe']
+        self.assertEqual(totals['proc_instances'], 2)
+        self.assertEqual(totals['proc_threads'], 8)
+        self.assertEqual(totals['proc_fds'], 32)
+        self.assertEqual(totals['proc_io_read_bytes'], 2 * 4096)
+        self.assertEqual(snapshot[series_key('proc_instances', process='missing.exe')], 0)
+        self.assertEqual(set(metrics.handles), {1000, 5000})
+
+    def test_handles_are_reused_and_dropped(self):
+        """Test cached handles are reused across ticks and forgotten once the process exits."""
+        metrics = ProcessMetrics()
+        metrics.update(self.instances('proc1.exe'), self.clock.time())
+        handle = metrics.handles[1001]
+        metrics.update(self.instances('proc1.exe'), self.clock.time())
+        self.assertIs(metrics.handles[1001], handle)
+        metrics.update({'proc1.exe': []}, self.clock.time())
+        self.assertEqual(metrics.handles, {})
+        self.assertEqual(metrics.io, {})
+
+    def test_process_metrics_are_alertable(self):
+        """Test process totals feed the rule engine."""
+        engine = RuleEngine([AlertRule("Too many threads", 'proc_threads', 3, labels={'process': 'proc2.exe'})])
+        snapshot = ProcessMetrics().update(self.instances('proc2.exe'), self.clock.time())
+        self.assertEqual([alert.name for alert in engine.evaluate(snapshot, now=0)], ["Too many threads"])
+
+
+if __name__ == '__main__':
+    unittest.main()
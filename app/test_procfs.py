@@ -0,0 +1,118 @@
+import os
+import tempfile
+import threading
+import unittest
+from app.procfs import ProcProvider
+
+STAT = ("cpu  {user} 0 {system} {idle} 0 0 0 0 0 0\n"
+        "cpu0 {user} 0 0 {idle} 0 0 0 0 0 0\n"
+        "cpu1 0 0 {system} 0 0 0 0 0 0 0\n"
+        "intr 12345\nctxt 678\n")
+MEMINFO = ("MemTotal:        8000000 kB\nMemFree:         1000000 kB\nMemAvailable:    4000000 kB\n"
+           "Buffers:          200000 kB\nCached:          2000000 kB\nSReclaimable:     300000 kB\n")
+NET_DEV = ("Inter-|   Receive                                                |  Transmit\n"
+           " face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls "
+           "carrier compressed\n"
+           "    lo:     100       1    0    0    0     0          0         0      100       1    0    0    0     0 "
+           "      0          0\n"
+           "  eth0:    5000      50    1    2    0     0          0         0     3000      30    3    4    0     0 "
+           "      0          0\n")
+DISKSTATS = ("   8       0 sda 100 5 2000 40 200 10 4000 60 0 90 100 0 0 0 0\n"
+             "   8       1 sda1 100 5 2000 40 200 10 4000 60 0 90 100 0 0 0 0\n"
+             "   8      16 sdb 1 0 8 1 2 0 16 2 0 3 3 0 0 0 0\n")
+
+
+class TestProcProvider(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.proc = os.path.join(self.directory.name, 'proc')
+        self.sys_block = os.path.join(self.directory.name, 'block')
+        for disk in ('sda', 'sdb'):
+            os.makedirs(os.path.join(self.sys_block, disk))
+        self.write('stat', STAT.format(user=0, system=0, idle=0))
+        self.write('meminfo', MEMINFO)
+        self.write('loadavg', "0.50 0.25 0.10 1/123 4567\n")
+        self.write('net/dev', NET_DEV)
+        self.write('diskstats', DISKSTATS)
+        self.provider = ProcProvider(self.proc, self.sys_block)
+
+    def tearDown(self):
+        self.provider.close()
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        os.makedirs(os.path.dirname(os.path.join(self.proc, name)), exist_ok=True)
+        with open(os.path.join(self.proc, name), 'w') as fixture:
+            fixture.write(text)
+
+    def test_cpu_percent(self):
+        """Test busy percentages come from the deltas between two /proc/stat readings, overall and per core."""
+        self.assertEqual(self.provider.cpu_percent(interval=None), 0.0)
+        self.assertEqual(self.provider.cpu_percent(interval=None, percpu=True), [0.0, 0.0])
+        self.write('stat', STAT.format(user=30, system=20, idle=50))
+        self.assertEqual(self.provider.cpu_percent(interval=None), 50.0)
+        self.assertEqual(self.provider.cpu_percent(interval=None, percpu=True), [37.5, 100.0])
+        # nothing happened since the last call
+        self.assertEqual(self.provider.cpu_percent(interval=None), 0.0)
+
+    def test_cpu_percent_callers_keep_their_own_baseline(self):
+        """Test a blocking call or another thread's call does not reset the interval a caller times against."""
+        results = []
+        barrier = threading.Barrier(2)
+
+        def other_caller():
+            results.append(self.provider.cpu_percent(interval=None))
+            barrier.wait()  # the main thread changes /proc/stat and reads it twice meanwhile
+            barrier.wait()
+            results.append(self.provider.cpu_percent(interval=None))
+
+        other = threading.Thread(target=other_caller)
+        self.provider.cpu_percent(interval=None)
+        other.start()
+        barrier.wait()
+        self.write('stat', STAT.format(user=30, system=20, idle=50))
+        self.assertEqual(self.provider.cpu_percent(interval=0.01), 0.0)  # nothing changed while it slept
+        self.assertEqual(self.provider.cpu_percent(interval=None), 50.0)
+        barrier.wait()
+        other.join()
+        self.assertEqual(results, [0.0, 50.0])
+
+        times = self.provider.cpu_times_array()
+        times[0] = -1
+        self.assertNotEqual(self.provider.cpu_times_array()[0], -1)
+
+    def test_memory_load_and_network(self):
+        """Test meminfo, loadavg and net/dev parse into the fields psutil reports."""
+        memory = self.provider.virtual_memory()
+        self.assertEqual(memory.total, 8000000 * 1024)
+        self.assertEqual(memory.available, 4000000 * 1024)
+        self.assertEqual(memory.percent, 50.0)
+        self.assertEqual(memory.cached, 2300000 * 1024)
+        # an older kernel without MemAvailable, and lines that moved
+        self.write('meminfo', "MemTotal:        8000000 kB\nMemFree:         1000000 kB\n"
+                              "Cached:          2000000 kB\nBuffers:          200000 kB\n")
+        memory = self.provider.virtual_memory()
+        self.assertEqual((memory.available, memory.buffers), (3200000 * 1024, 200000 * 1024))
+        self.assertEqual(self.provider.getloadavg(), (0.5, 0.25, 0.1))
+
+        nics = self.provider.net_io_counters(pernic=True)
+        self.assertEqual(sorted(nics), ['eth0', 'lo'])
+        self.assertEqual(nics['eth0'].bytes_recv, 5000)
+        self.assertEqual(nics['eth0'].bytes_sent, 3000)
+        self.assertEqual((nics['eth0'].errin, nics['eth0'].dropout), (1, 4))
+        self.assertEqual(self.provider.net_io_counters().bytes_recv, 5100)
+
+    def test_disk_io_counters(self):
+        """Test per-device counters in bytes and totals that leave out partitions."""
+        disks = self.provider.disk_io_counters(perdisk=True)
+        self.assertEqual(sorted(disks), ['sda', 'sda1', 'sdb'])
+        self.assertEqual(disks['sda'].read_bytes, 2000 * 512)
+        self.assertEqual(disks['sda'].busy_time, 90)
+        total = self.provider.disk_io_counters()
+        self.assertEqual(total.read_count, 101)
+        self.assertEqual(total.write_bytes, (4000 + 16) * 512)
+
+
+if __name__ == '__main__':
+    unittest.main()
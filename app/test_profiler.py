@@ -0,0 +1,97 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from app.profiler import SamplingProfiler
+from app.supervisor import CancelToken
+
+
+def spin(token):
+    while not token.cancelled:
+        sum(range(1000))
+
+
+def wait_then_spin(started, token):
+    started.wait()
+    spin(token)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.profiler = SamplingProfiler()
+        self.token = CancelToken()
+        self.worker = threading.Thread(target=spin, args=(self.token,), name='monitoring')
+        self.worker.start()
+
+    def tearDown(self):
+        self.token.cancel()
+        self.worker.join()
+
+    def test_stacks_per_thread(self):
+        profile = self.profiler.capture(0.3, rate=200)
+
+        self.assertGreater(profile.samples, 20)
+        self.assertIn('monitoring', profile.threads())
+        self.assertNotIn(threading.current_thread().name, profile.threads())  # the sampling thread itself
+        lines = profile.collapsed('monitoring').splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('monitoring;threading.Thread._bootstrap;'))
+            self.assertGreater(int(count), 0)
+        self.assertIn('test_profiler.spin', profile.hottest()['monitoring'][0])
+        self.assertEqual(sum(int(line.rsplit(' ', 1)[1]) for line in lines), profile.threads()['monitoring'])
+        self.assertLess(profile.describe()['overhead_percent'], 50)
+
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, 'profile.folded')
+            profile.write(file_name)
+            with open(file_name) as profile_file:
+                self.assertEqual(profile_file.read(), profile.collapsed())
+
+    def test_threads_that_start_or_move_on_mid_capture(self):
+        started = threading.Event()
+        token = CancelToken()
+        late = threading.Thread(target=lambda: time.sleep(0.2) or started.set(), name='late')
+        waiting = threading.Thread(target=wait_then_spin, args=(started, token), name='waiting')
+        waiting.start()
+        threading.Timer(0.1, late.start).start()
+        try:
+            profile = self.profiler.capture(0.4, rate=200)
+        finally:
+            token.cancel()
+            waiting.join()
+            late.join()
+
+        self.assertIn('late', profile.threads())
+        stacks = profile.collapsed('waiting')
+        self.assertIn('test_profiler.wait_then_spin;threading.Event.wait', stacks)
+        self.assertIn('test_profiler.wait_then_spin;test_profiler.spin', stacks)
+
+    def test_one_capture_at_a_time(self):
+        with self.assertRaises(ValueError):
+            self.profiler.capture(0)
+        with self.assertRaises(ValueError):
+            self.profiler.capture(1, rate=100000)
+
+        first = threading.Thread(target=self.profiler.capture, args=(0.5,))
+        first.start()
+        time.sleep(0.1)
+        with self.assertRaises(RuntimeError):
+            self.profiler.capture(0.1)
+        first.join()
+        self.assertFalse(self.profiler.running)
+
+    def test_cancel_ends_capture_early(self):
+        token = CancelToken()
+        threading.Timer(0.2, token.cancel).start()
+        start = time.perf_counter()
+        profile = self.profiler.capture(30, token=token)
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertGreater(profile.samples, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
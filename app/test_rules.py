@@ -0,0 +1,99 @@
+import configparser
+import unittest
+from unittest import mock
+from app.rules import AlertRule, RuleEngine, load_rules, series_key
+from app.thresholds import PENDING, FIRING
+
+
+class TestRuleEngine(unittest.TestCase):
+
+    def test_load_rules_from_config(self):
+        """Test parsing [RULE ...] sections."""
+        config = configparser.ConfigParser()
+        config.read_string("""
+[RULE root_disk_full]
+Metric = disk
+Labels = device=/dev/sda1
+Op = >=
+Threshold = 90
+Clear_Threshold = 85
+Duration = 120
+Severity = critical
+Channel = email
+
+[HARDWARE]
+CPU_Threshold = 80
+""")
+        rules = load_rules(config)
+        self.assertEqual(len(rules), 1)
+        rule = rules[0]
+        self.assertEqual(rule.name, 'root_disk_full')
+        self.assertEqual(rule.labels, {'device': '/dev/sda1'})
+        self.assertEqual((rule.op, rule.threshold, rule.clear_threshold, rule.duration), ('>=', 90, 85, 120))
+        self.assertEqual(rule.severity, 'critical')
+
+    def test_rules_without_metric_or_threshold_are_invalid(self):
+        """Test that a rule which could never fire is reported instead of loaded."""
+        config = configparser.ConfigParser()
+        config.read_string("""
+[RULE no_metric]
+Threshold = 90
+
+[RULE empty_metric]
+Metric =
+Threshold = 90
+
+[RULE no_threshold]
+Metric = cpu
+
+[RULE cpu_high]
+Metric = cpu
+Threshold = 90
+""")
+        with mock.patch('builtins.print') as printed:
+            rules = load_rules(config)
+        self.assertEqual([rule.name for rule in rules], ['cpu_high'])
+        messages = [call[0][0] for call in printed.call_args_list]
+        self.assertEqual(len(messages), 3)
+        self.assertIn("Invalid alert rule [RULE no_metric]: Metric is required", messages)
+        self.assertIn("Invalid alert rule [RULE empty_metric]: Metric is required", messages)
+
+    def test_label_matching_and_comparisons(self):
+        """Test that only rules matching the series labels and comparison fire."""
+        engine = RuleEngine([
+            AlertRule("Disk C", 'disk', 80, labels={'device': 'C:'}),
+            AlertRule("Any disk", 'disk', 95),
+            AlertRule("RAM low", 'ram', 5, op='<='),
+        ])
+        alerts = engine.evaluate({
+            series_key('disk', device='C:'): 85,
+            series_key('disk', device='D:'): 99,
+            series_key('ram'): 50,
+        }, now=0)
+        self.assertEqual(sorted(alert.name for alert in alerts), ["Any disk D:", "Disk C"])
+
+    def test_duration_state_is_kept(self):
+        """Test that pending state carries across snapshots and recompiles."""
+        engine = RuleEngine([AlertRule("CPU Usage", 'cpu', 80, duration=10)])
+        key = series_key('cpu')
+        self.assertEqual(engine.evaluate({key: 90}, now=0)[0].state, PENDING)
+        engine.load([AlertRule("CPU Usage", 'cpu', 85, duration=10)])
+        self.assertEqual(engine.states(), {"CPU Usage": PENDING})
+        self.assertEqual(engine.evaluate({key: 90}, now=10)[0].state, FIRING)
+        self.assertEqual(engine.evaluate({key: 10}, now=11), [])
+        self.assertEqual(engine.states(), {})
+
+    def test_fleet_evaluation(self):
+        """Test evaluating many hosts in one pass with host label matching."""
+        engine = RuleEngine([
+            AlertRule("CPU", 'cpu', 80),
+            AlertRule("CPU db", 'cpu', 50, labels={'host': 'db1'}),
+        ])
+        snapshots = {f"web{i}": {series_key('cpu'): 60} for i in range(100)}
+        snapshots['db1'] = {series_key('cpu'): 90}
+        alerts = engine.evaluate_fleet(snapshots, now=0)
+        self.assertEqual(sorted((alert.host, alert.name) for alert in alerts), [('db1', 'CPU'), ('db1', 'CPU db')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+from app.search import SearchIndex, sync_listbox
+
+
+class FakeListbox:
+    """Records the rows like a tk.Listbox, counting edit calls."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.calls = 0
+
+    def delete(self, first, last):
+        del self.rows[first:last + 1]
+        self.calls += 1
+
+    def insert(self, index, *elements):
+        self.rows[index:index] = elements
+        self.calls += 1
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_index_matches_substrings(self):
+        """Test case-insensitive substring matches for short and long queries."""
+        index = SearchIndex(['Spooler', 'sshd', 'SQLWriter', 'svchost.exe', 'sshd', 'explorer.exe'])
+        self.assertEqual(index.items, ['Spooler', 'sshd', 'SQLWriter', 'svchost.exe', 'explorer.exe'])
+        self.assertEqual(index.search(''), [0, 1, 2, 3, 4])
+        self.assertEqual(index.search('s'), [0, 1, 2, 3])
+        self.assertEqual(index.search('sq'), [2])
+        self.assertEqual(index.search('EXE'), [3, 4])
+        self.assertEqual(index.search('plore'), [4])
+        self.assertEqual(index.search('ler'), [0])
+        self.assertEqual(index.search('zzz'), [])
+
+    def test_sync_listbox_edits_incrementally(self):
+        """Test the listbox ends up showing the wanted rows using one call per run of changes."""
+        items = [f"item{i}" for i in range(10)]
+        listbox = FakeListbox(items)
+        shown = sync_listbox(listbox, items, list(range(10)), [0, 1, 5, 6, 9])
+        self.assertEqual(listbox.rows, ['item0', 'item1', 'item5', 'item6', 'item9'])
+        self.assertEqual(listbox.calls, 2)
+
+        listbox.calls = 0
+        sync_listbox(listbox, items, shown, [1, 2, 3, 6, 7, 9])
+        self.assertEqual(listbox.rows, ['item1', 'item2', 'item3', 'item6', 'item7', 'item9'])
+        self.assertEqual(listbox.calls, 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
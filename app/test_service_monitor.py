@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import ANY, MagicMock, patch
 import tkinter as tk
 import psutil
 from app.gui import ServiceMonitorApp
@@ -51,6 +51,8 @@ class TestServiceMonitorApp(unittest.TestCase):
         """Test scanning services."""
         psutil.win_service_iter = MagicMock(return_value=[MagicMock(name='Service1'), MagicMock(name='Service2')])
         self.app.scan_services()
+        self.app.scan_thread.join()
+        self.root.update()
         scanned_services = self.app.lst_scanned_services.get(0, tk.END)
         self.assertIn('Service1', scanned_services)
         self.assertIn('Service2', scanned_services)
@@ -65,8 +67,8 @@ class TestServiceMonitorApp(unittest.TestCase):
         self.app.handle_hardware_overload = MagicMock()
         self.app.check_cpu_ram_usage()
         self.assertEqual(self.app.handle_hardware_overload.call_count, 2)
-        self.app.handle_hardware_overload.assert_any_call("CPU Usage", 90, 80)
-        self.app.handle_hardware_overload.assert_any_call("RAM Usage", 85, 80)
+        self.app.handle_hardware_overload.assert_any_call("CPU Usage", 90, 80, ANY)
+        self.app.handle_hardware_overload.assert_any_call("RAM Usage", 85, 80, ANY)
 
     def test_attempt_service_restart(self):
         """Test attempting to restart a service."""
@@ -88,15 +90,13 @@ class TestServiceMonitorApp(unittest.TestCase):
 
     def test_save_settings(self):
         """Test saving settings."""
-        open_mock = MagicMock()
         self.app.cpu_threshold.set(75)
         self.app.email_subject.set('Test Alert')
-        with unittest.mock.patch('builtins.open', open_mock):
+        with patch('app.gui.save_config') as save_config_mock, patch('app.gui.messagebox'):
             self.app.save_settings()
-        open_mock.assert_called_with('config.ini', 'w')
-        config_data = open_mock().write.call_args[0][0]
-        self.assertIn('CPU_Threshold = 75', config_data)
-        self.assertIn('Subject = Test Alert', config_data)
+        save_config_mock.assert_called_once_with(self.app.config, 'config.ini')
+        self.assertEqual(self.app.config['HARDWARE']['CPU_Threshold'], '75')
+        self.assertEqual(self.app.config['EMAIL']['Subject'], 'Test Alert')
 
     def test_refresh_status(self):
         """Test refreshing the system status."""
@@ -0,0 +1,377 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from app.checkpoint import write_checkpoint
+from app.core import MonitorCore
+from app.history import HistoryStore, read_binary
+from app.rules import series_key
+from app.simulation import (SimulatedProvider, VirtualClock, constant, flap, ramp, record_emails, requires_flask,
+                            simulate, steps, load_trace_csv, with_noise)
+
+CONFIG = """
+[MONITORING]
+services = Service1
+processes = proc1.exe
+
+[EMAIL]
+to = ops@example.com
+frequency = 30
+sendrepeatemail = {repeat}
+
+[HARDWARE]
+cpu_threshold = 80
+ram_threshold = 90
+auto_restart_service = True
+
+[REPORTS]
+dailyreport = True
+reportactive = {reports}
+
+[SERVER]
+ip = 127.0.0.1
+"""
+
+DAY = 86400
+
+
+class TestSimulation(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.clock = VirtualClock(start=1700000000)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_monitor(self, host, repeat=False, reports=False):
+        config_file = os.path.join(self.directory.name, 'config.ini')
+        with open(config_file, 'w') as f:
+            f.write(CONFIG.format(repeat=repeat, reports=reports))
+        monitor = MonitorCore(config_file=config_file, state_file=os.path.join(self.directory.name, 'state.json'),
+                              provider=host, clock=self.clock)
+        return monitor, record_emails(monitor)
+
+    def test_month_of_daily_reports(self):
+        """Test that a simulated month produces one daily report per day."""
+        host = SimulatedProvider(self.clock, cpu=constant(10))
+        monitor, emails = self.create_monitor(host, reports=True)
+        simulate(monitor, 30 * DAY, interval=60)
+        reports = [body for _, _, body in emails if "Daily System Report" in body]
+        self.assertEqual(len(reports), 30)
+
+    def test_email_frequency_limit(self):
+        """Test that repeat overload emails respect the email frequency."""
+        host = SimulatedProvider(self.clock, cpu=constant(95))
+        monitor, emails = self.create_monitor(host, repeat=True)
+        simulate(monitor, DAY, interval=60)
+        overloads = [sent_at for sent_at, _, body in emails if "<strong>CPU Usage</strong>" in body]
+        self.assertGreater(len(overloads), 40)
+        self.assertTrue(all(b - a > 30 * 60 for a, b in zip(overloads, overloads[1:])))
+
+        monitor, emails = self.create_monitor(host, repeat=False)
+        simulate(monitor, DAY, interval=60)
+        self.assertEqual(len([body for _, _, body in emails if "<strong>CPU Usage</strong>" in body]), 1)
+
+    def test_service_flap_is_restarted(self):
+        """Test that a flapping service is reported and restarted through the simulated host."""
+        host = SimulatedProvider(self.clock, services=1, service_outages={'Service1': flap(3600, 600, DAY, start=60)})
+        monitor, emails = self.create_monitor(host)
+        simulate(monitor, 3 * 3600, interval=30)
+        bodies = [body for _, _, body in emails]
+        self.assertEqual(sum("<strong>Stopped</strong>" in body for body in bodies), 3)
+        self.assertEqual(sum("successfully restarted" in body for body in bodies), 3)
+
+        outages = monitor.journal.query(event_type='service', name='Service1')
+        self.assertEqual([event['status'] for event in outages], ["Running"] + ["Stopped", "Running"] * 3)
+        self.assertEqual(len(monitor.journal.query(event_type='restart')), 3)
+
+    @requires_flask
+    def test_events_endpoint(self):
+        """Test querying the journal over HTTP."""
+        host = SimulatedProvider(self.clock, services=1, service_outages={'Service1': flap(3600, 600, DAY, start=60)})
+        monitor, _ = self.create_monitor(host)
+        simulate(monitor, 3 * 3600, interval=30)
+        monitor.setup_flask_routes()
+        client = monitor.app.test_client()
+
+        since = self.clock.time() - 2 * 3600
+        response = client.get(f"/events?type=service&name=Service1&since={since}")
+        self.assertEqual([event['status'] for event in response.get_json()], ["Stopped", "Running"] * 2)
+        self.assertEqual(client.get("/events?since=yesterday").status_code, 400)
+
+    @requires_flask
+    def test_history_endpoint(self):
+        """Test range queries pick the rollup resolution from the range and stream JSON or binary columns."""
+        host = SimulatedProvider(self.clock, cpu=ramp(0, 100, DAY), cores=2)
+        monitor, _ = self.create_monitor(host)
+        simulate(monitor, 2 * DAY, interval=60)
+        monitor.setup_flask_routes()
+        client = monitor.app.test_client()
+        now = self.clock.time()
+
+        recent = client.get("/history?metric=cpu").get_json()
+        self.assertEqual(recent['to'], now)
+        self.assertEqual(recent['series'][0]['resolution'], 0)
+        self.assertEqual(len(recent['series'][0]['points']), 60)
+
+        month = client.get(f"/history?metric=cpu&from={now - 30 * DAY}").get_json()
+        self.assertEqual(month['series'][0]['resolution'], 3600)
+        self.assertEqual(len(month['series'][0]['points']), 49)
+
+        cores = client.get(f"/history?metric=cpu_core&core=1&from={now - DAY}&step=600&format=binary")
+        self.assertEqual(cores.mimetype, 'application/octet-stream')
+        [(metric, labels, resolution, times, values)] = read_binary(cores.data)
+        self.assertEqual((metric, labels, resolution), ('cpu_core', {'core': '1'}, 600))
+        self.assertEqual(len(times), len(values))
+        self.assertEqual(times[1] - times[0], 600)
+        self.assertEqual(client.get("/history?metric=cpu&from=yesterday").status_code, 400)
+        self.assertEqual(client.get("/history").status_code, 400)
+
+    def test_cpu_anomaly_below_fixed_threshold(self):
+        """Test a jump far above this host's normal CPU alerts although it stays under the fixed threshold."""
+        cpu = with_noise(steps([(0, 10), (2 * DAY, 60), (2 * DAY + 600, 10)]), 3)
+        host = SimulatedProvider(self.clock, cpu=cpu)
+        monitor, emails = self.create_monitor(host)
+        monitor.config['HARDWARE']['Anomaly_Sigmas'] = '4'
+        monitor.apply_config()
+        simulate(monitor, 3 * DAY, interval=60)
+
+        overloads = [body for _, _, body in emails if "Hardware Overload" in body]
+        self.assertEqual(len([body for body in overloads if "<strong>CPU Usage Anomaly</strong>" in body]), 1)
+        self.assertFalse([body for body in overloads if "<strong>CPU Usage</strong>" in body])
+        self.assertTrue(os.path.exists(monitor.baselines_file))
+
+        restarted, _ = self.create_monitor(host)
+        self.assertIn(series_key('cpu'), restarted.anomaly_detector.baselines)
+
+    def test_log_errors_alert(self):
+        """Test that error lines appended to a watched log fire its rule and are journaled with the line."""
+        log_path = os.path.join(self.directory.name, 'app.log')
+        with open(log_path, 'w') as log_file:
+            log_file.write("ERROR from an earlier run\n")
+        monitor, emails = self.create_monitor(SimulatedProvider(self.clock, cpu=constant(10)))
+        monitor.config.read_dict({'LOG app': {'Path': log_path, 'Patterns': r'error: \bERROR\b'}})
+        monitor.apply_config()
+        simulate(monitor, 60)
+        with open(log_path, 'a') as log_file:
+            log_file.write("INFO ok\nERROR connection refused\n")
+        simulate(monitor, 60)
+
+        body, = [body for _, _, body in emails if "<strong>Log app error</strong>" in body]
+        self.assertIn("1 new line(s) of the log <strong>app</strong>", body)
+        self.assertIn("<pre>ERROR connection refused</pre>", body)
+        self.assertNotIn("exceeded", body)
+        event, = monitor.journal.query(event_type='log')
+        self.assertEqual((event['name'], event['pattern'], event['count'], event['line']),
+                         ('app', 'error', 1, "ERROR connection refused"))
+        monitor.shutdown()
+
+    def test_rule_alerts_name_their_comparison(self):
+        """Test that `<` rules and rules on other units are not worded as a hardware overload."""
+        monitor, emails = self.create_monitor(SimulatedProvider(self.clock, cpu=constant(10)))
+        monitor.config.read_dict({
+            'RULE RAM not full': {'Metric': 'ram', 'Op': '<', 'Threshold': '100', 'Severity': 'warning'},
+            'RULE Busy link': {'Metric': 'net_rx_bytes', 'Labels': 'nic=eth0', 'Threshold': '0'},
+        })
+        monitor.apply_config()
+        simulate(monitor, 60)
+        monitor.shutdown()
+
+        ram, = [body for _, _, body in emails if "<strong>RAM not full</strong>" in body]
+        link, = [body for _, _, body in emails if "<strong>Busy link</strong>" in body]
+        self.assertIn("<li><strong>Condition:</strong> ram &lt; 100</li>", ram)
+        self.assertIn("<li><strong>Labels:</strong> nic=eth0</li>", link)
+        self.assertNotIn("%", link.split("<hr>")[0])
+        self.assertFalse([body for body in (ram, link) if "Hardware Overload" in body])
+
+    def test_unanswered_port_restarts_running_service(self):
+        """Test that a probe failing against a running service alerts and restarts it."""
+        with socket.socket() as closed:
+            closed.bind(('127.0.0.1', 0))
+            port = closed.getsockname()[1]
+        host = SimulatedProvider(self.clock, services=2)
+        monitor, emails = self.create_monitor(host)
+        monitor.config.read_dict({'PROBE api': {'Address': f"127.0.0.1:{port}", 'Service': 'Service1'}})
+        monitor.apply_config()
+        monitor.probe_runner.run_once()
+        monitor.run_checks()
+        monitor.shutdown()
+
+        self.assertIn('Service1', host.restarted)
+        down = "The probe <strong>api</strong> is now <strong>Down</strong>"
+        self.assertEqual(len([body for _, _, body in emails if down in body]), 1)
+        event, = monitor.journal.query(event_type='probe')
+        self.assertEqual((event['name'], event['status']), ('api', "Down"))
+        self.assertEqual(monitor.history.latest(series_key('probe_up', probe='api'))[1], 0)
+
+    def test_agent_over_memory_budget_alerts(self):
+        """Test that the monitor outgrowing its own memory budget alerts."""
+        monitor, emails = self.create_monitor(SimulatedProvider(self.clock, cpu=constant(10)))
+        monitor.config.read_dict({'MONITORING': {'Memory_Budget_MB': '1', 'Memory_Tracing': 'True'}})
+        monitor.apply_config()
+        try:
+            simulate(monitor, 60)
+            self.assertEqual(len([body for _, _, body in emails if "<strong>Agent Memory</strong>" in body]), 1)
+            self.assertGreater(monitor.history.latest(series_key('agent_rss_mb'))[1], 1)
+        finally:
+            monitor.shutdown()
+
+    @requires_flask
+    def test_memory_report_endpoint(self):
+        """Test the memory report over HTTP, diffed against the previous snapshot."""
+        monitor, _ = self.create_monitor(SimulatedProvider(self.clock, cpu=constant(10)))
+        monitor.config.read_dict({'MONITORING': {'Memory_Budget_MB': '1', 'Memory_Tracing': 'True'}})
+        monitor.apply_config()
+        try:
+            simulate(monitor, 60)
+            monitor.setup_flask_routes()
+            client = monitor.app.test_client()
+            report = client.get("/status/memory?diff=previous&top=5").get_json()
+            self.assertEqual((report['budget_mb'], report['tracing'], len(report['top'])), (1, True, 5))
+            self.assertEqual(len(report['rss_history']), 1)
+            self.assertGreater(report['counts']['threads'], 0)
+            self.assertEqual(client.get("/status/memory?diff=yesterday").status_code, 400)
+        finally:
+            monitor.shutdown()
+
+    @requires_flask
+    def test_profile_endpoint_requires_token(self):
+        """Test that profiling over HTTP is off without a token and returns collapsed stacks with it."""
+        monitor, _ = self.create_monitor(SimulatedProvider(self.clock, cpu=constant(10)))
+        monitor.setup_flask_routes()
+        client = monitor.app.test_client()
+        self.assertEqual(client.post("/profile?seconds=0.1").status_code, 403)
+
+        monitor.config.read_dict({'SERVER': {'Profile_Token': 's3cret'}})
+        monitor.apply_config()
+        monitor.start_monitoring()
+        try:
+            wrong = client.post("/profile?seconds=0.1", headers={'Authorization': "Bearer guess"})
+            self.assertEqual(wrong.status_code, 401)
+            authorized = {'Authorization': "Bearer s3cret"}
+            self.assertEqual(client.post("/profile?seconds=9999", headers=authorized).status_code, 400)
+            response = client.post("/profile?seconds=0.3&rate=200&thread=monitoring", headers=authorized)
+            self.assertEqual(response.mimetype, 'text/plain')
+            lines = response.get_data(as_text=True).splitlines()
+            self.assertTrue(lines)
+            self.assertTrue(all(line.startswith('monitoring;') for line in lines))
+            summary = client.post("/profile?seconds=0.1&format=json", headers=authorized).get_json()
+            self.assertIn('monitoring', summary['threads'])
+            long_capture = threading.Thread(target=client.post, args=("/profile?seconds=300",),
+                                            kwargs={'headers': authorized})
+            long_capture.start()
+            time.sleep(0.2)
+        finally:
+            monitor.shutdown()
+        long_capture.join(5)
+        self.assertFalse(long_capture.is_alive())  # shutdown ends a capture still running
+        event = monitor.journal.query(event_type='profile')[-1]
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'profiles', event['name'])))
+
+    def test_warm_restart_does_not_alert_again(self):
+        """Test that a restarted monitor resumes statuses, firing alerts and history from the checkpoint."""
+        host = SimulatedProvider(self.clock, cpu=constant(95), services=2)
+        monitor, emails = self.create_monitor(host)
+        simulate(monitor, 600)
+        monitor.shutdown()
+        self.assertEqual(len(emails), 3)  # Service1 and proc1.exe running, CPU usage
+
+        restarted, emails = self.create_monitor(host)
+        simulate(restarted, 600)
+        restarted.shutdown()
+        self.assertEqual(emails, [])
+        self.assertEqual(len(restarted.journal.query(event_type='alert')), 1)
+        self.assertEqual(len(restarted.history.samples(series_key('cpu'))), 240)
+
+    def test_checkpoint_with_missing_or_odd_state_starts_fresh(self):
+        """Test that a readable checkpoint missing keys or holding the wrong types does not stop the monitor."""
+        history = HistoryStore()
+        history.append(series_key('cpu'), self.clock.time(), 10.0)
+        checkpoint_file = os.path.join(self.directory.name, 'checkpoint.bin')
+        host = SimulatedProvider(self.clock, cpu=constant(10), services=2)
+
+        write_checkpoint(checkpoint_file, {'services': {'Service1': "Stopped"}}, history, self.clock.time())
+        monitor, _ = self.create_monitor(host)
+        self.assertEqual(monitor.last_service_status, {'Service1': "Stopped"})
+        self.assertEqual(len(monitor.history.samples(series_key('cpu'))), 1)
+
+        write_checkpoint(checkpoint_file, {'services': "Stopped", 'firing': [["CPU Usage"]]}, history,
+                         self.clock.time())
+        with mock.patch('builtins.print') as printed:
+            monitor, emails = self.create_monitor(host)
+        self.assertIn("Ignoring checkpoint state", printed.call_args[0][0])
+        self.assertEqual((monitor.last_service_status, monitor.firing_alerts), ({}, {}))
+        simulate(monitor, 60)
+        monitor.shutdown()
+        self.assertEqual(len(emails), 2)  # Service1 and proc1.exe running, as on a first start
+
+    def test_silent_series_are_evicted(self):
+        """Test the hourly sweep drops a series silent for longer than the history reaches back, and its alert."""
+        host = SimulatedProvider(self.clock, cpu=constant(10), services=2)
+        monitor, _ = self.create_monitor(host)
+        monitor.config.read_dict({'RULE Container CPU': {'Metric': 'cgroup_cpu', 'Threshold': '90'}})
+        monitor.apply_config()
+        gone = series_key('cgroup_cpu', cgroup='/system.slice/docker-old.scope')
+        name = "Container CPU /system.slice/docker-old.scope"
+        monitor.history.append(gone, self.clock.time() - monitor.history.retention - 1, 95.0)
+        monitor.firing_alerts[name] = gone
+        monitor.last_email_sent.update({name: self.clock.time(), "Container CPU /system.slice/web.scope": 0})
+        simulate(monitor, 3600 + 60)
+        monitor.shutdown()
+        self.assertEqual(monitor.history.samples(gone), [])
+        self.assertNotIn(name, monitor.firing_alerts)
+        self.assertEqual(list(monitor.last_email_sent), ["Container CPU /system.slice/web.scope"])
+        self.assertTrue(monitor.history.samples(series_key('cpu')))
+
+    def test_core_and_disk_io_history(self):
+        """Test a pegged core and disk throughput end up in the history while the average looks healthy."""
+        host = SimulatedProvider(self.clock, cpu=constant(10), cores=8, core_cpu={3: constant(100)})
+        monitor, emails = self.create_monitor(host)
+        simulate(monitor, 300)
+        self.assertEqual(monitor.history.latest(series_key('cpu_core', core='3'))[1], 100)
+        self.assertEqual(monitor.history.latest(series_key('cpu_core', core='0'))[1], 10)
+        self.assertEqual(len(monitor.core_usage.percents), 8)
+        self.assertEqual(monitor.disk_io_rates.rates['sda1']['disk_read_bytes'], 4 * 1024 ** 2)
+        self.assertEqual(monitor.disk_io_rates.rates['sda1']['disk_busy'], 25)
+        self.assertEqual(len(monitor.history.recent(series_key('disk_write_bytes', device='sdb1'), 60)), 59)
+        self.assertFalse([subject for _, subject, body in emails if "Hardware Overload" in body])
+
+    def test_alert_renders_are_reused(self):
+        """Test that the same event renders once, as HTML and plain text, from the cached system details."""
+        host = SimulatedProvider(self.clock)
+        monitor, emails = self.create_monitor(host)
+        messages = []
+        monitor.send_message = lambda msg, email_from, email_to_list: messages.append(msg)
+        for _ in range(2):
+            monitor.send_email("Service Stopped", "<p>custom body</p>", service_or_process_name="Service1",
+                               status="Stopped", previous_status="Running")
+        monitor.notifier.flush()
+        self.assertEqual(monitor.instrumentation.histograms['alert_render'].count, 1)
+        text, html = (part.get_payload(decode=True).decode() for part in messages[0].get_payload())
+        self.assertIn("<p>custom body</p>", html)
+        self.assertIn("custom body", text)
+        self.assertNotIn("<p>", text)
+
+    def test_traces(self):
+        """Test the disk fill, recorded and CSV traces."""
+        fill = ramp(50, 100, 1000)
+        self.assertEqual((fill(0), fill(500), fill(5000)), (50, 75, 100))
+        recorded = steps([(0, 1), (10, 2), (20, 3)])
+        self.assertEqual((recorded(-5), recorded(15), recorded(25)), (1, 2, 3))
+
+        trace_file = os.path.join(self.directory.name, 'trace.csv')
+        with open(trace_file, 'w') as f:
+            f.write("t,cpu,ram\n0,10,40\n60,90,45\n")
+        traces = load_trace_csv(trace_file)
+        host = SimulatedProvider(self.clock, cpu=traces['cpu'], ram=traces['ram'])
+        self.clock.advance(61)
+        self.assertEqual(host.cpu_percent(), 90)
+        self.assertEqual(host.virtual_memory().percent, 45)
+
+
+if __name__ == '__main__':
+    unittest.main()
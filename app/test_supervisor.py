@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from app.core import MonitorCore
+from app.instrumentation import Instrumentation
+from app.simulation import SimulatedProvider, VirtualClock, record_emails, requires_flask
+from app.supervisor import CancelToken, Supervisor
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        self.supervisor = Supervisor(Instrumentation(), restart_delays=(0.01, 0.05))
+
+    def tearDown(self):
+        self.supervisor.shutdown(timeout=1)
+
+    def wait_for(self, condition, timeout=2):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_crashed_worker_restarts_with_backoff(self):
+        """Test a crashing worker is restarted after each delay until it runs, and one-off jobs are not."""
+        attempts = []
+
+        def flaky(token):
+            attempts.append(time.monotonic())
+            if len(attempts) < 4:
+                raise RuntimeError("boom")
+            token.wait(10)
+
+        worker = self.supervisor.start('flaky', flaky)
+        self.assertTrue(self.wait_for(lambda: len(attempts) == 4))
+        self.assertEqual(worker.restarts, 3)
+        self.assertEqual(worker.state, 'running')
+        self.assertEqual(worker.last_error, "RuntimeError: boom")
+        self.assertGreaterEqual(attempts[3] - attempts[2], 0.05)
+        self.assertEqual(self.supervisor.instrumentation.counters['worker_crashes'], 3)
+
+        once = self.supervisor.start('once', lambda token: 1 / 0, restart=False)
+        self.assertTrue(self.wait_for(lambda: not once.alive))
+        self.assertEqual(once.state, 'failed')
+        self.assertEqual({worker['name']: worker['state'] for worker in self.supervisor.inventory()},
+                         {'flaky': 'running', 'once': 'failed'})
+
+    def test_replace_and_bounded_shutdown(self):
+        """Test starting a name again replaces its worker and shutdown gives up on a stuck one in time."""
+        first = self.supervisor.start('server', lambda token: token.wait(10))
+        second = self.supervisor.start('server', lambda token: token.wait(10))
+        self.assertFalse(first.alive)
+        self.assertEqual(first.state, 'stopped')
+        self.assertEqual([worker['name'] for worker in self.supervisor.inventory()], ['server'])
+
+        release = threading.Event()
+        unblocked = []
+
+        def blocking(token):
+            # stands in for a call that only returns when told to, like the tray icon loop
+            token.on_cancel(lambda: unblocked.append(True))
+            release.wait(0.05)
+
+        self.supervisor.start('stuck', lambda token: release.wait(10))
+        self.supervisor.start('blocking', blocking)
+        start = time.monotonic()
+        self.assertEqual(self.supervisor.shutdown(timeout=0.2), ['stuck'])
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(second.alive)
+        self.assertEqual(unblocked, [True])
+        release.set()
+
+    def test_cancel_token(self):
+        """Test callbacks registered after the cancel still run, once."""
+        token = CancelToken()
+        calls = []
+        token.on_cancel(lambda: calls.append('before'))
+        token.cancel()
+        token.cancel()
+        token.on_cancel(lambda: calls.append('after'))
+        self.assertEqual(calls, ['before', 'after'])
+        self.assertTrue(token.wait(1))
+
+
+class TestMonitorShutdown(unittest.TestCase):
+
+    def run_and_stop(self, web_server):
+        with tempfile.TemporaryDirectory() as directory:
+            config_file = os.path.join(directory, 'config.ini')
+            with open(config_file, 'w') as f:
+                f.write("[SERVER]\nip = 127.0.0.1\nport = 0\n")
+            clock = VirtualClock(start=1700000000)
+            monitor = MonitorCore(config_file=config_file, state_file=os.path.join(directory, 'state.json'),
+                                  provider=SimulatedProvider(clock), clock=clock)
+            record_emails(monitor)
+            monitor.start_monitoring()
+            if web_server:
+                monitor.start_flask_server()
+                monitor.start_flask_server()
+            deadline = time.monotonic() + 2
+            while 'tick' not in monitor.instrumentation.histograms and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+            self.assertEqual(monitor.shutdown(timeout=2), [])
+            self.assertFalse(monitor.monitoring_thread.is_alive())
+            self.assertTrue(all(worker['state'] == 'stopped' for worker in monitor.supervisor.inventory()))
+
+    def test_monitor_stops_its_workers(self):
+        """Test the monitoring loop runs supervised and shutdown stops it."""
+        self.run_and_stop(web_server=False)
+
+    @requires_flask
+    def test_monitor_stops_its_web_server(self):
+        """Test a web server started twice is replaced, not added, and shutdown stops it with the loop."""
+        self.run_and_stop(web_server=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
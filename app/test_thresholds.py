@@ -0,0 +1,58 @@
+import unittest
+from app.thresholds import RollingWindow, SustainedThreshold, OK, PENDING, FIRING
+
+
+class TestRollingWindow(unittest.TestCase):
+
+    def test_min_max_mean(self):
+        """Test window statistics while samples expire."""
+        window = RollingWindow(10)
+        for t, value in enumerate([5, 1, 7, 3]):
+            window.push(t, value)
+        self.assertEqual(window.min, 1)
+        self.assertEqual(window.max, 7)
+        self.assertEqual(window.mean, 4)
+
+        window.push(12, 4)
+        # samples at t=0 and t=1 fall out, t=2 is kept as the window start
+        self.assertEqual(len(window), 3)
+        self.assertEqual(window.min, 3)
+        self.assertEqual(window.max, 7)
+        self.assertEqual(window.span, 10)
+
+
+class TestSustainedThreshold(unittest.TestCase):
+
+    def test_fires_after_duration(self):
+        """Test that a breach only fires once it lasts for the whole duration."""
+        rule = SustainedThreshold(80, duration=60)
+        self.assertEqual(rule.update(90, now=0), PENDING)
+        self.assertEqual(rule.update(95, now=30), PENDING)
+        self.assertEqual(rule.update(85, now=60), FIRING)
+
+    def test_short_spike_resets(self):
+        """Test that a single spike never fires."""
+        rule = SustainedThreshold(80, duration=60)
+        rule.update(99, now=0)
+        self.assertEqual(rule.update(20, now=5), OK)
+        self.assertEqual(rule.update(90, now=50), PENDING)
+        self.assertEqual(rule.update(90, now=100), PENDING)
+
+    def test_hysteresis(self):
+        """Test that a firing rule only clears below the clear threshold."""
+        rule = SustainedThreshold(80, duration=0, clear_threshold=70)
+        self.assertEqual(rule.update(90, now=0), FIRING)
+        self.assertEqual(rule.update(75, now=5), FIRING)
+        self.assertEqual(rule.update(65, now=10), OK)
+
+    def test_below_comparison(self):
+        """Test a rule that fires when the value drops under the threshold."""
+        rule = SustainedThreshold(10, duration=5, clear_threshold=20, op='<')
+        self.assertEqual(rule.update(5, now=0), PENDING)
+        self.assertEqual(rule.update(8, now=5), FIRING)
+        self.assertEqual(rule.update(15, now=6), FIRING)
+        self.assertEqual(rule.update(25, now=7), OK)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from app.views import CoreHeatmap, Sparklines, heat_colour, sparkline_points
+
+
+class FakeCanvas:
+    """Keeps canvas items as dicts, counting item edits."""
+
+    def __init__(self):
+        self.items = {}
+        self.edits = 0
+
+    def delete(self, tag):
+        self.items.clear()
+
+    def configure(self, **options):
+        pass
+
+    def _create(self, kind, coords, options):
+        item = len(self.items) + 1
+        self.items[item] = dict(options, kind=kind, coords=list(coords))
+        return item
+
+    def create_rectangle(self, *coords, **options):
+        return self._create('rectangle', coords, options)
+
+    def create_line(self, *coords, **options):
+        return self._create('line', coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create('text', coords, options)
+
+    def itemconfigure(self, item, **options):
+        self.items[item].update(options)
+        self.edits += 1
+
+    def coords(self, item, *coords):
+        self.items[item]['coords'] = list(coords)
+        self.edits += 1
+
+
+class TestViews(unittest.TestCase):
+
+    def test_heat_colour_and_sparkline_points(self):
+        """Test the colour scale ends and a sparkline filling its box."""
+        self.assertEqual(heat_colour(0), "#00ff40")
+        self.assertEqual(heat_colour(50), "#ffff40")
+        self.assertEqual(heat_colour(100), "#ff0040")
+        self.assertEqual(sparkline_points([0, 5, 10], 0, 10, 100, 20), [0, 30, 50, 20, 100, 10])
+        self.assertEqual(sparkline_points([0, 0], 0, 0, 10, 10), [0, 10, 10, 10])
+        self.assertEqual(sparkline_points([7], 0, 0, 10, 10), [])
+
+    def test_heatmap_only_recolours_changed_cores(self):
+        """Test a 128 core heatmap is built once and a refresh touches only cores that changed step."""
+        canvas = FakeCanvas()
+        heatmap = CoreHeatmap(canvas)
+        percents = [5.0] * 128
+        self.assertEqual(heatmap.update(percents), 128)
+        self.assertEqual(len(canvas.items), 128)
+        percents[7] = 99.0
+        percents[8] = 6.0  # same colour step
+        self.assertEqual(heatmap.update(percents), 1)
+        self.assertEqual(canvas.items[heatmap.cells[7]]['fill'], heat_colour(99))
+        self.assertEqual(len(canvas.items), 128)
+
+    def test_sparklines_move_existing_lines(self):
+        """Test sparklines keep their canvas items across refreshes and rebuild when the rows change."""
+        canvas = FakeCanvas()
+        sparklines = Sparklines(canvas, width=100, height=20)
+        sparklines.update({'sda': ([0, 10], "sda: idle"), 'sdb': ([], "sdb")})
+        line, label, y = sparklines.rows['sda']
+        sparklines.update({'sda': ([10, 0, 10], "sda: busy"), 'sdb': ([], "sdb")})
+        self.assertEqual(sparklines.rows['sda'], (line, label, y))
+        self.assertEqual(canvas.items[line]['coords'], [0, 0, 50, 20, 100, 0])
+        self.assertEqual(canvas.items[label]['text'], "sda: busy")
+        sparklines.update({'sdc': ([1, 2], "sdc")})
+        self.assertEqual(list(sparklines.rows), ['sdc'])
+        self.assertEqual(len(canvas.items), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import operator
+import time
+from collections import deque
+
+OK = "OK"
+PENDING = "Pending"
+FIRING = "Firing"
+
+COMPARATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+}
+
+
+class RollingWindow:
+    """Time based sliding window with O(1) amortized sum, mean, min and max."""
+
+    def __init__(self, duration):
+        self.duration = duration
+        self.samples = deque()  # (seq, timestamp, value)
+        self._min = deque()  # (seq, value), values increasing from the front
+        self._max = deque()  # (seq, value), values decreasing from the front
+        self._sum = 0.0
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.samples)
+
+    def push(self, timestamp, value):
+        seq = self._seq
+        self._seq += 1
+        self.samples.append((seq, timestamp, value))
+        self._sum += value
+
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+
+        self.expire(timestamp)
+
+    def expire(self, now):
+        # keep the newest sample at or before the window start, it covers the time up to the next sample
+        boundary = now - self.duration
+        samples = self.samples
+        while len(samples) > 1 and samples[1][1] <= boundary:
+            seq, _, value = samples.popleft()
+            self._sum -= value
+            if self._min[0][0] == seq:
+                self._min.popleft()
+            if self._max[0][0] == seq:
+                self._max.popleft()
+
+    def clear(self):
+        self.samples.clear()
+        self._min.clear()
+        self._max.clear()
+        self._sum = 0.0
+
+    @property
+    def span(self):
+        if not self.samples:
+            return 0
+        return self.samples[-1][1] - self.samples[0][1]
+
+    @property
+    def mean(self):
+        return self._sum / len(self.samples) if self.samples else None
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else None
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else None
+
+
+class SustainedThreshold:
+    """Threshold that fires once breached for `duration` seconds and clears when `clear_threshold` is crossed back."""
+
+    def __init__(self, threshold, duration=0, clear_threshold=None, op='>'):
+        self.state = OK
+        self.since = None
+        self.window = RollingWindow(duration)
+        self.configure(threshold, duration, clear_threshold, op)
+
+    def configure(self, threshold, duration=0, clear_threshold=None, op='>'):
+        """Change the rule parameters without dropping the collected samples."""
+        if op not in COMPARATORS:
+            raise ValueError(f"Unsupported comparison: {op}")
+        if clear_threshold is None:
+            clear_threshold = threshold
+        # the clear threshold can never sit on the breaching side of the trigger threshold
+        if op in ('>', '>='):
+            clear_threshold = min(clear_threshold, threshold)
+        else:
+            clear_threshold = max(clear_threshold, threshold)
+
+        self.threshold = threshold
+        self.clear_threshold = clear_threshold
+        self.duration = duration
+        self.op = op
+        self.compare = COMPARATORS[op]
+        self.window.duration = duration
+
+    def update(self, value, now=None):
+        """Feed one sample and return the new state."""
+        if now is None:
+            now = time.time()
+
+        if self.state == FIRING:
+            if self.compare(value, self.clear_threshold):
+                self.window.push(now, value)
+            else:
+                self.reset()
+            return self.state
+
+        if not self.compare(value, self.threshold):
+            self.reset()
+            return self.state
+
+        if self.state == OK:
+            self.since = now
+        self.window.push(now, value)
+
+        # every sample in the window must breach, so the window extreme decides
+        extreme = self.window.min if self.op in ('>', '>=') else self.window.max
+        if self.window.span >= self.duration and self.compare(extreme, self.threshold):
+            self.state = FIRING
+        else:
+            self.state = PENDING
+        return self.state
+
+    def reset(self):
+        self.state = OK
+        self.since = None
+        self.window.clear()
+
+    def export(self):
+        """State, breach start and window samples, enough to carry a pending or firing threshold over a restart."""
+        return [self.state, self.since, [[timestamp, value] for _, timestamp, value in self.window.samples]]
+
+    def restore(self, exported):
+        self.state, self.since, samples = exported
+        self.window.clear()
+        for timestamp, value in samples:
+            self.window.push(timestamp, value)
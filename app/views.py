@@ -0,0 +1,101 @@
+import math
+
+HEATMAP_COLUMNS = 16  # cores per heatmap row
+HEATMAP_CELL = 14  # px
+HEAT_STEPS = 10  # colour steps from idle to pegged; a core is only recoloured when it changes step
+SPARKLINE_POINTS = 60  # samples shown, five minutes at the 5 second check interval
+SPARKLINE_WIDTH = 160  # px
+SPARKLINE_HEIGHT = 22  # px
+SPARKLINE_GAP = 6  # px between two sparklines
+SPARKLINE_LABEL_X = SPARKLINE_WIDTH + 10
+
+
+def heat_colour(percent):
+    """Green through yellow to red, quantised to HEAT_STEPS."""
+    step = min(HEAT_STEPS, max(0, int(percent * HEAT_STEPS / 100)))
+    red = min(255, 510 * step // HEAT_STEPS)
+    green = min(255, 510 * (HEAT_STEPS - step) // HEAT_STEPS)
+    return f"#{red:02x}{green:02x}40"
+
+
+def sparkline_points(values, x, y, width, height, top=None):
+    """Flat canvas coordinates of a polyline fitting `values` into the box at (x, y); [] below two values."""
+    if len(values) < 2:
+        return []
+    top = max(values) if top is None else top
+    scale = height / top if top > 0 else 0.0
+    step = width / (len(values) - 1)
+    bottom = y + height
+    points = []
+    for index, value in enumerate(values):
+        points.append(x + index * step)
+        points.append(bottom - min(value, top) * scale)
+    return points
+
+
+class CoreHeatmap:
+    """One canvas rectangle per core, created once; a refresh only recolours cells whose heat step changed."""
+
+    def __init__(self, canvas, columns=HEATMAP_COLUMNS, cell=HEATMAP_CELL):
+        self.canvas = canvas
+        self.columns = columns
+        self.cell = cell
+        self.cells = []
+        self.colours = []
+
+    def _build(self, count):
+        canvas = self.canvas
+        cell = self.cell
+        canvas.delete('all')
+        canvas.configure(width=min(count, self.columns) * cell, height=math.ceil(count / self.columns) * cell)
+        self.cells = []
+        for core in range(count):
+            x = core % self.columns * cell
+            y = core // self.columns * cell
+            self.cells.append(canvas.create_rectangle(x, y, x + cell - 2, y + cell - 2, outline=''))
+        self.colours = [None] * count
+
+    def update(self, percents):
+        """Show the given per-core utilisation; returns the number of cells that were recoloured."""
+        if len(percents) != len(self.cells):
+            self._build(len(percents))
+        changed = 0
+        for index, percent in enumerate(percents):
+            colour = heat_colour(percent)
+            if colour != self.colours[index]:
+                self.canvas.itemconfigure(self.cells[index], fill=colour)
+                self.colours[index] = colour
+                changed += 1
+        return changed
+
+
+class Sparklines:
+    """A labelled sparkline per name on one canvas; refreshing moves the existing lines instead of redrawing."""
+
+    def __init__(self, canvas, width=SPARKLINE_WIDTH, height=SPARKLINE_HEIGHT):
+        self.canvas = canvas
+        self.width = width
+        self.height = height
+        self.rows = {}  # name -> (line item, label item, top y)
+
+    def _build(self, names):
+        canvas = self.canvas
+        canvas.delete('all')
+        self.rows = {}
+        for row, name in enumerate(names):
+            y = row * (self.height + SPARKLINE_GAP)
+            line = canvas.create_line(0, y + self.height, self.width, y + self.height, fill='#1f77b4')
+            label = canvas.create_text(SPARKLINE_LABEL_X, y + self.height / 2, anchor='w', text=name)
+            self.rows[name] = (line, label, y)
+        canvas.configure(height=max(1, len(names) * (self.height + SPARKLINE_GAP)))
+
+    def update(self, series):
+        """Show `{name: (values, label text)}`, one row per name in the given order."""
+        if list(series) != list(self.rows):
+            self._build(list(series))
+        for name, (values, text) in series.items():
+            line, label, y = self.rows[name]
+            points = sparkline_points(values, 0, y, self.width, self.height)
+            if points:
+                self.canvas.coords(line, *points)
+            self.canvas.itemconfigure(label, text=text)
@@ -0,0 +1,469 @@
+"""Benchmark suite for the monitoring hot paths.
+
+Runs headless against a simulated host (app.simulation), so no display, Windows services or
+busy machine is needed:
+
+    python benchmarks/run.py                     # run and print
+    python benchmarks/run.py --save              # store benchmarks/baseline.json
+    python benchmarks/run.py --compare           # fail on regressions against the baseline
+    python benchmarks/run.py --quick             # smaller sizes, for a fast sanity run
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app.alerts import TEMPLATES, Markup  # noqa: E402
+from app.core import MonitorCore, CHECK_INTERVAL  # noqa: E402
+from app.simulation import HAS_FLASK, SimulatedProvider, VirtualClock, record_emails  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+CONFIG_TEMPLATE = """
+[MONITORING]
+services = {services}
+processes = {processes}
+
+[EMAIL]
+smtp_server = localhost
+smtp_port = 25
+to = ops@example.com
+frequency = 30
+
+[HARDWARE]
+cpu_threshold = 90
+ram_threshold = 90
+
+[REPORTS]
+dailyreport = True
+reportactive = True
+
+[SERVER]
+ip = 127.0.0.1
+port = 5000
+"""
+
+
+class Results:
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, name, value, unit, better='lower'):
+        self.entries[name] = {'value': value, 'unit': unit, 'better': better}
+        print(f"  {name:<55} {value:12.3f} {unit}")
+
+
+def median_and_p95(func, repeat, min_time=0.25):
+    """Time `func` at least `repeat` times and for at least `min_time` seconds."""
+    timings = []
+    total = 0.0
+    while len(timings) < repeat or (total < min_time and len(timings) < 10000):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+    timings.sort()
+    return timings[len(timings) // 2], timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+
+def simulated_host(processes, services, mounts):
+    return SimulatedProvider(VirtualClock(start=time.time()), processes=processes, services=services, mounts=mounts)
+
+
+@contextlib.contextmanager
+def monitor_for(host, directory, monitored_processes=50):
+    """Build a headless MonitorCore watching every service and some of the host's processes."""
+    services = ','.join(host.services)
+    names = [proc.info['name'] for proc in host.processes[:monitored_processes // 2]]
+    names += [f"missing{i}.exe" for i in range(monitored_processes - len(names))]
+    config_file = os.path.join(directory, 'config.ini')
+    with open(config_file, 'w') as config:
+        config.write(CONFIG_TEMPLATE.format(services=services, processes=','.join(names)))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor = MonitorCore(config_file=config_file, state_file=os.path.join(directory, 'state.json'),
+                              provider=host, clock=host.clock)
+        record_emails(monitor)
+        monitor.disk_thresholds = {partition.device: 99 for partition in host.partitions}
+        yield monitor
+
+
+def bench_tick_cost(results, directory, sizes):
+    print("Per-tick check cost")
+    for processes, services, mounts in sizes:
+        host = simulated_host(processes=processes, services=services, mounts=mounts)
+        with monitor_for(host, directory) as monitor:
+            for _ in range(3):
+                monitor.run_checks()  # first ticks send the initial status alerts
+            median, p95 = median_and_p95(monitor.run_checks, 20)
+        label = f"tick[proc={processes},svc={services},mnt={mounts}]"
+        results.add(f"{label}.median", median * 1000, 'ms')
+        results.add(f"{label}.p95", p95 * 1000, 'ms')
+
+
+def bench_alert_rendering(results, directory, processes):
+    print("Alert body rendering")
+    host = simulated_host(processes=processes, services=10, mounts=4)
+    with monitor_for(host, directory) as monitor:
+        fields = dict(subject="Service Stopped", message=Markup("body"), name="Service1", status="Stopped",
+                      previous_status="Running", description="N/A", kind="service")
+        context = monitor.collect_alert_context()
+        collect, _ = median_and_p95(monitor.collect_alert_context, 20)
+        render, _ = median_and_p95(lambda: TEMPLATES['status_change'].render({**context, **fields}), 200)
+        send, _ = median_and_p95(lambda: (monitor.send_email(
+            "Service Stopped", "body", service_or_process_name="Service1", status="Stopped",
+            previous_status="Running"), monitor.notifier.flush()), 20)
+    results.add(f"alert.context[proc={processes}].median", collect * 1000, 'ms')
+    results.add("alert.render.median", render * 1000, 'ms')
+    results.add("alert.send_cached.median", send * 1000, 'ms')
+
+
+def bench_status_endpoint(results, directory, requests):
+    print("/status endpoint")
+    if not HAS_FLASK:
+        print("  skipped: Flask is not installed")
+        return
+    host = simulated_host(processes=1000, services=50, mounts=4)
+    with monitor_for(host, directory) as monitor:
+        monitor.setup_flask_routes()
+        client = monitor.app.test_client()
+        median, p95 = median_and_p95(lambda: client.get('/status'), requests)
+        start = time.perf_counter()
+        for _ in range(requests):
+            client.get('/status')
+        throughput = requests / (time.perf_counter() - start)
+    results.add("status.latency.median", median * 1000, 'ms')
+    results.add("status.latency.p95", p95 * 1000, 'ms')
+    results.add("status.throughput", throughput, 'req/s', better='higher')
+
+
+def bench_history_endpoint(results, directory, cores, requests):
+    print(f"/history over a month of {cores} per-core series")
+    if not HAS_FLASK:
+        print("  skipped: Flask is not installed")
+        return
+    from app.rules import series_key
+    host = simulated_host(processes=10, services=1, mounts=1)
+    with monitor_for(host, directory) as monitor:
+        keys = [series_key('cpu_core', core=str(core)) for core in range(cores)]
+        start = host.clock.time()
+        for tick in range(int(31 * 86400 / CHECK_INTERVAL)):
+            t = start + tick * CHECK_INTERVAL
+            monitor.history.record({key: (tick + index) % 100 for index, key in enumerate(keys)}, t)
+        host.clock.advance(31 * 86400)
+        monitor.setup_flask_routes()
+        client = monitor.app.test_client()
+        measured = []
+        for name, query in (('json', ''), ('binary', '&format=binary')):
+            url = f"/history?metric=cpu_core&from={start}{query}"
+            median, _ = median_and_p95(lambda: client.get(url).data, requests)
+            measured.append((name, median, len(client.get(url).data)))
+    for name, median, size in measured:
+        results.add(f"history.month.{name}.median", median * 1000, 'ms')
+        results.add(f"history.month.{name}.size", size / 1024, 'KiB')
+
+
+def bench_anomaly_detection(results, counts):
+    print("Anomaly detection per tick")
+    import random
+    from app.baselines import AnomalyDetector
+    from app.rules import AlertRule, series_key
+
+    for count in counts:
+        detector = AnomalyDetector()
+        detector.load([AlertRule("Anomaly", 'metric', 4, anomaly=True, seasonal=True)])
+        keys = [series_key('metric', series=str(index)) for index in range(count)]
+        noise = random.Random(1)
+        t = time.time()
+        for _ in range(100):
+            t += CHECK_INTERVAL
+            detector.evaluate({key: noise.gauss(50, 5) for key in keys}, now=t)
+        snapshot = {key: noise.gauss(50, 5) for key in keys}
+        median, _ = median_and_p95(lambda: detector.evaluate(snapshot, now=t), 50)
+        results.add(f"anomaly.evaluate[series={count}].median", median * 1000, 'ms')
+
+
+def bench_log_tail(results, directory, megabytes):
+    print("Log tailing throughput")
+    from app.logs import LogTail
+
+    path = os.path.join(directory, 'bench.log')
+    # one line in a hundred matches, the rest are ordinary access log lines
+    line = b'127.0.0.1 - - [01/May/2024:10:00:00 +0000] "GET /api/items?page=2 HTTP/1.1" 200 5120 "-" "curl/8.0"\n'
+    error = b'2024-05-01 10:00:00 ERROR worker 3: connection refused by upstream 10.0.0.7:5432\n'
+    block = line * 99 + error
+    patterns = {'error': r'\bERROR\b', 'fatal': r'\bFATAL\b', 'oom': 'Out of memory', 'trace': '^Traceback'}
+    tail = LogTail('bench', path, patterns)
+    tail.poll()
+    with open(path, 'wb') as log_file:
+        for _ in range(megabytes * 1024 * 1024 // len(block)):
+            log_file.write(block)
+    size = os.path.getsize(path)
+    start = time.perf_counter()
+    while tail.offset < size:  # a check reads at most MAX_READ, so this takes several
+        tail.poll()
+    elapsed = time.perf_counter() - start
+    tail.close()
+    os.remove(path)
+    results.add(f"logs.tail[{megabytes}MB].throughput", size / 1024 ** 2 / elapsed, 'MB/s', better='higher')
+
+
+def bench_probes(results, counts):
+    print("Concurrent probes")
+    import socket
+    import threading
+    from app.probes import Probe, ProbeRunner
+
+    def accept(listener):
+        while True:
+            try:
+                listener.accept()[0].close()
+            except OSError:
+                return  # closed
+
+    with socket.socket() as listener:
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(max(counts))
+        threading.Thread(target=accept, args=(listener,), daemon=True).start()
+        address = f"127.0.0.1:{listener.getsockname()[1]}"
+        for count in counts:
+            runner = ProbeRunner()
+            runner.configure([Probe(f"port{index}", address=address) for index in range(count)])
+            median, _ = median_and_p95(runner.run_once, 5)
+            runner.drain()
+            results.add(f"probes.run_once[probes={count}].median", median * 1000, 'ms')
+
+
+def bench_checkpoint(results, directory, series_count):
+    print("Checkpoint save and load")
+    from app.checkpoint import read_checkpoint, write_checkpoint
+    from app.history import HistoryStore
+    from app.rules import series_key
+
+    # one series with a full month behind it, copied to the others
+    history = HistoryStore()
+    template = series_key('template')
+    t = time.time() - 31 * 86400
+    while t < time.time():
+        history.append(template, t, 50.0)
+        t += 60 if t < time.time() - 3600 else CHECK_INTERVAL
+    times, values = history.series[template].arrays()
+    rollups = [(rollup.resolution, rollup.first, rollup.newest, rollup.total, rollup.count, rollup.completed())
+               for rollup in history.rollups[template]]
+    for index in range(series_count):
+        history.restore(series_key('metric', series=str(index)), times, values, rollups)
+    # the state of a real monitor, kept apart so the monitors of later benchmarks do not restore this checkpoint
+    directory = os.path.join(directory, 'checkpoint')
+    os.makedirs(directory)
+    with monitor_for(simulated_host(processes=1000, services=100, mounts=8), directory) as monitor:
+        monitor.run_checks()
+        state = monitor.checkpoint_state()
+
+    file_name = os.path.join(directory, 'checkpoint.bin')
+    save, _ = median_and_p95(lambda: write_checkpoint(file_name, state, history, time.time()), 10)
+    load, _ = median_and_p95(lambda: read_checkpoint(file_name, HistoryStore()), 10)
+    results.add(f"checkpoint.save[series={series_count}].median", save * 1000, 'ms')
+    results.add(f"checkpoint.load[series={series_count}].median", load * 1000, 'ms')
+    results.add(f"checkpoint.size[series={series_count}]", os.path.getsize(file_name) / 1024 ** 2, 'MB')
+
+
+def bench_graph_update(results, lengths):
+    print("Graph update cost")
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("  skipped: matplotlib is not installed")
+        return
+    for length in lengths:
+        fig, ax = plt.subplots()
+        line, = ax.plot([], [], 'r-')
+        x_data = list(range(length))
+        y_data = [i % 100 for i in range(length)]
+
+        def redraw():
+            # same work as one iteration of ServiceMonitorApp.update_graphs
+            line.set_data(x_data, y_data)
+            ax.set_xlim(0, max(x_data) + 1)
+            ax.set_ylim(0, 100)
+            fig.canvas.draw()
+
+        median, _ = median_and_p95(redraw, 10)
+        plt.close(fig)
+        results.add(f"graph.redraw[points={length}].median", median * 1000, 'ms')
+
+
+def bench_providers(results):
+    print("Host metric reads, psutil against the /proc fast path")
+    if not sys.platform.startswith('linux'):
+        print("  skipped: the /proc provider needs Linux")
+        return
+    from app.procfs import ProcProvider
+    from app.providers import PsutilProvider
+
+    calls = {
+        'cpu_percent': lambda provider: provider.cpu_percent(interval=None),
+        'cpu_percent_percpu': lambda provider: provider.cpu_percent(interval=None, percpu=True),
+        'virtual_memory': lambda provider: provider.virtual_memory(),
+        'getloadavg': lambda provider: provider.getloadavg(),
+        'net_io_counters_pernic': lambda provider: provider.net_io_counters(pernic=True),
+        'disk_io_counters_perdisk': lambda provider: provider.disk_io_counters(perdisk=True),
+    }
+    for name, provider in (('psutil', PsutilProvider()), ('proc', ProcProvider())):
+        total = 0.0
+        for call_name, call in calls.items():
+            median, _ = median_and_p95(lambda: call(provider), 200)
+            total += median
+            results.add(f"provider.{name}.{call_name}.median", median * 1000000, 'us')
+        results.add(f"provider.{name}.tick.median", total * 1000000, 'us')
+
+
+def bench_memory_growth(results, directory, hours):
+    print(f"Memory growth over a simulated {hours} h run")
+    host = simulated_host(processes=200, services=20, mounts=4)
+    ticks = int(hours * 3600 / CHECK_INTERVAL)
+
+    with monitor_for(host, directory) as monitor:
+        for _ in range(12):
+            monitor.run_checks()
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        for _ in range(ticks):
+            host.clock.advance(CHECK_INTERVAL)
+            monitor.run_checks()
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    results.add(f"memory.{hours}h.growth", (current - baseline) / 1024, 'KiB')
+    results.add(f"memory.{hours}h.peak", peak / 1024, 'KiB')
+    results.add(f"memory.{hours}h.wall_time", elapsed, 's')
+
+
+def bench_memory_watchdog(results, directory):
+    print("Memory watchdog: tick cost with allocation tracing, snapshot and diff")
+    host = simulated_host(processes=1000, services=100, mounts=8)
+    ticks = {}
+    with monitor_for(host, directory) as monitor:
+        for tracing in ('off', 'on'):
+            monitor.memory_watchdog.configure(tracing == 'on')
+            monitor.run_checks()  # the first check takes the snapshot diffs start from
+            ticks[tracing], _ = median_and_p95(monitor.run_checks, 20)
+        report, _ = median_and_p95(monitor.memory_report, 5)
+        monitor.memory_watchdog.close()
+
+    for tracing, median in ticks.items():
+        results.add(f"memory.tracing[{tracing}].tick.median", median * 1000, 'ms')
+    results.add("memory.report.median", report * 1000, 'ms')
+
+
+def bench_profiler(results, thread_counts, depth=30):
+    print("Sampling profiler cost per stack sample")
+    import threading
+    from app.profiler import SamplingProfiler
+
+    def nested(event, level):
+        return nested(event, level - 1) if level else event.wait()
+
+    for count in thread_counts:
+        event = threading.Event()
+        threads = [threading.Thread(target=nested, args=(event, depth), name=f"idle{index}")
+                   for index in range(count)]
+        for thread in threads:
+            thread.start()
+        profile = SamplingProfiler().capture(1, rate=100)
+        event.set()
+        for thread in threads:
+            thread.join()
+        results.add(f"profiler.sample[threads={count}].mean", profile.overhead / profile.samples * 1000000, 'us')
+        results.add(f"profiler.overhead[threads={count}]", profile.describe()['overhead_percent'], '%')
+
+
+def compare(results, baseline_file, tolerance):
+    with open(baseline_file) as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    print(f"\nComparison against {baseline_file} (tolerance {tolerance:.0%})")
+    for name, entry in results.entries.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"  {name:<55} new")
+            continue
+        ratio = entry['value'] / old['value'] if old['value'] else 1.0
+        if entry['better'] == 'lower':
+            regressed = ratio > 1 + tolerance
+        else:
+            regressed = ratio < 1 - tolerance
+        marker = "REGRESSION" if regressed else "ok"
+        print(f"  {name:<55} {old['value']:10.3f} -> {entry['value']:10.3f} {entry['unit']:<6} {marker}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--quick', action='store_true', help="use small sizes and a 1 h memory run")
+    parser.add_argument('--save', nargs='?', const=DEFAULT_BASELINE, help="write the results as a JSON baseline")
+    parser.add_argument('--compare', nargs='?', const=DEFAULT_BASELINE, help="compare against a JSON baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    if args.quick:
+        sizes = [(100, 10, 2), (1000, 100, 8)]
+        graph_lengths = [60, 3600]
+        hours = 1
+    else:
+        sizes = [(100, 10, 2), (1000, 100, 8), (5000, 500, 32)]
+        graph_lengths = [60, 3600, 17280]
+        hours = 24
+
+    results = Results()
+    with tempfile.TemporaryDirectory() as directory:
+        bench_tick_cost(results, directory, sizes)
+        bench_alert_rendering(results, directory, sizes[-1][0])
+        bench_status_endpoint(results, directory, 50 if args.quick else 200)
+        bench_history_endpoint(results, directory, 2 if args.quick else 16, 10 if args.quick else 50)
+        bench_anomaly_detection(results, [100, 1000])
+        bench_log_tail(results, directory, 16 if args.quick else 64)
+        bench_probes(results, [100] if args.quick else [100, 500])
+        bench_checkpoint(results, directory, 100 if args.quick else 360)
+        bench_graph_update(results, graph_lengths)
+        bench_providers(results)
+        bench_memory_watchdog(results, directory)
+        bench_profiler(results, [10, 50])
+        bench_memory_growth(results, directory, hours)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'results': results.entries,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
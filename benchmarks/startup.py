@@ -0,0 +1,81 @@
+"""Cold start budget check for the headless monitor.
+
+Starts a fresh interpreter with `python -X importtime`, imports the headless core and builds
+a MonitorCore, then fails if the wall time exceeds the budget or if a GUI-only dependency got
+imported along the way.
+
+    python benchmarks/startup.py [--budget-ms 300] [--runs 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADLESS_START = "from app.core import MonitorCore; MonitorCore()"
+
+# modules the headless path must never load
+GUI_ONLY_MODULES = ('tkinter', 'matplotlib', 'flask', 'PIL', 'pystray', 'win32serviceutil')
+# nor those of subsystems that are off unless configured: probes and the collector process
+OPTIONAL_MODULES = ('asyncio', 'ssl', 'multiprocessing')
+
+
+def run_once():
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', HEADLESS_START], cwd=ROOT,
+                            capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return elapsed, parse_importtime(result.stderr)
+
+
+def parse_importtime(output):
+    """Return {module: cumulative microseconds} from `-X importtime` output."""
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports[module.strip()] = int(cumulative)
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=300)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    imports = {}
+    for _ in range(args.runs):
+        elapsed, imports = run_once()
+        timings.append(elapsed * 1000)
+
+    print(f"Headless cold start: best {min(timings):.1f} ms, worst {max(timings):.1f} ms "
+          f"(budget {args.budget_ms:.0f} ms)")
+    print("Slowest top-level imports:")
+    top_level = {module: usec for module, usec in imports.items() if '.' not in module or module.startswith('app.')}
+    for module, usec in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:10]:
+        print(f"  {usec / 1000:8.1f} ms  {module}")
+
+    failed = False
+    leaked = sorted(module for module in imports if module.split('.')[0] in GUI_ONLY_MODULES)
+    if leaked:
+        print(f"FAIL: headless start imported GUI-only modules: {', '.join(leaked)}")
+        failed = True
+    unused = sorted(module for module in imports if module.split('.')[0] in OPTIONAL_MODULES)
+    if unused:
+        print(f"FAIL: headless start imported modules of unconfigured subsystems: {', '.join(unused)}")
+        failed = True
+    if min(timings) > args.budget_ms:
+        print(f"FAIL: cold start exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
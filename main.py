@@ -1,7 +1,16 @@
-from app.gui import ServiceMonitorApp
-import tkinter as tk
+import argparse
 
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ServiceMonitorApp(root)
-    root.mainloop()
+    parser = argparse.ArgumentParser(description="CyberMoose Watch")
+    parser.add_argument('--headless', action='store_true', help="run the monitor without the GUI")
+    args = parser.parse_args()
+
+    if args.headless:
+        from app.core import MonitorCore
+        MonitorCore().run()
+    else:
+        import tkinter as tk
+        from app.gui import ServiceMonitorApp
+        root = tk.Tk()
+        app = ServiceMonitorApp(root)
+        root.mainloop()